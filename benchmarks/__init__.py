@@ -0,0 +1 @@
+"""Benchmarks for the photo organizer scan pipeline."""
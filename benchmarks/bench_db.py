@@ -0,0 +1,117 @@
+"""Measure database write and read throughput on synthetic metadata.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_db --rows 20000 --output bench_db.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List
+
+from photo_organizer.db import init_db, insert_metadata, iter_metadata
+
+CATEGORIES = ["selfie", "document", "screenshot", "nature", "other"]
+CITIES = ["New York", "San Francisco", "Paris", "London", "Tokyo"]
+
+
+def synthetic_entries(
+    rows: int, faces: int = 1, seed: int = 0, revision: int = 0
+) -> Iterator[Dict[str, Any]]:
+    """Yield *rows* scan results shaped like :func:`iter_scan` output."""
+    rng = random.Random(seed)
+    for i in range(rows):
+        yield {
+            "path": f"/library/{i // 1000:04d}/IMG_{i:06d}.jpg",
+            "exif": {
+                "timestamp": f"2023:{1 + i % 12:02d}:{1 + i % 28:02d} "
+                f"{i % 24:02d}:00:00",
+                "camera": "Synthetic",
+                "gps": f"{rng.uniform(-60, 60)},{rng.uniform(-180, 180)}",
+            },
+            "faces": [
+                {
+                    "box": [0, 0, 10, 10],
+                    "embedding": [rng.random() for _ in range(128)],
+                }
+                for _ in range(faces)
+            ],
+            "category": rng.choice(CATEGORIES),
+            "ocr_text": "" if i % 10 else f"receipt {i} total {revision}",
+            "city": rng.choice(CITIES),
+            "size": 1000 + i,
+            "mtime": 1.7e9 + i + revision,
+            "fingerprint": f"{i:032x}",
+        }
+
+
+def _rate(rows: int, seconds: float) -> Dict[str, Any]:
+    return {
+        "seconds": round(seconds, 4),
+        "rows": rows,
+        "rows_per_second": round(rows / seconds, 1) if seconds else None,
+    }
+
+
+def bench(rows: int, faces: int, commit_every: int) -> Dict[str, Any]:
+    """Insert, rescan and read back *rows* entries in a fresh database."""
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = init_db(path)
+        for stage, revision in [("insert", 0), ("rescan", 1)]:
+            entries = list(synthetic_entries(rows, faces, revision=revision))
+            start = time.perf_counter()
+            insert_metadata(conn, entries, chunk_size=commit_every)
+            results[stage] = _rate(rows, time.perf_counter() - start)
+        start = time.perf_counter()
+        count = sum(1 for _ in iter_metadata(conn))
+        results["read"] = _rate(count, time.perf_counter() - start)
+        results["max_photo_id"] = conn.execute(
+            "SELECT MAX(id) FROM photos"
+        ).fetchone()[0]
+        conn.close()
+    return results
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, default=10000, help="Number of photos"
+    )
+    parser.add_argument(
+        "--faces", type=int, default=1, help="Faces stored per photo"
+    )
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=500,
+        metavar="N",
+        help="Rows per transaction, as with cli.py --commit-every",
+    )
+    parser.add_argument(
+        "--output", metavar="PATH", help="Write the JSON report to PATH"
+    )
+    ns = parser.parse_args(args)
+    report = {
+        "rows": ns.rows,
+        "faces": ns.faces,
+        "commit_every": ns.commit_every,
+        **bench(ns.rows, ns.faces, ns.commit_every),
+    }
+    text = json.dumps(report, indent=2)
+    if ns.output:
+        with open(ns.output, "w") as fh:
+            fh.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+"""Measure near-duplicate lookups on synthetic perceptual hashes.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_duplicates --hashes 1000000 --output dup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+from photo_organizer.duplicates import HammingIndex
+
+
+def synthetic_hashes(
+    count: int, copies: int, distance: int, seed: int = 0
+) -> Tuple[List[int], Set[Tuple[int, int]]]:
+    """Return *count* random hashes and the planted near-duplicate pairs.
+
+    The last *copies* hashes each differ from an earlier one in at most
+    *distance* random bits.
+    """
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(64) for _ in range(count - copies)]
+    planted = set()
+    for _ in range(copies):
+        source = rng.randrange(len(hashes))
+        value = hashes[source]
+        for bit in rng.sample(range(64), rng.randint(0, distance)):
+            value ^= 1 << bit
+        planted.add((source, len(hashes)))
+        hashes.append(value)
+    return hashes, planted
+
+
+def bench(count: int, copies: int, distance: int) -> Dict[str, Any]:
+    """Build an index over *count* hashes and find every close pair."""
+    hashes, planted = synthetic_hashes(count, copies, distance)
+    start = time.perf_counter()
+    index = HammingIndex(hashes)
+    built = time.perf_counter()
+    pairs = {tuple(p) for p in index.pairs(distance).tolist()}
+    paired = time.perf_counter()
+    queries = hashes[:1000]
+    for value in queries:
+        index.query(value, distance)
+    queried = time.perf_counter()
+    return {
+        "bands": index.bands,
+        "build_seconds": round(built - start, 4),
+        "pairs_seconds": round(paired - built, 4),
+        "pairs": len(pairs),
+        "planted_found": len(planted & pairs),
+        "query_ms": round((queried - paired) * 1000 / len(queries), 4),
+    }
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--hashes", type=int, default=100000, help="Number of photos"
+    )
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=1000,
+        help="Near duplicates planted among them",
+    )
+    parser.add_argument(
+        "--distance",
+        type=int,
+        default=4,
+        help="Bits in which near duplicates may differ",
+    )
+    parser.add_argument(
+        "--output", metavar="PATH", help="Write the JSON report to PATH"
+    )
+    ns = parser.parse_args(args)
+    report = {
+        "hashes": ns.hashes,
+        "copies": ns.copies,
+        "distance": ns.distance,
+        **bench(ns.hashes, ns.copies, ns.distance),
+    }
+    text = json.dumps(report, indent=2)
+    if ns.output:
+        with open(ns.output, "w") as fh:
+            fh.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
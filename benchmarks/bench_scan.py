@@ -0,0 +1,309 @@
+"""Time each stage of the scan pipeline on a synthetic corpus.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_scan --images 200 --size 4000x3000 \
+        --output bench.json
+
+The result is a JSON document with the wall time and throughput of
+every stage and the peak resident set size of the whole process,
+suitable for comparing releases.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # type: ignore
+
+from benchmarks.corpus import make_corpus
+from photo_organizer import __version__
+from photo_organizer.classifier import classify_images, load_classifier
+from photo_organizer.cluster import cluster_embeddings
+from photo_organizer.db import init_db, insert_metadata
+from photo_organizer.events import group_by_event
+from photo_organizer.face import (
+    detect_faces,
+    extract_face,
+    load_detector,
+    load_embedder,
+)
+from photo_organizer.scan import (
+    _classification_copy,
+    _decode,
+    _extract_exif,
+    scan_folder,
+)
+
+STAGES = [
+    "decode",
+    "exif",
+    "classify",
+    "detect_faces",
+    "embed",
+    "insert_metadata",
+    "cluster_faces",
+    "group_by_event",
+]
+
+
+def peak_rss_mb() -> float | None:
+    """Return the peak RSS of this process and its children in MiB.
+
+    This is a high-water mark for the process so far, not the memory
+    used by whichever stage ran last.
+    """
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+class StageTimer:
+    """Accumulate wall time and item counts per stage."""
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {name: 0.0 for name in STAGES}
+        self.items: Dict[str, int] = {name: 0 for name in STAGES}
+
+    def run(self, stage: str, fn: Callable, *args: Any, items: int = 1):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.seconds[stage] += time.perf_counter() - start
+        self.items[stage] += items
+        return result
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for stage in STAGES:
+            seconds = self.seconds[stage]
+            items = self.items[stage]
+            out[stage] = {
+                "seconds": round(seconds, 4),
+                "items": items,
+                "items_per_second": (
+                    round(items / seconds, 2) if seconds else None
+                ),
+            }
+        return out
+
+
+def _batched(paths: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(paths), size):
+        yield paths[i:i + size]
+
+
+def bench_stages(
+    paths: List[str], db_path: str, batch_size: int = 32
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """Run every pipeline stage separately over *paths*.
+
+    Images are processed batch by batch the way :func:`scan_folder`
+    does, but each stage is timed on its own. Returns the per-stage
+    report and a few corpus counters.
+    """
+    timer = StageTimer()
+    embedder = load_embedder()
+    entries: List[Dict[str, Any]] = []
+    embeddings: List[np.ndarray] = []
+    for batch in _batched(paths, batch_size):
+        smalls, crops, batch_entries = [], [], []
+        for path in batch:
+            with Image.open(path) as img:
+                exif = timer.run("exif", _extract_exif, img)
+                rgb, _, _ = timer.run("decode", _decode, img)
+            boxes = timer.run("detect_faces", detect_faces, np.asarray(rgb))
+            crops.extend(
+                extract_face(rgb, box).resize(embedder.input_size)
+                for box in boxes
+            )
+            smalls.append(_classification_copy(rgb))
+            batch_entries.append(
+                {
+                    "path": path,
+                    "exif": exif,
+                    "faces": [{"box": list(b)} for b in boxes],
+                }
+            )
+        categories = timer.run(
+            "classify", classify_images, smalls, items=len(smalls)
+        )
+        if crops:
+            vectors = timer.run(
+                "embed", embedder.embed_batch, crops, items=len(crops)
+            )
+            embeddings.extend(vectors)
+            faces = [f for e in batch_entries for f in e["faces"]]
+            for face, vector in zip(faces, vectors):
+                face["embedding"] = vector.astype(float).tolist()
+        for entry, category in zip(batch_entries, categories):
+            entry["category"] = category
+        entries.extend(batch_entries)
+
+    conn = init_db(db_path)
+    timer.run(
+        "insert_metadata",
+        insert_metadata,
+        conn,
+        entries,
+        500,
+        items=len(entries),
+    )
+    conn.close()
+    if embeddings:
+        timer.run(
+            "cluster_faces",
+            cluster_embeddings,
+            np.stack(embeddings),
+            items=len(embeddings),
+        )
+    timer.run("group_by_event", group_by_event, entries, items=len(entries))
+    counters = {
+        "images": len(paths),
+        "faces": sum(len(e["faces"]) for e in entries),
+        "with_gps": sum("gps" in e["exif"] for e in entries),
+    }
+    return timer.report(), counters
+
+
+def bench_end_to_end(folder: str, workers: int, batch_size: int):
+    """Time a complete :func:`scan_folder` run.
+
+    Locations come from the offline gazetteer so that network latency
+    and rate limits do not end up in the timing.
+    """
+    start = time.perf_counter()
+    metadata = scan_folder(
+        folder,
+        workers=workers,
+        batch_size=batch_size,
+        online_geocoding=False,
+    )
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": round(seconds, 4),
+        "items": len(metadata),
+        "items_per_second": (
+            round(len(metadata) / seconds, 2) if seconds else None
+        ),
+        "workers": workers,
+        "process_peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _size(value: str) -> Tuple[int, int]:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--images",
+        type=int,
+        default=100,
+        metavar="N",
+        help="Number of synthetic photos",
+    )
+    parser.add_argument(
+        "--size",
+        type=_size,
+        default=(4000, 3000),
+        metavar="WxH",
+        help="Resolution of the synthetic photos",
+    )
+    parser.add_argument(
+        "--faces",
+        type=int,
+        default=2,
+        metavar="N",
+        help="Maximum face-like regions per photo",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the synthetic corpus"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        metavar="N",
+        help="Images classified per forward pass",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Worker processes for the end-to-end scan",
+    )
+    parser.add_argument(
+        "--corpus", metavar="DIR", help="Keep the corpus in DIR and reuse it"
+    )
+    parser.add_argument(
+        "--no-end-to-end",
+        action="store_true",
+        help="Skip the complete scan_folder run",
+    )
+    parser.add_argument(
+        "--output", metavar="PATH", help="Write the JSON report to PATH"
+    )
+    ns = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = ns.corpus or os.path.join(tmp, "corpus")
+        start = time.perf_counter()
+        paths = make_corpus(
+            folder, ns.images, size=ns.size, faces=ns.faces, seed=ns.seed
+        )
+        corpus_seconds = time.perf_counter() - start
+        load_classifier()
+        load_detector()
+        stages, counters = bench_stages(
+            paths, os.path.join(tmp, "bench.db"), ns.batch_size
+        )
+        report: Dict[str, Any] = {
+            "version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": {
+                **counters,
+                "size": list(ns.size),
+                "seed": ns.seed,
+                "generate_seconds": round(corpus_seconds, 4),
+            },
+            "stages": stages,
+        }
+        if not ns.no_end_to_end:
+            report["end_to_end"] = bench_end_to_end(
+                folder, ns.workers, ns.batch_size
+            )
+        report["process_peak_rss_mb"] = peak_rss_mb()
+
+    text = json.dumps(report, indent=2)
+    if ns.output:
+        with open(ns.output, "w") as fh:
+            fh.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,120 @@
+"""Synthetic photo corpora for benchmarking."""
+
+from __future__ import annotations
+
+import os
+import random
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw
+
+# A few places from the bundled gazetteer so geocoding finds real cities.
+PLACES = [
+    (40.7128, -74.0060),
+    (37.7749, -122.4194),
+    (51.5074, -0.1278),
+    (48.8566, 2.3522),
+    (35.6762, 139.6503),
+]
+SKIN_TONES = [(224, 172, 105), (198, 134, 66), (141, 85, 36), (255, 219, 172)]
+
+
+def _dms(value: float) -> Tuple[float, float, float]:
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round((value - degrees - minutes / 60) * 3600, 2)
+    return float(degrees), float(minutes), seconds
+
+
+def _exif(rng: random.Random, taken: datetime) -> Image.Exif:
+    exif = Image.Exif()
+    exif[0x0132] = taken.strftime("%Y:%m:%d %H:%M:%S")  # DateTime
+    exif[0x010F] = "Synthetic"  # Make
+    exif[0x0110] = f"Camera {rng.randint(1, 3)}"  # Model
+    lat, lon = rng.choice(PLACES)
+    lat += rng.uniform(-0.05, 0.05)
+    lon += rng.uniform(-0.05, 0.05)
+    exif[0x8825] = {  # GPSInfo
+        1: "N" if lat >= 0 else "S",
+        2: _dms(lat),
+        3: "E" if lon >= 0 else "W",
+        4: _dms(lon),
+    }
+    return exif
+
+
+def _draw_face(draw: ImageDraw.ImageDraw, rng: random.Random, size) -> None:
+    """Draw a skin-toned ellipse with eyes and a mouth."""
+    w, h = size
+    fw = rng.randint(w // 10, w // 4)
+    fh = int(fw * 1.3)
+    x = rng.randint(0, max(0, w - fw))
+    y = rng.randint(0, max(0, h - fh))
+    draw.ellipse((x, y, x + fw, y + fh), fill=rng.choice(SKIN_TONES))
+    eye = max(2, fw // 10)
+    for ex in (x + fw // 3, x + 2 * fw // 3):
+        ey = y + fh // 3
+        draw.ellipse((ex - eye, ey - eye, ex + eye, ey + eye), fill="black")
+    draw.line(
+        (x + fw // 3, y + 2 * fh // 3, x + 2 * fw // 3, y + 2 * fh // 3),
+        fill=(120, 30, 30),
+        width=max(1, eye // 2),
+    )
+
+
+def make_image(
+    rng: random.Random, size: Tuple[int, int], faces: int
+) -> Image.Image:
+    """Return a noisy gradient image with *faces* face-like regions."""
+    w, h = size
+    top = tuple(rng.randint(0, 255) for _ in range(3))
+    bottom = tuple(rng.randint(0, 255) for _ in range(3))
+    img = Image.linear_gradient("L").resize(size)
+    img = Image.composite(
+        Image.new("RGB", size, bottom), Image.new("RGB", size, top), img
+    )
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    img = Image.blend(img, noise, 0.2)
+    draw = ImageDraw.Draw(img)
+    for _ in range(faces):
+        _draw_face(draw, rng, size)
+    return img
+
+
+def make_corpus(
+    folder: str,
+    count: int,
+    size: Tuple[int, int] = (4000, 3000),
+    faces: int = 2,
+    seed: int = 0,
+    quality: int = 90,
+) -> List[str]:
+    """Write *count* synthetic JPEGs into *folder* and return their paths.
+
+    Every image carries an EXIF timestamp, camera and GPS position.
+    Timestamps advance by a few minutes per photo with a multi-hour gap
+    every 25 photos, so event grouping sees realistic bursts. Up to
+    *faces* face-like regions are drawn per image. Files that already
+    exist are reused, so repeated runs share a corpus.
+    """
+    os.makedirs(folder, exist_ok=True)
+    w, h = size
+    taken = datetime(2023, 6, 1, 9, 0, 0)
+    paths = []
+    for i in range(count):
+        rng = random.Random(seed * 1_000_003 + i)
+        taken += timedelta(minutes=rng.randint(1, 15))
+        if i and i % 25 == 0:
+            taken += timedelta(hours=rng.randint(8, 48))
+        path = os.path.join(folder, f"IMG_{i:05d}_{w}x{h}.jpg")
+        exif = _exif(rng, taken)
+        if not os.path.exists(path):
+            img = make_image(rng, size, rng.randint(0, faces))
+            img.save(path, quality=quality, exif=exif)
+        paths.append(path)
+    return paths
+
+
+__all__ = ["make_corpus", "make_image"]
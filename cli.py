@@ -3,22 +3,127 @@
 from __future__ import annotations
 
 import argparse
+import os
+import sqlite3
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
-from photo_organizer.scan import scan_folder
-from photo_organizer.cluster import cluster_faces
+from photo_organizer.scan import iter_scan, iter_scan_metadata
+from photo_organizer.cluster import find_face_photos, update_face_index
 from photo_organizer.db import (
     init_db,
     insert_metadata,
+    merge_metadata,
+    get_signatures,
+    get_digests,
+    iter_metadata,
+    delete_photos,
+    get_events,
+    set_event_name,
     set_face_label,
     get_face_label,
+    query_photos,
+    list_photos,
+    count_photos,
+    search_text,
+    QUERY_FIELDS,
+    Committed,
 )
+from photo_organizer.duplicates import (
+    StoredResults,
+    file_digest,
+    find_duplicates,
+)
+from photo_organizer.index import FaceIndex, index_path
 from photo_organizer.picker import pick_folder
-from photo_organizer.location import group_by_location
-from photo_organizer.events import group_by_event
+from photo_organizer.geocode import AsyncGeocoder
+from photo_organizer.location import (
+    GeocodeCache,
+    NominatimClient,
+    OfflineGeocoder,
+    geocode_cache_path,
+    group_by_location,
+)
+from photo_organizer.events import update_events
+from photo_organizer.progress import Progress
+from photo_organizer.server import RpcServer
+from photo_organizer.thumbnails import ThumbnailCache, thumbnail_dir
+from photo_organizer.stats import STATS
 import json
 
 
-def main(args: list[str] | None = None) -> int:
+def _print_json_array(entries: Iterable[dict]) -> None:
+    """Print *entries* as one JSON array without building it in memory."""
+    sys.stdout.write("[")
+    for i, entry in enumerate(entries):
+        if i:
+            sys.stdout.write(", ")
+        sys.stdout.write(json.dumps(entry))
+    sys.stdout.write("]\n")
+
+
+def _print_entries(entries: Iterable[dict], fmt: str) -> None:
+    """Print *entries* as a JSON array or, for ``ndjson``, one per line."""
+    if fmt != "ndjson":
+        _print_json_array(entries)
+        return
+    for entry in entries:
+        sys.stdout.write(json.dumps(entry) + "\n")
+
+
+Emit = Callable[[Dict[str, Any]], None]
+
+
+def _ndjson_writer(out: Any) -> Emit:
+    """Return a function writing one JSON record per line to *out*."""
+
+    def emit(record: Dict[str, Any]) -> None:
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+    return emit
+
+
+def _slim(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Return *entry* without face embeddings, for streaming."""
+    faces = [
+        {k: v for k, v in face.items() if k != "embedding"}
+        for face in entry.get("faces", [])
+    ]
+    return dict(entry, faces=faces)
+
+
+def _photos(emit: Emit | None) -> Committed | None:
+    """Return an ``on_commit`` callback emitting a ``photo`` per entry."""
+    if emit is None:
+        return None
+
+    def committed(entries: List[Dict[str, Any]]) -> None:
+        for entry in entries:
+            emit({"type": "photo", "photo": _slim(entry)})
+
+    return committed
+
+
+def _parse_filters(specs: Iterable[str]) -> Dict[str, Any]:
+    """Turn ``FIELD=VALUE`` strings into :func:`query_photos` filters."""
+    filters: Dict[str, Any] = {}
+    for spec in specs:
+        field, sep, value = spec.partition("=")
+        if not sep:
+            raise ValueError(f"expected FIELD=VALUE, got {spec!r}")
+        parsed: Any = int(value) if field == "event_id" else value
+        if field in filters:
+            previous = filters[field]
+            if not isinstance(previous, list):
+                previous = [previous]
+            filters[field] = previous + [parsed]
+        else:
+            filters[field] = parsed
+    return filters
+
+
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Photo Organizer CLI")
     parser.add_argument("folder", nargs="?", help="Folder to scan for photos")
     parser.add_argument(
@@ -38,6 +143,225 @@ def main(args: list[str] | None = None) -> int:
         metavar="HOURS",
         help="Group photos into events separated by HOURS gap (default: 6)",
     )
+    parser.add_argument(
+        "--metadata-only",
+        action="store_true",
+        help="Only read EXIF and locations; skip every ML stage",
+    )
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=16,
+        metavar="N",
+        help="Threads walking directories and reading file headers",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="Skip files and folders matching a .photoignore PATTERN",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        metavar="N",
+        help="Only descend N folder levels below the scanned folder",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process new or modified files and drop deleted ones",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of worker processes used for scanning (default: 1)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        metavar="N",
+        help="Number of images classified per forward pass (default: 32)",
+    )
+    parser.add_argument(
+        "--intra-op-threads",
+        type=int,
+        metavar="N",
+        help="Threads used inside each ONNX face embedding operator",
+    )
+    parser.add_argument(
+        "--inter-op-threads",
+        type=int,
+        metavar="N",
+        help="Threads used across ONNX face embedding operators",
+    )
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=500,
+        metavar="N",
+        help="Commit scanned records to the database every N photos",
+    )
+    parser.add_argument(
+        "--geocode-resolution",
+        type=float,
+        default=0.01,
+        metavar="DEGREES",
+        help="Grid size used to share reverse-geocoding results",
+    )
+    parser.add_argument(
+        "--geocode-ttl",
+        type=float,
+        default=30,
+        metavar="DAYS",
+        help="Days before cached reverse-geocoding results expire",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Resolve locations with the offline gazetteer only",
+    )
+    parser.add_argument(
+        "--gazetteer",
+        metavar="PATH",
+        help="GeoNames-style TSV of places used for offline geocoding",
+    )
+    parser.add_argument(
+        "--geocoder-url",
+        metavar="URL",
+        help="Nominatim-compatible server used for reverse geocoding",
+    )
+    parser.add_argument(
+        "--geocode-rps",
+        type=float,
+        default=1.0,
+        metavar="N",
+        help="Maximum reverse-geocoding requests started per second",
+    )
+    parser.add_argument(
+        "--geocode-concurrency",
+        type=int,
+        default=4,
+        metavar="N",
+        help="Maximum concurrent reverse-geocoding requests",
+    )
+    parser.add_argument(
+        "--no-thumbnails",
+        action="store_true",
+        help="Do not write thumbnails of scanned photos",
+    )
+    parser.add_argument(
+        "--no-reuse",
+        action="store_true",
+        help="Scan exact copies of stored photos instead of copying "
+        "their results",
+    )
+    parser.add_argument(
+        "--thumbnail-dir",
+        metavar="DIR",
+        help="Thumbnail cache directory (default: DB path + .thumbs)",
+    )
+    parser.add_argument(
+        "--thumbnail-cache-size",
+        type=float,
+        default=1024,
+        metavar="MB",
+        help="Evict least recently used thumbnails beyond MB megabytes",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "ndjson"],
+        default="json",
+        help="Print one JSON document, or stream one record per line "
+        "with progress while scanning (ndjson)",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="Seconds between ndjson progress records (default: 1)",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print per-stage timings, counters and errors after the scan",
+    )
+    parser.add_argument(
+        "--stats-file",
+        metavar="PATH",
+        help="Write scan statistics to PATH (Prometheus text for .prom)",
+    )
+    parser.add_argument(
+        "--query",
+        action="store_true",
+        help="List stored photos matching the filters without scanning",
+    )
+    parser.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        metavar="FIELD=VALUE",
+        help=f"Only list photos whose FIELD ({', '.join(QUERY_FIELDS)}) "
+        "equals VALUE; repeat a field to accept several values",
+    )
+    parser.add_argument(
+        "--since", metavar="DATE", help="Only list photos taken on or after"
+    )
+    parser.add_argument(
+        "--until", metavar="DATE", help="Only list photos taken before DATE"
+    )
+    parser.add_argument(
+        "--order-by",
+        default="taken_at",
+        metavar="FIELD",
+        help="Sort listed photos by FIELD (default: taken_at)",
+    )
+    parser.add_argument(
+        "--desc", action="store_true", help="Sort listed photos descending"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        metavar="N",
+        help="List at most N photos (default for --search: 20)",
+    )
+    parser.add_argument(
+        "--offset",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Skip the first N listed photos",
+    )
+    parser.add_argument(
+        "--search",
+        metavar="TEXT",
+        help="List documents whose OCR text contains every word of TEXT",
+    )
+    parser.add_argument(
+        "--recluster",
+        action="store_true",
+        help="Recluster all faces and rebuild the face index",
+    )
+    parser.add_argument(
+        "--find-face",
+        type=int,
+        metavar="FACE_ID",
+        help="List photos containing faces similar to FACE_ID",
+    )
+    parser.add_argument(
+        "--find-duplicates",
+        type=int,
+        nargs="?",
+        const=4,
+        metavar="DISTANCE",
+        help="List groups of exact copies and of photos whose perceptual "
+        "hashes differ in at most DISTANCE bits (default: 4)",
+    )
     parser.add_argument(
         "--set-face-label",
         nargs=2,
@@ -50,9 +374,419 @@ def main(args: list[str] | None = None) -> int:
         metavar="CLUSTER_ID",
         help="Retrieve label for face cluster",
     )
+    parser.add_argument(
+        "--list-events",
+        action="store_true",
+        help="List the events stored by --group-events",
+    )
+    parser.add_argument(
+        "--set-event-name",
+        nargs=2,
+        metavar=("EVENT_ID", "NAME"),
+        help="Assign NAME to event EVENT_ID",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Answer JSON-RPC requests on stdin/stdout until EOF",
+    )
+    return parser
+
+
+def _thumbnail_cache(ns: argparse.Namespace) -> ThumbnailCache:
+    return ThumbnailCache(
+        ns.thumbnail_dir or thumbnail_dir(ns.db),
+        max_bytes=int(ns.thumbnail_cache_size * 1024 * 1024),
+    )
+
+
+def _scan(
+    ns: argparse.Namespace,
+    conn: sqlite3.Connection,
+    folder: str,
+    emit: Emit | None = None,
+) -> Tuple[int, Any]:
+    """Scan *folder* into *conn* as configured by *ns*.
+
+    Returns the number of records written and the result to report:
+    event or location groups, or an iterator over the stored entries.
+    With *emit*, every scanned photo is passed to it as a ``photo``
+    record once the commit that stored it is done, so the photo can be
+    read back by then; records lag the scan by up to
+    ``ns.commit_every`` photos. ``progress`` records follow the scan
+    itself, every ``ns.progress_interval`` seconds.
+    """
+    progress = None
+    if emit is not None:
+        progress = Progress(
+            ns.progress_interval,
+            report=lambda snapshot: emit({"type": "progress", **snapshot}),
+        )
+    known = get_signatures(conn, folder)
+    geocode_cache = GeocodeCache(
+        geocode_cache_path(ns.db),
+        resolution=ns.geocode_resolution,
+        ttl=ns.geocode_ttl * 24 * 3600,
+    )
+    geocoding = {
+        "geocode_cache": geocode_cache,
+        "offline_geocoder": (
+            OfflineGeocoder(ns.gazetteer) if ns.gazetteer else None
+        ),
+        "online_geocoding": not ns.offline,
+        "geocoder": None,
+    }
+    if not ns.offline:
+        geocoding["geocoder"] = AsyncGeocoder(
+            NominatimClient(ns.geocoder_url) if ns.geocoder_url else None,
+            cache=geocode_cache,
+            rps=ns.geocode_rps,
+            concurrency=ns.geocode_concurrency,
+            offline_geocoder=geocoding["offline_geocoder"],
+        )
+    walk = {"ignore": ns.exclude, "max_depth": ns.max_depth}
+    if ns.metadata_only:
+        entries = iter_scan_metadata(
+            folder,
+            threads=ns.io_threads,
+            progress=progress,
+            **geocoding,
+            **walk,
+        )
+        count = merge_metadata(
+            conn,
+            entries,
+            chunk_size=ns.commit_every,
+            on_commit=_photos(emit),
+        )
+    else:
+        thumbnails = None if ns.no_thumbnails else _thumbnail_cache(ns)
+        reuse = None if ns.no_reuse else StoredResults(ns.db)
+        entries = iter_scan(
+            folder,
+            known=known if ns.incremental else None,
+            workers=ns.workers,
+            batch_size=ns.batch_size,
+            intra_op_num_threads=ns.intra_op_threads,
+            inter_op_num_threads=ns.inter_op_threads,
+            walk_threads=ns.io_threads,
+            thumbnails=thumbnails,
+            progress=progress,
+            reuse=reuse,
+            **geocoding,
+            **walk,
+        )
+        try:
+            count = insert_metadata(
+                conn,
+                entries,
+                chunk_size=ns.commit_every,
+                on_commit=_photos(emit),
+            )
+        finally:
+            if reuse is not None:
+                reuse.close()
+        if thumbnails is not None:
+            thumbnails.evict()
+    removed = [p for p in known if not os.path.exists(p)]
+    if removed:
+        delete_photos(conn, removed)
+        if emit is not None:
+            emit({"type": "removed", "count": len(removed)})
+        else:
+            print(f"Removed {len(removed)} missing records from {ns.db}")
+    if emit is not None:
+        emit({"type": "progress", **progress.snapshot()})
+    if not ns.metadata_only:
+        update_face_index(conn, index_path(ns.db), rebuild=ns.recluster)
+    if ns.group_events is not None:
+        return count, _event_groups(
+            update_events(conn, ns.group_events),
+            iter_metadata(conn, folder),
+        )
+    if ns.group_by:
+        return count, group_by_location(
+            iter_metadata(conn, folder), ns.group_by
+        )
+    return count, iter_metadata(conn, folder)
+
+
+def _event_groups(
+    events: List[Dict[str, Any]], entries: Iterable[Dict[str, Any]]
+) -> Dict[int, List[Dict[str, Any]]]:
+    """Map the ids of *events*, by start, to their *entries* by time."""
+    groups: Dict[int, List[Dict[str, Any]]] = {e["id"]: [] for e in events}
+    for entry in entries:
+        if entry.get("event_id") in groups:
+            groups[entry["event_id"]].append(entry)
+    for members in groups.values():
+        members.sort(
+            key=lambda e: (e.get("exif", {}).get("timestamp", ""), e["path"])
+        )
+    return {k: v for k, v in groups.items() if v}
+
+
+class Backend:
+    """Methods answered by ``cli.py --serve``.
+
+    The process outlives single requests, so models loaded by a scan,
+    database connections and face indexes are reused by later calls.
+    Every method takes an optional *db* overriding ``--db``.
+    """
+
+    def __init__(self, ns: argparse.Namespace) -> None:
+        self.ns = ns
+        # Sends JSON-RPC notifications; set by ``main`` while serving.
+        self.notify: Callable[[str, Any], None] | None = None
+        self._conns: Dict[str, sqlite3.Connection] = {}
+        self._indexes: Dict[str, Tuple[float, FaceIndex]] = {}
+
+    def _conn(self, db: str | None) -> sqlite3.Connection:
+        db = db or self.ns.db
+        conn = self._conns.get(db)
+        if conn is None:
+            conn = self._conns[db] = init_db(db)
+        return conn
+
+    def scan(
+        self,
+        folder: str,
+        db: str | None = None,
+        results: bool = True,
+        stream: bool = False,
+        **options: Any,
+    ) -> Any:
+        """Scan *folder* and return what the CLI would print.
 
+        *options* override CLI options by their argparse names, e.g.
+        ``{"incremental": true, "group_by": "city"}``. Without *results*
+        only ``{"folder", "count", "total"}`` is returned, and the photos
+        can be paged through with :meth:`list_photos`. With *stream*, the
+        records of ``--format ndjson`` are sent as ``scan_event``
+        notifications while the scan runs.
+        """
+        ns = argparse.Namespace(**vars(self.ns))
+        for name, value in options.items():
+            if name in ("folder", "db", "serve") or not hasattr(ns, name):
+                raise ValueError(f"unknown scan option: {name}")
+            setattr(ns, name, value)
+        ns.folder = folder
+        ns.db = db or ns.db
+        STATS.reset()
+        # Scans run on the server's worker thread with their own connection.
+        conn = init_db(ns.db)
+        emit = None
+        if stream and self.notify is not None:
+            notify = self.notify
+
+            def emit(record: Dict[str, Any]) -> None:
+                notify("scan_event", dict(record, folder=folder))
+
+        try:
+            count, result = _scan(ns, conn, folder, emit)
+            if not results:
+                total = count_photos(conn, folder)
+                return {"folder": folder, "count": count, "total": total}
+            return result if isinstance(result, (dict, list)) else list(
+                result
+            )
+        finally:
+            conn.close()
+
+    def query(
+        self,
+        db: str | None = None,
+        folder: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        order_by: str = "taken_at",
+        descending: bool = False,
+        limit: int | None = None,
+        offset: int = 0,
+        filters: Dict[str, Any] | None = None,
+    ) -> List[Dict[str, Any]]:
+        """List stored photos; see :func:`query_photos`."""
+        return query_photos(
+            self._conn(db),
+            folder=folder,
+            since=since,
+            until=until,
+            order_by=order_by,
+            descending=descending,
+            limit=limit,
+            offset=offset,
+            **(filters or {}),
+        )
+
+    def list_photos(
+        self,
+        cursor: str | None = None,
+        limit: int = 200,
+        db: str | None = None,
+        folder: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        order_by: str = "taken_at",
+        descending: bool = False,
+        filters: Dict[str, Any] | None = None,
+    ) -> Dict[str, Any]:
+        """Return one page of photos; see :func:`list_photos`.
+
+        The first page, requested without a *cursor*, also carries the
+        ``total`` number of matching photos.
+        """
+        conn = self._conn(db)
+        filters = filters or {}
+        photos, next_cursor = list_photos(
+            conn,
+            cursor=cursor,
+            limit=limit,
+            folder=folder,
+            since=since,
+            until=until,
+            order_by=order_by,
+            descending=descending,
+            **filters,
+        )
+        page: Dict[str, Any] = {"photos": photos, "cursor": next_cursor}
+        if cursor is None:
+            page["total"] = count_photos(
+                conn, folder, since, until, **filters
+            )
+        return page
+
+    def search(
+        self,
+        text: str,
+        db: str | None = None,
+        folder: str | None = None,
+        limit: int | None = 20,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """Search OCR text; see :func:`search_text`."""
+        return search_text(
+            self._conn(db), text, folder=folder, limit=limit, offset=offset
+        )
+
+    def thumbnails(
+        self, paths: List[str], size: int = 256, db: str | None = None
+    ) -> Dict[str, str | None]:
+        """Return the *size* thumbnail of each of *paths*.
+
+        Thumbnails evicted from the cache are created again; ``None``
+        marks photos that cannot be read.
+        """
+        ns = argparse.Namespace(**vars(self.ns))
+        ns.db = db or ns.db
+        cache = _thumbnail_cache(ns)
+        if size not in cache.sizes:
+            raise ValueError(f"no thumbnails of size {size}")
+        # Decoding is slow, so this runs on its own server thread and
+        # reads the digests over its own connection.
+        conn = init_db(ns.db)
+        try:
+            keys = get_digests(conn, paths)
+        finally:
+            conn.close()
+        found: Dict[str, str | None] = {}
+        for path in paths:
+            try:
+                key = keys.get(path) or file_digest(path)
+                thumb = cache.path(key, size)
+                if os.path.exists(thumb):
+                    cache.touch([thumb])
+                else:
+                    cache.create(path, key)
+                found[path] = thumb
+            except Exception:
+                found[path] = None
+        return found
+
+    def find_duplicates(
+        self,
+        distance: int = 4,
+        db: str | None = None,
+        folder: str | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Group copies of stored photos; see :func:`find_duplicates`."""
+        return find_duplicates(self._conn(db), int(distance), folder)
+
+    def find_face(self, face_id: int, db: str | None = None) -> Any:
+        """List photos with faces similar to *face_id*."""
+        conn = self._conn(db)
+        path = index_path(db or self.ns.db)
+        if not os.path.exists(path):
+            update_face_index(conn, path)
+        mtime = os.path.getmtime(path)
+        cached = self._indexes.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = self._indexes[path] = (mtime, FaceIndex.load(path))
+        return find_face_photos(conn, cached[1], face_id)
+
+    def set_face_label(
+        self, cluster_id: int, name: str, db: str | None = None
+    ) -> Dict[str, Any]:
+        """Name face cluster *cluster_id*."""
+        set_face_label(self._conn(db), int(cluster_id), name)
+        return {"cluster_id": int(cluster_id), "name": name}
+
+    def get_face_label(
+        self, cluster_id: int, db: str | None = None
+    ) -> Dict[str, Any]:
+        """Return the name of face cluster *cluster_id*."""
+        name = get_face_label(self._conn(db), int(cluster_id))
+        return {"cluster_id": int(cluster_id), "name": name}
+
+    def events(self, db: str | None = None) -> List[Dict[str, Any]]:
+        """Return the stored events ordered by start."""
+        return get_events(self._conn(db))
+
+    def set_event_name(
+        self, event_id: int, name: str | None, db: str | None = None
+    ) -> Dict[str, Any]:
+        """Name event *event_id*; ``ValueError`` if there is none."""
+        if not set_event_name(self._conn(db), int(event_id), name):
+            raise ValueError(f"no event with id {event_id}")
+        return {"event_id": int(event_id), "name": name}
+
+    def methods(self) -> Dict[str, Any]:
+        """Return the JSON-RPC method table."""
+        return {
+            "scan": self.scan,
+            "query": self.query,
+            "list_photos": self.list_photos,
+            "search": self.search,
+            "thumbnails": self.thumbnails,
+            "find_duplicates": self.find_duplicates,
+            "find_face": self.find_face,
+            "set_face_label": self.set_face_label,
+            "get_face_label": self.get_face_label,
+            "events": self.events,
+            "set_event_name": self.set_event_name,
+        }
+
+    def close(self) -> None:
+        """Close every open database connection."""
+        for conn in self._conns.values():
+            conn.close()
+        self._conns.clear()
+
+
+def main(args: list[str] | None = None) -> int:
+    parser = _build_parser()
     ns = parser.parse_args(args)
 
+    if ns.serve:
+        backend = Backend(ns)
+        server = RpcServer(
+            backend.methods(), background=["scan", "thumbnails"]
+        )
+        backend.notify = server.notify
+        try:
+            return server.serve()
+        finally:
+            backend.close()
+
     if ns.set_face_label:
         cid = int(ns.set_face_label[0])
         name = ns.set_face_label[1]
@@ -61,31 +795,101 @@ def main(args: list[str] | None = None) -> int:
         print(json.dumps({"cluster_id": cid, "name": name}))
         return 0
 
+    if ns.find_face is not None:
+        conn = init_db(ns.db)
+        path = index_path(ns.db)
+        if os.path.exists(path):
+            index = FaceIndex.load(path)
+        else:
+            index = update_face_index(conn, path)
+        print(json.dumps(find_face_photos(conn, index, ns.find_face)))
+        return 0
+
+    if ns.find_duplicates is not None:
+        conn = init_db(ns.db)
+        try:
+            groups = find_duplicates(conn, ns.find_duplicates, ns.folder)
+        except ValueError as exc:
+            parser.error(str(exc))
+        _print_entries(groups, ns.format)
+        return 0
+
+    if ns.list_events:
+        conn = init_db(ns.db)
+        _print_entries(get_events(conn), ns.format)
+        return 0
+
+    if ns.set_event_name:
+        conn = init_db(ns.db)
+        event_id, name = int(ns.set_event_name[0]), ns.set_event_name[1]
+        if not set_event_name(conn, event_id, name):
+            parser.error(f"no event with id {event_id}")
+        print(json.dumps({"event_id": event_id, "name": name}))
+        return 0
+
     if ns.get_face_label is not None:
         conn = init_db(ns.db)
         name = get_face_label(conn, ns.get_face_label)
         print(json.dumps({"cluster_id": ns.get_face_label, "name": name}))
         return 0
 
+    if ns.query:
+        conn = init_db(ns.db)
+        try:
+            filters = _parse_filters(ns.filter)
+            entries = query_photos(
+                conn,
+                folder=ns.folder,
+                since=ns.since,
+                until=ns.until,
+                order_by=ns.order_by,
+                descending=ns.desc,
+                limit=ns.limit,
+                offset=ns.offset,
+                **filters,
+            )
+        except ValueError as exc:
+            parser.error(str(exc))
+        _print_entries(entries, ns.format)
+        return 0
+
+    if ns.search is not None:
+        conn = init_db(ns.db)
+        try:
+            matches = search_text(
+                conn,
+                ns.search,
+                folder=ns.folder,
+                limit=20 if ns.limit is None else ns.limit,
+                offset=ns.offset,
+            )
+        except RuntimeError as exc:
+            parser.error(str(exc))
+        _print_entries(matches, ns.format)
+        return 0
+
     folder = ns.folder or pick_folder()
-    print(f"Scanning {folder}...")
-    metadata = scan_folder(folder)
-    # ensure every entry contains a category so downstream steps
-    # like database insertion and tests can rely on this key
-    for entry in metadata:
-        entry.setdefault("category", "other")
-    cluster_faces(metadata)
-    if ns.group_events is not None:
-        event_groups = group_by_event(metadata, gap_hours=ns.group_events)
-        print(json.dumps(event_groups))
-    elif ns.group_by:
-        groups = group_by_location(metadata, level=ns.group_by)
-        print(json.dumps(groups))
-    else:
-        print(json.dumps(metadata))
+    STATS.reset()
     conn = init_db(ns.db)
-    insert_metadata(conn, metadata)
-    print(f"Inserted {len(metadata)} records into {ns.db}")
+    if ns.format == "ndjson":
+        emit = _ndjson_writer(sys.stdout)
+        emit({"type": "start", "folder": folder})
+        count, result = _scan(ns, conn, folder, emit)
+        if isinstance(result, (dict, list)):
+            emit({"type": "groups", "groups": result})
+        emit({"type": "done", "count": count, "db": ns.db})
+    else:
+        print(f"Scanning {folder}...")
+        count, result = _scan(ns, conn, folder)
+        if isinstance(result, (dict, list)):
+            print(json.dumps(result))
+        else:
+            _print_json_array(result)
+        print(f"Inserted {count} records into {ns.db}")
+    if ns.stats:
+        print(STATS.summary(), file=sys.stderr)
+    if ns.stats_file:
+        STATS.write(ns.stats_file)
     return 0
 
 
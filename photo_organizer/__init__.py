@@ -2,7 +2,18 @@
 
 __version__ = "0.1.0"
 
-from . import scan, db, picker, cluster, classifier, ocr, location, events
+from . import (
+    scan,
+    db,
+    picker,
+    cluster,
+    classifier,
+    ocr,
+    location,
+    events,
+    index,
+    walk,
+)
 
 __all__ = [
     "scan",
@@ -13,5 +24,7 @@ __all__ = [
     "ocr",
     "location",
     "events",
+    "index",
+    "walk",
     "__version__",
 ]
@@ -2,9 +2,13 @@
 
 from __future__ import annotations
 
+from typing import Callable, Dict, List, Sequence, Tuple
 
+import numpy as np
 from PIL import Image
 
+from .stats import timed
+
 # Attempt to import torch and torchvision. If unavailable, we fall back to a
 # dummy classifier so that the rest of the package remains functional even
 # without the heavy ML dependencies.
@@ -72,6 +76,131 @@ def _map_label_to_category(label: str) -> str:
     return "other"
 
 
+# Fallback heuristic used when no model is available. Every image is
+# reduced to a small thumbnail, the registered features are computed for a
+# whole batch of thumbnails at once, and the rules are tried in order.
+_THUMB_SIZE = (64, 64)
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+Feature = Callable[[np.ndarray], np.ndarray]
+Rule = Callable[[Dict[str, np.ndarray]], np.ndarray]
+
+
+def _luminance(thumbs: np.ndarray) -> np.ndarray:
+    return thumbs @ _LUMA
+
+
+def _saturation(thumbs: np.ndarray) -> np.ndarray:
+    high = thumbs.max(axis=-1)
+    low = thumbs.min(axis=-1)
+    return np.where(high > 0, (high - low) / np.maximum(high, 1e-6), 0.0)
+
+
+def _gradients(thumbs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    lum = _luminance(thumbs)
+    return np.abs(np.diff(lum, axis=2)), np.abs(np.diff(lum, axis=1))
+
+
+def _edge_density(thumbs: np.ndarray) -> np.ndarray:
+    dx, dy = _gradients(thumbs)
+    strong = (dx[:, :-1, :] > 0.1) | (dy[:, :, :-1] > 0.1)
+    return strong.mean(axis=(1, 2))
+
+
+def _flat_fraction(thumbs: np.ndarray) -> np.ndarray:
+    dx, _ = _gradients(thumbs)
+    return (dx < 1.0 / 255).mean(axis=(1, 2))
+
+
+def _white_fraction(thumbs: np.ndarray) -> np.ndarray:
+    white = (_luminance(thumbs) > 0.85) & (_saturation(thumbs) < 0.15)
+    return white.mean(axis=(1, 2))
+
+
+_FEATURES: Dict[str, Feature] = {
+    "red": lambda t: t[..., 0].mean(axis=(1, 2)),
+    "green": lambda t: t[..., 1].mean(axis=(1, 2)),
+    "blue": lambda t: t[..., 2].mean(axis=(1, 2)),
+    "saturation": lambda t: _saturation(t).mean(axis=(1, 2)),
+    "edge_density": _edge_density,
+    "flat_fraction": _flat_fraction,
+    "white_fraction": _white_fraction,
+}
+
+_RULES: List[Tuple[str, Rule]] = [
+    # Mostly white, unsaturated pages with some text strokes.
+    (
+        "document",
+        lambda f: (f["white_fraction"] > 0.5)
+        & (f["saturation"] < 0.2)
+        & (f["edge_density"] > 0.01),
+    ),
+    # Large perfectly flat areas separated by sharp edges.
+    (
+        "screenshot",
+        lambda f: (f["flat_fraction"] > 0.6) & (f["edge_density"] > 0.01),
+    ),
+    # Mostly green.
+    (
+        "nature",
+        lambda f: (f["green"] > f["red"]) & (f["green"] > f["blue"]),
+    ),
+]
+
+
+def register_feature(name: str, feature: Feature) -> None:
+    """Add or replace a fallback feature.
+
+    *feature* receives an ``(N, H, W, 3)`` float32 array of thumbnails in
+    ``[0, 1]`` and returns one value per thumbnail.
+    """
+    _FEATURES[name] = feature
+
+
+def register_rule(category: str, rule: Rule, position: int = 0) -> None:
+    """Insert a fallback rule; earlier rules take precedence.
+
+    *rule* receives the feature dictionary for a batch and returns a
+    boolean array marking the thumbnails that belong to *category*.
+    """
+    _RULES.insert(position, (category, rule))
+
+
+def heuristic_features(thumbs: np.ndarray) -> Dict[str, np.ndarray]:
+    """Compute every registered feature for a batch of thumbnails."""
+    return {name: feature(thumbs) for name, feature in _FEATURES.items()}
+
+
+def classify_thumbnails(thumbs: np.ndarray) -> List[str]:
+    """Apply the fallback rules to an ``(N, H, W, 3)`` thumbnail batch."""
+    features = heuristic_features(thumbs)
+    result = np.full(len(thumbs), "other", dtype=object)
+    undecided = np.ones(len(thumbs), dtype=bool)
+    for category, rule in _RULES:
+        hit = undecided & np.asarray(rule(features), dtype=bool)
+        result[hit] = category
+        undecided &= ~hit
+    return result.tolist()
+
+
+def _fallback_categories(images: Sequence[Image.Image]) -> List[str]:
+    """Classify *images* with the vectorized colour and edge heuristic."""
+    categories = ["other"] * len(images)
+    thumbs = []
+    positions = []
+    for i, img in enumerate(images):
+        try:
+            thumbs.append(np.asarray(img.convert("RGB").resize(_THUMB_SIZE)))
+            positions.append(i)
+        except Exception:
+            pass
+    if thumbs:
+        batch = np.stack(thumbs).astype(np.float32) / 255.0
+        for i, category in zip(positions, classify_thumbnails(batch)):
+            categories[i] = category
+    return categories
+
+
 def classify_image(img: Image.Image) -> str:
     """Return a coarse image category for *img*."""
     if _classifier is None:
@@ -92,19 +221,56 @@ def classify_image(img: Image.Image) -> str:
         except Exception:
             pass
 
-    # Fallback heuristic: if the image is mostly green, consider it nature.
-    try:
-        small = img.convert("RGB").resize((32, 32))
-        data = list(small.getdata())
-        greens = sum(p[1] for p in data)
-        reds = sum(p[0] for p in data)
-        blues = sum(p[2] for p in data)
-        if greens > reds and greens > blues:
-            return "nature"
-    except Exception:
-        pass
+    return _fallback_categories([img])[0]
 
-    return "other"
+
+@timed("classify")
+def classify_images(
+    images: Sequence[Image.Image], batch_size: int = 32
+) -> List[str]:
+    """Return a coarse image category for every image in *images*.
+
+    Preprocessed tensors are stacked into batches of *batch_size* and
+    each batch goes through a single forward pass. Images of a batch that
+    fails, or all images when no model is available, are classified
+    together by the vectorized fallback heuristic.
+    """
+    if _classifier is None:
+        load_classifier()
+
+    categories: List[str | None] = [None] * len(images)
+    if (
+        _classifier is not None
+        and transforms is not None
+        and torch is not None
+    ):
+        labels = MobileNet_V2_Weights.DEFAULT.meta["categories"]
+        for start in range(0, len(images), max(1, batch_size)):
+            chunk = images[start:start + max(1, batch_size)]
+            try:  # pragma: no cover - runtime inference
+                tensor = torch.stack([_transform(img) for img in chunk])
+                with torch.no_grad():
+                    logits = _classifier(tensor)
+                for offset, idx in enumerate(logits.argmax(1).tolist()):
+                    categories[start + offset] = _map_label_to_category(
+                        labels[idx]
+                    )
+            except Exception:
+                pass
+
+    missing = [i for i, category in enumerate(categories) if category is None]
+    fallback = _fallback_categories([images[i] for i in missing])
+    for i, category in zip(missing, fallback):
+        categories[i] = category
+    return categories  # type: ignore[return-value]
 
 
-__all__ = ["load_classifier", "classify_image"]
+__all__ = [
+    "load_classifier",
+    "classify_image",
+    "classify_images",
+    "classify_thumbnails",
+    "heuristic_features",
+    "register_feature",
+    "register_rule",
+]
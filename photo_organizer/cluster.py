@@ -2,11 +2,31 @@
 
 from __future__ import annotations
 
+import os
+import sqlite3
 from typing import List, Dict, Any, Iterable
 
 import numpy as np
 from sklearn.cluster import DBSCAN
 
+from .db import (
+    get_face_ids,
+    get_face_paths,
+    load_embeddings,
+    next_cluster_id,
+    set_face_clusters,
+)
+from .index import FaceIndex
+
+
+def cluster_embeddings(
+    embeddings: np.ndarray, eps: float = 0.5, min_samples: int = 3
+) -> np.ndarray:
+    """Return a DBSCAN cluster label for every row of *embeddings*."""
+    if len(embeddings) == 0:
+        return np.empty(0, dtype=int)
+    return DBSCAN(eps=eps, min_samples=min_samples).fit(embeddings).labels_
+
 
 def cluster_faces(
     metadata: List[Dict[str, Any]],
@@ -28,13 +48,148 @@ def cluster_faces(
                 faces.append(face)
 
     if embeddings:
-        arr = np.array(embeddings)
-        labels = DBSCAN(eps=eps, min_samples=min_samples).fit(arr).labels_
+        labels = cluster_embeddings(np.array(embeddings), eps, min_samples)
         for face, label in zip(faces, labels):
             face["cluster_id"] = int(label)
     return metadata
 
 
+def cluster_stored_faces(
+    conn: sqlite3.Connection,
+    folder: str | None = None,
+    eps: float = 0.5,
+    min_samples: int = 3,
+) -> int:
+    """Cluster the faces stored in the database and save the labels.
+
+    Like :func:`cluster_faces`, but the embeddings are loaded from the
+    ``faces`` table as a single array and the labels are written back to
+    it. Only photos below *folder* are considered when it is given.
+    Returns the number of clustered faces.
+    """
+    face_ids, embeddings = load_embeddings(conn, folder)
+    if len(face_ids) == 0:
+        return 0
+    labels = cluster_embeddings(embeddings, eps, min_samples)
+    set_face_clusters(conn, face_ids, labels)
+    return len(face_ids)
+
+
+def assign_new_faces(
+    conn: sqlite3.Connection,
+    index: FaceIndex,
+    eps: float = 0.5,
+    min_samples: int = 3,
+    k: int = 10,
+    nprobe: int = 8,
+) -> int:
+    """Cluster stored faces that have no ``cluster_id`` yet.
+
+    Each new face is looked up in *index* and joins the most common
+    cluster among its neighbours within *eps*. Faces without such a
+    neighbour are clustered with DBSCAN together with the stored noise
+    faces (``cluster_id`` ``-1``), so faces that are too few per scan to
+    form a cluster still find each other over several scans. New
+    clusters get ids above every cluster id stored in the database,
+    labelled ones included, and noise faces that join one are relabeled.
+    The labels are saved and the new faces are added to *index*. Returns
+    the number of new faces.
+    """
+    face_ids, embeddings = load_embeddings(conn, unclustered=True)
+    if len(face_ids) == 0:
+        return 0
+    labels = np.full(len(face_ids), -1, dtype=np.int64)
+    _, neighbour_labels, distances = index.search(embeddings, k, nprobe)
+    close = (distances <= eps) & (neighbour_labels >= 0)
+    for i in np.flatnonzero(close.any(axis=1)):
+        labels[i] = np.bincount(neighbour_labels[i][close[i]]).argmax()
+
+    rest = labels < 0
+    if rest.any():
+        noise = index.labels < 0
+        fresh = cluster_embeddings(
+            np.concatenate([embeddings[rest], index.vectors[noise]]),
+            eps,
+            min_samples,
+        )
+        next_id = next_cluster_id(conn)
+        fresh = np.where(fresh >= 0, fresh + next_id, -1)
+        n_rest = int(rest.sum())
+        labels[rest] = fresh[:n_rest]
+        joined = fresh[n_rest:] >= 0
+        if joined.any():
+            noise_ids = index.ids[noise][joined]
+            set_face_clusters(conn, noise_ids, fresh[n_rest:][joined])
+            index.set_labels(noise_ids, fresh[n_rest:][joined])
+    set_face_clusters(conn, face_ids, labels)
+    index.add(face_ids, embeddings, labels)
+    return len(face_ids)
+
+
+def update_face_index(
+    conn: sqlite3.Connection,
+    path: str,
+    eps: float = 0.5,
+    min_samples: int = 3,
+    rebuild: bool = False,
+) -> FaceIndex:
+    """Bring the face index at *path* in line with the database.
+
+    Without an index file (or with *rebuild*) every stored face is
+    clustered from scratch and a new index is built.
+    Otherwise faces that disappeared from the database are dropped from
+    the index and new faces are handled by :func:`assign_new_faces`.
+    The index is saved to *path* and returned.
+    """
+    if rebuild or not os.path.exists(path):
+        face_ids, embeddings = load_embeddings(conn)
+        labels = cluster_embeddings(embeddings, eps, min_samples)
+        set_face_clusters(conn, face_ids, labels)
+        index = FaceIndex.build(face_ids, embeddings, labels)
+    else:
+        index = FaceIndex.load(path)
+        stale = np.setdiff1d(index.ids, get_face_ids(conn))
+        if len(stale):
+            index.remove(stale)
+        assign_new_faces(conn, index, eps, min_samples)
+    index.save(path)
+    return index
+
+
+def find_face_photos(
+    conn: sqlite3.Connection,
+    index: FaceIndex,
+    face_id: int,
+    k: int = 50,
+    max_distance: float = 0.5,
+    nprobe: int = 8,
+) -> List[Dict[str, Any]]:
+    """Return photos containing faces similar to the stored *face_id*.
+
+    Each result holds the ``path``, the matching ``face_id`` and its
+    ``distance``; the closest match per photo is kept and results are
+    ordered by distance.
+    """
+    rows = np.flatnonzero(index.ids == face_id)
+    if len(rows) == 0:
+        return []
+    ids, _, distances = index.search(index.vectors[rows[:1]], k, nprobe)
+    matches = [
+        (int(fid), float(dist))
+        for fid, dist in zip(ids[0], distances[0])
+        if fid >= 0 and dist <= max_distance
+    ]
+    paths = get_face_paths(conn, [fid for fid, _ in matches])
+    results: List[Dict[str, Any]] = []
+    seen: set[str] = set()
+    for fid, dist in matches:
+        path = paths.get(fid)
+        if path is not None and path not in seen:
+            seen.add(path)
+            results.append({"path": path, "face_id": fid, "distance": dist})
+    return results
+
+
 def group_by_face(
     metadata: Iterable[Dict[str, Any]]
 ) -> Dict[int, List[Dict[str, Any]]]:
@@ -56,4 +211,12 @@ def group_by_face(
     return groups
 
 
-__all__ = ["cluster_faces", "group_by_face"]
+__all__ = [
+    "cluster_embeddings",
+    "cluster_faces",
+    "cluster_stored_faces",
+    "assign_new_faces",
+    "update_face_index",
+    "find_face_photos",
+    "group_by_face",
+]
@@ -2,42 +2,1137 @@
 
 from __future__ import annotations
 
+import base64
 import sqlite3
 import json
-from typing import Dict, Iterable, Any
+import os
+from typing import Callable, Dict, Iterable, Iterator, Any, List, Tuple
+from urllib.request import pathname2url
+
+import numpy as np
+
+from .stats import timed
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS photos (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     path TEXT UNIQUE,
-    metadata TEXT
+    metadata TEXT,
+    size INTEGER,
+    mtime REAL,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS faces (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    photo_id INTEGER NOT NULL REFERENCES photos(id) ON DELETE CASCADE,
+    x1 INTEGER,
+    y1 INTEGER,
+    x2 INTEGER,
+    y2 INTEGER,
+    cluster_id INTEGER,
+    embedding BLOB
 );
+CREATE INDEX IF NOT EXISTS faces_photo_id ON faces(photo_id);
+CREATE INDEX IF NOT EXISTS faces_cluster_id ON faces(cluster_id);
 CREATE TABLE IF NOT EXISTS face_labels (
     cluster_id INTEGER PRIMARY KEY,
     name TEXT
 );
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    name TEXT,
+    photos INTEGER NOT NULL DEFAULT 0,
+    gap_hours REAL NOT NULL,
+    stale INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Columns added after the initial schema. Databases created by earlier
+# versions are upgraded in place by ``init_db``.
+_PHOTO_COLUMNS = {
+    "size": "INTEGER",
+    "mtime": "REAL",
+    "fingerprint": "TEXT",
+}
+
+
+# Virtual columns generated from the metadata JSON, so they can never
+# drift from it. ``taken_at`` turns the EXIF ``YYYY:MM:DD HH:MM:SS``
+# timestamp into ISO ``YYYY-MM-DD HH:MM:SS`` for range queries.
+_TIMESTAMP = "json_extract(metadata, '$.exif.timestamp')"
+_GENERATED_COLUMNS = {
+    "taken_at": (
+        f"CASE WHEN {_TIMESTAMP} GLOB "
+        "'[0-9][0-9][0-9][0-9]:[0-9][0-9]:[0-9][0-9]*' "
+        f"THEN replace(substr({_TIMESTAMP}, 1, 10), ':', '-') "
+        f"|| substr({_TIMESTAMP}, 11) END"
+    ),
+    "category": "json_extract(metadata, '$.category')",
+    "city": "json_extract(metadata, '$.city')",
+    "state": "json_extract(metadata, '$.state')",
+    "country": "json_extract(metadata, '$.country')",
+    "camera": "json_extract(metadata, '$.exif.camera')",
+    "event_id": "json_extract(metadata, '$.event_id')",
+    # Content hashes written by the scan; see ``photo_organizer.duplicates``.
+    "sha256": "json_extract(metadata, '$.sha256')",
+    "dhash": "json_extract(metadata, '$.dhash')",
+    "phash": "json_extract(metadata, '$.phash')",
+}
+
+
+# Generated columns that are read but not filtered on, hence not indexed.
+_TEXT_COLUMNS = {"ocr_text": "json_extract(metadata, '$.ocr_text')"}
+
+# ``photos_fts`` indexes ``ocr_text`` as an external-content FTS5 table;
+# the triggers keep it in step with every insert, update and delete. Rows
+# without text are never indexed, so documents are all that is stored.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE photos_fts USING fts5(
+    ocr_text,
+    content='photos',
+    content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER photos_fts_insert AFTER INSERT ON photos
+WHEN new.ocr_text <> '' BEGIN
+    INSERT INTO photos_fts(rowid, ocr_text) VALUES (new.id, new.ocr_text);
+END;
+CREATE TRIGGER photos_fts_delete AFTER DELETE ON photos
+WHEN old.ocr_text <> '' BEGIN
+    INSERT INTO photos_fts(photos_fts, rowid, ocr_text)
+    VALUES ('delete', old.id, old.ocr_text);
+END;
+CREATE TRIGGER photos_fts_update AFTER UPDATE OF metadata ON photos
+WHEN old.ocr_text IS NOT new.ocr_text BEGIN
+    INSERT INTO photos_fts(photos_fts, rowid, ocr_text)
+    SELECT 'delete', old.id, old.ocr_text WHERE old.ocr_text <> '';
+    INSERT INTO photos_fts(rowid, ocr_text)
+    SELECT new.id, new.ocr_text WHERE new.ocr_text <> '';
+END;
 """
 
 
-def init_db(path: str = "photo.db") -> sqlite3.Connection:
-    """Initialize and return a database connection."""
-    conn = sqlite3.connect(path)
+# Events whose photos were deleted, retimed or moved are marked stale, so
+# ``photo_organizer.events.update_events`` only revisits those. Run after
+# ``_migrate`` as they read the generated columns.
+EVENTS_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS photos_event_delete AFTER DELETE ON photos
+WHEN old.event_id IS NOT NULL BEGIN
+    UPDATE events SET stale = 1 WHERE id = old.event_id;
+END;
+CREATE TRIGGER IF NOT EXISTS photos_event_update AFTER UPDATE OF metadata
+ON photos
+WHEN old.event_id IS NOT NULL AND (
+    new.event_id IS NOT old.event_id OR new.taken_at IS NOT old.taken_at
+) BEGIN
+    UPDATE events SET stale = 1 WHERE id = old.event_id;
+END;
+"""
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def _migrate(conn: sqlite3.Connection, had_faces: bool) -> None:
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(photos)")}
+    for name, decl in _PHOTO_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE photos ADD COLUMN {name} {decl}")
+    existing = {
+        row[1] for row in conn.execute("PRAGMA table_xinfo(photos)")
+    }
+    for name, expr in {**_GENERATED_COLUMNS, **_TEXT_COLUMNS}.items():
+        if name not in existing:
+            conn.execute(
+                f"ALTER TABLE photos ADD COLUMN {name} "
+                f"GENERATED ALWAYS AS ({expr}) VIRTUAL"
+            )
+    for name in _GENERATED_COLUMNS:
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS photos_{name} ON photos({name})"
+        )
+    if had_faces:
+        return
+    # Older versions kept faces, including embeddings, inside the JSON.
+    rows = conn.execute(
+        "SELECT id, metadata FROM photos WHERE metadata LIKE '%\"faces\"%'"
+    ).fetchall()
+    for photo_id, text in rows:
+        entry = json.loads(text)
+        _insert_faces(conn, photo_id, entry.pop("faces", []))
+        conn.execute(
+            "UPDATE photos SET metadata=? WHERE id=?",
+            (json.dumps(entry), photo_id),
+        )
+
+
+# Settings applied to every connection. WAL lets readers, such as the UI,
+# query the database while a scan is writing to it, and with WAL a
+# ``NORMAL`` sync level is still safe against corruption; only the last
+# transactions can be lost on power failure. ``cache_size`` is negative
+# to give a size in KiB rather than pages.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+}
+
+# Bumped whenever ``init_db`` has new migration work to do, so opening an
+# up-to-date database skips the schema script entirely.
+SCHEMA_VERSION = 3
+
+
+def connect(
+    path: str = "photo.db",
+    readonly: bool = False,
+    timeout: float = 30.0,
+    **pragmas: Any,
+) -> sqlite3.Connection:
+    """Open *path* with the tuned :data:`PRAGMAS` applied.
+
+    With *readonly* the file is opened in read-only mode, so a reader can
+    never take the write lock away from a running scan. Writers wait up
+    to *timeout* seconds for a lock held by another connection. Keyword
+    arguments override single pragmas, e.g. ``synchronous="FULL"``. The
+    schema is not touched; use :func:`init_db` for that.
+    """
+    settings = {**PRAGMAS, **pragmas}
+    if readonly:
+        uri = "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=timeout)
+        # The journal mode is stored in the file and set by writers.
+        settings.pop("journal_mode", None)
+    else:
+        conn = sqlite3.connect(path, timeout=timeout)
+    for name, value in settings.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def init_db(path: str = "photo.db", **pragmas: Any) -> sqlite3.Connection:
+    """Return a :func:`connect` connection with an up-to-date schema."""
+    conn = connect(path, **pragmas)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return conn
+    had_faces = _has_table(conn, "faces")
     conn.executescript(SCHEMA)
+    _migrate(conn, had_faces)
+    conn.executescript(EVENTS_TRIGGERS)
+    _init_fts(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
     return conn
 
 
-def insert_metadata(
-    conn: sqlite3.Connection, metadata: Iterable[Dict[str, Any]]
+def _init_fts(conn: sqlite3.Connection) -> None:
+    """Create and fill ``photos_fts`` unless SQLite lacks FTS5."""
+    if _has_table(conn, "photos_fts"):
+        return
+    try:
+        conn.executescript("BEGIN;" + FTS_SCHEMA)
+    except sqlite3.OperationalError:  # pragma: no cover - no FTS5 build
+        conn.rollback()
+        return
+    conn.execute("INSERT INTO photos_fts(photos_fts) VALUES ('rebuild')")
+
+
+def has_fts(conn: sqlite3.Connection) -> bool:
+    """Return whether the full-text index over OCR text is available."""
+    return _has_table(conn, "photos_fts")
+
+
+def _pack_embedding(embedding: Any) -> bytes | None:
+    """Return *embedding* as raw float32 bytes."""
+    if embedding is None:
+        return None
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+_INSERT_FACE = (
+    "INSERT INTO faces(photo_id, x1, y1, x2, y2, cluster_id, embedding) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _face_rows(
+    photo_id: int, faces: Iterable[Dict[str, Any]]
+) -> Iterator[Tuple[Any, ...]]:
+    for face in faces:
+        box = face.get("box") or [None] * 4
+        yield (
+            photo_id,
+            *box,
+            face.get("cluster_id"),
+            _pack_embedding(face.get("embedding")),
+        )
+
+
+def _insert_faces(
+    conn: sqlite3.Connection,
+    photo_id: int,
+    faces: Iterable[Dict[str, Any]],
 ) -> None:
-    """Insert scanned metadata into the database."""
-    with conn:
-        for entry in metadata:
+    conn.executemany(_INSERT_FACE, _face_rows(photo_id, faces))
+
+
+def _record(entry: Dict[str, Any]) -> str:
+    """Return the JSON stored in ``photos.metadata`` for *entry*.
+
+    Faces live in the ``faces`` table and are left out of the JSON.
+    """
+    return json.dumps({k: v for k, v in entry.items() if k != "faces"})
+
+
+def get_faces(
+    conn: sqlite3.Connection, photo_id: int, with_embeddings: bool = False
+) -> List[Dict[str, Any]]:
+    """Return the faces stored for *photo_id* in detection order.
+
+    Each face has its ``id``, a ``box`` and, when assigned, a
+    ``cluster_id``. With
+    *with_embeddings* the embedding is included as a float32 array that
+    shares memory with the stored BLOB.
+    """
+    faces: List[Dict[str, Any]] = []
+    rows = conn.execute(
+        "SELECT id, x1, y1, x2, y2, cluster_id, embedding FROM faces "
+        "WHERE photo_id=? ORDER BY id",
+        (photo_id,),
+    )
+    for face_id, x1, y1, x2, y2, cluster_id, blob in rows:
+        face: Dict[str, Any] = {"id": face_id}
+        if x1 is not None:
+            face["box"] = [x1, y1, x2, y2]
+        if cluster_id is not None:
+            face["cluster_id"] = cluster_id
+        if with_embeddings and blob is not None:
+            face["embedding"] = np.frombuffer(blob, dtype=np.float32)
+        faces.append(face)
+    return faces
+
+
+def _load_entry(
+    conn: sqlite3.Connection,
+    photo_id: int,
+    text: str,
+    with_embeddings: bool = False,
+) -> Dict[str, Any]:
+    entry = json.loads(text)
+    entry["faces"] = get_faces(conn, photo_id, with_embeddings)
+    return entry
+
+
+@timed("db_commit")
+def _commit(conn: sqlite3.Connection) -> None:
+    conn.commit()
+
+
+# Rows buffered per ``executemany`` call, and the most paths looked up
+# in one ``IN (...)`` query; both stay below SQLite's variable limit.
+WRITE_BATCH = 500
+
+# Called with the entries of a commit once it is done.
+Committed = Callable[[List[Dict[str, Any]]], None]
+
+# A true upsert keeps the ``id`` of a rescanned photo, unlike
+# ``INSERT OR REPLACE`` which deletes the row and allocates a new one.
+_UPSERT = (
+    "INSERT INTO photos(path, metadata, size, mtime, fingerprint) "
+    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+    "metadata=excluded.metadata, size=excluded.size, "
+    "mtime=excluded.mtime, fingerprint=excluded.fingerprint"
+)
+
+
+def _by_path(
+    conn: sqlite3.Connection, column: str, paths: List[str]
+) -> Dict[str, Any]:
+    """Return *column* of the stored rows for *paths*, keyed by path."""
+    found: Dict[str, Any] = {}
+    for i in range(0, len(paths), WRITE_BATCH):
+        chunk = paths[i:i + WRITE_BATCH]
+        marks = ", ".join("?" * len(chunk))
+        found.update(
             conn.execute(
-                "INSERT OR REPLACE INTO photos(path, metadata) "
-                "VALUES (?, ?)",
-                (entry["path"], json.dumps(entry)),
+                f"SELECT path, {column} FROM photos WHERE path IN ({marks})",
+                chunk,
             )
+        )
+    return found
+
+
+def _latest(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop all but the last of several entries for the same path."""
+    return list({entry["path"]: entry for entry in entries}.values())
+
+
+@timed("db_write")
+def _write_entries(
+    conn: sqlite3.Connection, entries: List[Dict[str, Any]]
+) -> None:
+    entries = _latest(entries)
+    conn.executemany(
+        _UPSERT,
+        [
+            (
+                entry["path"],
+                _record(entry),
+                entry.get("size"),
+                entry.get("mtime"),
+                entry.get("fingerprint"),
+            )
+            for entry in entries
+        ],
+    )
+    ids = _by_path(conn, "id", [entry["path"] for entry in entries])
+    # Upserted rows keep their old faces; replace them explicitly.
+    conn.executemany(
+        "DELETE FROM faces WHERE photo_id=?", [(i,) for i in ids.values()]
+    )
+    conn.executemany(
+        _INSERT_FACE,
+        [
+            row
+            for entry in entries
+            for row in _face_rows(ids[entry["path"]], entry.get("faces", []))
+        ],
+    )
+
+
+def _write_batches(
+    conn: sqlite3.Connection,
+    metadata: Iterable[Dict[str, Any]],
+    write: Callable[[sqlite3.Connection, List[Dict[str, Any]]], None],
+    chunk_size: int | None,
+    on_commit: Committed | None = None,
+) -> int:
+    """Pass *metadata* to *write* in batches and commit every *chunk_size*.
+
+    Without *chunk_size* everything goes into one transaction that is
+    rolled back on error; otherwise an error commits the rows read so
+    far before it is re-raised. *on_commit* is called with the entries
+    of every successful commit once it is done.
+    """
+    size = min(chunk_size or WRITE_BATCH, WRITE_BATCH)
+    batch: List[Dict[str, Any]] = []
+    pending: List[Dict[str, Any]] = []
+    count = 0
+    try:
+        for entry in metadata:
+            batch.append(entry)
+            if len(batch) < size:
+                continue
+            rows, batch = batch, []
+            write(conn, rows)
+            count += len(rows)
+            pending.extend(rows)
+            if chunk_size and len(pending) >= chunk_size:
+                _commit(conn)
+                if on_commit is not None:
+                    on_commit(pending)
+                pending = []
+        if batch:
+            rows, batch = batch, []
+            write(conn, rows)
+            count += len(rows)
+            pending.extend(rows)
+    except BaseException:
+        if chunk_size:
+            try:
+                if batch:
+                    write(conn, batch)
+            finally:
+                conn.commit()
+        else:
+            conn.rollback()
+        raise
+    _commit(conn)
+    if on_commit is not None and pending:
+        on_commit(pending)
+    return count
+
+
+def insert_metadata(
+    conn: sqlite3.Connection,
+    metadata: Iterable[Dict[str, Any]],
+    chunk_size: int | None = None,
+    on_commit: Committed | None = None,
+) -> int:
+    """Insert scanned metadata into the database.
+
+    *metadata* may be any iterable, including a generator that is still
+    scanning. Rows are written :data:`WRITE_BATCH` at a time with
+    ``executemany`` upserts, so a rescanned photo keeps its ``id``. With
+    *chunk_size* the rows are committed every *chunk_size* records, so an
+    interrupted run keeps everything written so far; otherwise all rows
+    go into a single transaction. Face boxes and embeddings are written
+    to the ``faces`` table, one row per face, replacing any faces
+    previously stored for the same path. *on_commit* is called with the
+    entries of each commit after it succeeded, so they are visible to
+    other connections by then. Returns the number of rows written.
+    """
+    return _write_batches(
+        conn, metadata, _write_entries, chunk_size, on_commit
+    )
+
+
+# Keys written by a metadata-only scan. Everything else in a stored entry,
+# such as faces, category or OCR text, is left as it is.
+METADATA_FIELDS = ("exif", "city", "state", "country")
+
+
+def merge_metadata(
+    conn: sqlite3.Connection,
+    metadata: Iterable[Dict[str, Any]],
+    chunk_size: int | None = None,
+    fields: Iterable[str] = METADATA_FIELDS,
+    on_commit: Committed | None = None,
+) -> int:
+    """Update only *fields* of the stored entries for *metadata*.
+
+    Keys from *fields* that an entry lacks are removed from the stored
+    entry, so a photo whose GPS data disappeared loses its location.
+    Photos not yet in the database are added without a file signature,
+    so a later incremental scan still runs the full pipeline on them.
+    Commits every *chunk_size* rows and calls *on_commit* like
+    :func:`insert_metadata`, and returns the number of rows written.
+    """
+    fields = tuple(fields)
+
+    def write(
+        conn: sqlite3.Connection, entries: List[Dict[str, Any]]
+    ) -> None:
+        _merge_entries(conn, entries, fields)
+
+    return _write_batches(conn, metadata, write, chunk_size, on_commit)
+
+
+@timed("db_write")
+def _merge_entries(
+    conn: sqlite3.Connection,
+    entries: List[Dict[str, Any]],
+    fields: Tuple[str, ...],
+) -> None:
+    stored = _by_path(conn, "metadata", [entry["path"] for entry in entries])
+    records: Dict[str, str] = {}
+    for entry in entries:
+        path = entry["path"]
+        text = records.get(path, stored.get(path))
+        if text is None:
+            records[path] = _record(entry)
+            continue
+        merged = json.loads(text)
+        for key in fields:
+            if key in entry:
+                merged[key] = entry[key]
+            else:
+                merged.pop(key, None)
+        records[path] = _record(merged)
+    conn.executemany(
+        "INSERT INTO photos(path, metadata) VALUES (?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET metadata=excluded.metadata",
+        list(records.items()),
+    )
+
+
+def _folder_filter(
+    folder: str | None, column: str = "path", keyword: str = "WHERE"
+) -> Tuple[str, Tuple[Any, ...]]:
+    """Return a WHERE clause selecting paths below *folder*.
+
+    *column* names the path column, qualified with a table alias where
+    the query needs one, and *keyword* starts the clause, ``AND`` when it
+    extends an existing WHERE.
+    """
+    if folder is None:
+        return "", ()
+    prefix = os.path.join(folder, "")
+    return f" {keyword} substr({column}, 1, ?) = ?", (len(prefix), prefix)
+
+
+def get_signatures(
+    conn: sqlite3.Connection, folder: str | None = None
+) -> Dict[str, Dict[str, Any]]:
+    """Return stored ``size``/``mtime``/``fingerprint`` keyed by path.
+
+    Only photos below *folder* are returned when it is given. The
+    metadata JSON is not parsed, so this stays cheap for large libraries.
+    """
+    where, params = _folder_filter(folder)
+    rows = conn.execute(
+        "SELECT path, size, mtime, fingerprint FROM photos" + where, params
+    )
+    return {
+        path: {"size": size, "mtime": mtime, "fingerprint": fingerprint}
+        for path, size, mtime, fingerprint in rows
+    }
+
+
+def get_digests(
+    conn: sqlite3.Connection, paths: Iterable[str]
+) -> Dict[str, str]:
+    """Return the stored SHA-256 of each of *paths*.
+
+    Paths without a row or without a digest are left out.
+    """
+    found = _by_path(conn, "sha256", list(paths))
+    return {path: digest for path, digest in found.items() if digest}
+
+
+def get_by_digest(
+    conn: sqlite3.Connection,
+    digest: str,
+    path: str | None = None,
+    version: int | None = None,
+) -> Dict[str, Any] | None:
+    """Return a stored entry whose file content has SHA-256 *digest*.
+
+    Photos stored under *path* are skipped, and with *version* only
+    entries whose ``results_version`` equals it are returned. Faces
+    include their embeddings. ``None`` when no photo matches.
+    """
+    sql = "SELECT id, metadata FROM photos WHERE sha256=?"
+    params: Tuple[Any, ...] = (digest,)
+    if path is not None:
+        sql += " AND path<>?"
+        params += (path,)
+    if version is not None:
+        sql += " AND json_extract(metadata, '$.results_version')=?"
+        params += (version,)
+    row = conn.execute(sql + " LIMIT 1", params).fetchone()
+    if row is None:
+        return None
+    return _load_entry(conn, *row, with_embeddings=True)
+
+
+def get_hashes(
+    conn: sqlite3.Connection, folder: str | None = None
+) -> List[Tuple[str, str | None, str | None]]:
+    """Return ``(path, sha256, phash)`` of every photo with a hash.
+
+    Only photos below *folder* are returned when it is given.
+    """
+    where, params = _folder_filter(folder)
+    where += " AND " if where else " WHERE "
+    return conn.execute(
+        "SELECT path, sha256, phash FROM photos"
+        + where
+        + "(sha256 IS NOT NULL OR phash IS NOT NULL) ORDER BY path",
+        params,
+    ).fetchall()
+
+
+def iter_metadata(
+    conn: sqlite3.Connection,
+    folder: str | None = None,
+    with_embeddings: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """Yield stored metadata entries one at a time, ordered by path.
+
+    Only photos below *folder* are returned when it is given. Faces are
+    attached from the ``faces`` table; see :func:`get_faces`.
+    """
+    where, params = _folder_filter(folder)
+    cur = conn.execute(
+        "SELECT id, metadata FROM photos" + where + " ORDER BY path", params
+    )
+    for photo_id, text in cur:
+        yield _load_entry(conn, photo_id, text, with_embeddings)
+
+
+def update_metadata(
+    conn: sqlite3.Connection, entries: Iterable[Dict[str, Any]]
+) -> None:
+    """Rewrite the metadata JSON of existing rows in place.
+
+    Stored faces are left untouched.
+    """
+    with conn:
+        conn.executemany(
+            "UPDATE photos SET metadata=? WHERE path=?",
+            ((_record(entry), entry["path"]) for entry in entries),
+        )
+
+
+# Filters of :func:`query_photos` that compare a column for equality.
+QUERY_FIELDS = tuple(_GENERATED_COLUMNS) + ("path",)
+_ORDER_COLUMNS = QUERY_FIELDS + ("size", "mtime", "id")
+
+
+def _photo_filter(
+    folder: str | None = None,
+    since: Any = None,
+    until: Any = None,
+    **filters: Any,
+) -> Tuple[str, Tuple[Any, ...]]:
+    """Return a WHERE clause for the filters of :func:`query_photos`."""
+    clauses: List[str] = []
+    params: List[Any] = []
+    if folder is not None:
+        prefix = os.path.join(folder, "")
+        clauses.append("substr(path, 1, ?) = ?")
+        params += [len(prefix), prefix]
+    for name, value in filters.items():
+        if name not in QUERY_FIELDS:
+            raise ValueError(f"unknown filter: {name}")
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set, frozenset)):
+            values = list(value)
+            marks = ", ".join("?" * len(values))
+            clauses.append(f"{name} IN ({marks})")
+            params += values
+        else:
+            clauses.append(f"{name} = ?")
+            params.append(value)
+    if since is not None:
+        clauses.append("taken_at >= ?")
+        params.append(_iso(since))
+    if until is not None:
+        clauses.append("taken_at < ?")
+        params.append(_iso(until))
+    if not clauses:
+        return "", ()
+    return " WHERE " + " AND ".join(clauses), tuple(params)
+
+
+def _iso(value: Any) -> str:
+    if hasattr(value, "isoformat"):
+        try:
+            return value.isoformat(sep=" ")
+        except TypeError:  # ``date`` has no ``sep``
+            return value.isoformat()
+    return str(value)
+
+
+def query_photos(
+    conn: sqlite3.Connection,
+    folder: str | None = None,
+    since: Any = None,
+    until: Any = None,
+    order_by: str = "taken_at",
+    descending: bool = False,
+    limit: int | None = None,
+    offset: int = 0,
+    with_embeddings: bool = False,
+    **filters: Any,
+) -> List[Dict[str, Any]]:
+    """Return stored entries matching every given filter.
+
+    *filters* name one of :data:`QUERY_FIELDS` (``category``, ``city``,
+    ``state``, ``country``, ``camera``, ``event_id``, ``taken_at``,
+    ``sha256``, ``dhash``, ``phash`` or ``path``) and give either a value
+    or a list of accepted values.
+    *since* (inclusive) and *until* (exclusive) bound ``taken_at``; they
+    are ISO dates or datetimes as strings or ``date``/``datetime``
+    objects, e.g. ``since="2019-01-01", until="2020-01-01"``. Results are
+    ordered by *order_by*, ties broken by path, and paginated with
+    *limit* and *offset*. Every filter is answered from indexed columns,
+    so only the returned rows are parsed. Raises ``ValueError`` for
+    unknown filters or orderings.
+    """
+    if order_by not in _ORDER_COLUMNS:
+        raise ValueError(f"cannot order by: {order_by}")
+    where, params = _photo_filter(folder, since, until, **filters)
+    direction = "DESC" if descending else "ASC"
+    sql = (
+        "SELECT id, metadata FROM photos"
+        + where
+        + f" ORDER BY {order_by} {direction}, path {direction}"
+    )
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += (limit, offset)
+    elif offset:
+        sql += " LIMIT -1 OFFSET ?"
+        params += (offset,)
+    rows = conn.execute(sql, params).fetchall()
+    return [
+        _load_entry(conn, photo_id, text, with_embeddings)
+        for photo_id, text in rows
+    ]
+
+
+def _encode_cursor(value: Any, path: str) -> str:
+    text = json.dumps([value, path])
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        value, path = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError(f"invalid cursor: {cursor!r}") from None
+    if not isinstance(path, str):
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return value, path
+
+
+def _after_cursor(
+    order_by: str, descending: bool, value: Any, path: str
+) -> Tuple[str, Tuple[Any, ...]]:
+    """Return a condition selecting rows after ``(value, path)``.
+
+    SQLite sorts NULLs first, so they come before every value in
+    ascending order and after every value in descending order.
+    """
+    if descending:
+        if value is None:
+            return f"({order_by} IS NULL AND path < ?)", (path,)
+        return (
+            f"({order_by} < ? OR ({order_by} = ? AND path < ?) "
+            f"OR {order_by} IS NULL)",
+            (value, value, path),
+        )
+    if value is None:
+        return (
+            f"({order_by} IS NULL AND path > ? OR {order_by} IS NOT NULL)",
+            (path,),
+        )
+    return (
+        f"({order_by} > ? OR ({order_by} = ? AND path > ?))",
+        (value, value, path),
+    )
+
+
+def list_photos(
+    conn: sqlite3.Connection,
+    cursor: str | None = None,
+    limit: int = 200,
+    folder: str | None = None,
+    since: Any = None,
+    until: Any = None,
+    order_by: str = "taken_at",
+    descending: bool = False,
+    with_embeddings: bool = False,
+    **filters: Any,
+) -> Tuple[List[Dict[str, Any]], str | None]:
+    """Return one page of :func:`query_photos` results and the next cursor.
+
+    Pass the returned cursor back to get the following page; it is
+    ``None`` after the last page. Pages continue after the last row seen
+    rather than skipping an offset, so every page costs the same however
+    deep it is, and photos added while paging do not shift later pages.
+    Raises ``ValueError`` for unknown filters or orderings and for
+    cursors not returned by this function.
+    """
+    if order_by not in _ORDER_COLUMNS:
+        raise ValueError(f"cannot order by: {order_by}")
+    where, params = _photo_filter(folder, since, until, **filters)
+    if cursor is not None:
+        clause, extra = _after_cursor(
+            order_by, descending, *_decode_cursor(cursor)
+        )
+        where += (" AND " if where else " WHERE ") + clause
+        params += extra
+    direction = "DESC" if descending else "ASC"
+    rows = conn.execute(
+        f"SELECT id, metadata, {order_by}, path FROM photos"
+        + where
+        + f" ORDER BY {order_by} {direction}, path {direction} LIMIT ?",
+        params + (limit + 1,),
+    ).fetchall()
+    entries = [
+        _load_entry(conn, photo_id, text, with_embeddings)
+        for photo_id, text, _, _ in rows[:limit]
+    ]
+    if len(rows) <= limit or not entries:
+        return entries, None
+    _, _, value, path = rows[limit - 1]
+    return entries, _encode_cursor(value, path)
+
+
+def count_photos(
+    conn: sqlite3.Connection,
+    folder: str | None = None,
+    since: Any = None,
+    until: Any = None,
+    **filters: Any,
+) -> int:
+    """Return how many photos :func:`query_photos` would match."""
+    where, params = _photo_filter(folder, since, until, **filters)
+    return conn.execute(
+        "SELECT COUNT(*) FROM photos" + where, params
+    ).fetchone()[0]
+
+
+def _fts_query(text: str) -> str:
+    """Quote every word of *text* so FTS5 syntax characters are literal.
+
+    Words must all match; a trailing ``*`` keeps prefix matching.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*") and len(word) > 1
+        word = word.rstrip("*") if prefix else word
+        quoted = '"' + word.replace('"', '""') + '"'
+        terms.append(quoted + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def search_text(
+    conn: sqlite3.Connection,
+    text: str,
+    folder: str | None = None,
+    limit: int | None = 20,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """Return photos whose OCR text contains every word of *text*.
+
+    Matches are ranked by BM25, best first. Each entry gets a
+    ``snippet`` of the matching text with hits wrapped in ``[...]`` and
+    its ``score`` (lower is better). Words are matched after stemming, so
+    ``receipt`` also finds ``receipts``; end a word with ``*`` to match
+    it as a prefix. Raises ``RuntimeError`` when SQLite was built
+    without FTS5.
+    """
+    if not has_fts(conn):
+        raise RuntimeError("full-text search needs SQLite with FTS5")
+    query = _fts_query(text)
+    if not query:
+        return []
+    where, params = _folder_filter(folder, "p.path", "AND")
+    sql = (
+        "SELECT p.id, p.metadata, "
+        "snippet(photos_fts, 0, '[', ']', '...', 12), "
+        "bm25(photos_fts) AS score "
+        "FROM photos_fts JOIN photos AS p ON p.id = photos_fts.rowid "
+        "WHERE photos_fts MATCH ?" + where + " ORDER BY score"
+    )
+    params = (query,) + params
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += (limit, offset)
+    results = []
+    for photo_id, text_, snippet, score in conn.execute(sql, params):
+        entry = _load_entry(conn, photo_id, text_)
+        entry["snippet"] = snippet
+        entry["score"] = score
+        results.append(entry)
+    return results
+
+
+def load_embeddings(
+    conn: sqlite3.Connection,
+    folder: str | None = None,
+    unclustered: bool = False,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``(face_ids, embeddings)`` for all stored face embeddings.
+
+    ``embeddings`` is a single float32 array of shape ``(N, 128)`` built
+    from the packed BLOBs, and ``face_ids`` holds the matching
+    ``faces.id`` values. Only photos below *folder* are considered when
+    it is given, and only faces without a ``cluster_id`` with
+    *unclustered*.
+    """
+    where, params = _folder_filter(folder)
+    extra = " AND cluster_id IS NULL" if unclustered else ""
+    rows = conn.execute(
+        "SELECT id, embedding FROM faces WHERE embedding IS NOT NULL"
+        + extra
+        + " AND photo_id IN (SELECT id FROM photos"
+        + where
+        + ") ORDER BY id",
+        params,
+    ).fetchall()
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    if not rows:
+        return ids, np.empty((0, 128), dtype=np.float32)
+    buf = b"".join(r[1] for r in rows)
+    return ids, np.frombuffer(buf, dtype=np.float32).reshape(len(rows), -1)
+
+
+def get_face_ids(conn: sqlite3.Connection) -> np.ndarray:
+    """Return the ids of every stored face."""
+    rows = conn.execute("SELECT id FROM faces").fetchall()
+    return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+
+def get_face_paths(
+    conn: sqlite3.Connection, face_ids: Iterable[int]
+) -> Dict[int, str]:
+    """Map each of *face_ids* to the path of the photo containing it."""
+    paths: Dict[int, str] = {}
+    for face_id in face_ids:
+        row = conn.execute(
+            "SELECT p.path FROM faces f JOIN photos p ON p.id = f.photo_id "
+            "WHERE f.id=?",
+            (int(face_id),),
+        ).fetchone()
+        if row is not None:
+            paths[int(face_id)] = row[0]
+    return paths
+
+
+def set_face_clusters(
+    conn: sqlite3.Connection,
+    face_ids: Iterable[int],
+    cluster_ids: Iterable[int],
+) -> None:
+    """Store ``cluster_id`` for each face in *face_ids*."""
+    with conn:
+        conn.executemany(
+            "UPDATE faces SET cluster_id=? WHERE id=?",
+            ((int(c), int(f)) for f, c in zip(face_ids, cluster_ids)),
+        )
+
+
+def get_metadata(
+    conn: sqlite3.Connection, paths: Iterable[str]
+) -> List[Dict[str, Any]]:
+    """Return stored metadata entries for *paths* that exist in the DB."""
+    metadata: List[Dict[str, Any]] = []
+    for path in paths:
+        row = conn.execute(
+            "SELECT id, metadata FROM photos WHERE path=?", (path,)
+        ).fetchone()
+        if row is not None:
+            metadata.append(_load_entry(conn, *row))
+    return metadata
+
+
+def delete_photos(conn: sqlite3.Connection, paths: Iterable[str]) -> int:
+    """Remove rows for *paths* and return the number of deleted rows."""
+    deleted = 0
+    with conn:
+        for path in paths:
+            cur = conn.execute("DELETE FROM photos WHERE path=?", (path,))
+            deleted += cur.rowcount
+    return deleted
+
+
+_EVENT_FIELDS = ("id", "start", "end", "name", "photos", "gap_hours")
+
+
+def get_events(
+    conn: sqlite3.Connection, stale: bool = False
+) -> List[Dict[str, Any]]:
+    """Return the stored events ordered by start.
+
+    Each event has its ``id``, the ``start`` and ``end`` ``taken_at`` of
+    its photos, its ``name`` (``None`` unless named), the number of
+    ``photos`` and the ``gap_hours`` it was grouped with. With *stale*
+    the events are returned with a ``stale`` flag telling whether their
+    photos changed since they were grouped.
+    """
+    fields = _EVENT_FIELDS + (("stale",) if stale else ())
+    rows = conn.execute(
+        f"SELECT {', '.join(fields)} FROM events ORDER BY start, id"
+    )
+    events = [dict(zip(fields, row)) for row in rows]
+    if stale:
+        for event in events:
+            event["stale"] = bool(event["stale"])
+    return events
+
+
+def next_event_id(conn: sqlite3.Connection) -> int:
+    """Return the first event id that has never been used."""
+    row = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name='events'"
+    ).fetchone()
+    return 0 if row is None else row[0] + 1
+
+
+def get_ungrouped_photos(
+    conn: sqlite3.Connection,
+) -> List[Tuple[int, str]]:
+    """Return ``(id, taken_at)`` of dated photos that are in no event.
+
+    Until events are stored, ids left by earlier versions, which grouped
+    every scan anew, are ignored and all dated photos are returned.
+    """
+    grouped = conn.execute("SELECT 1 FROM events LIMIT 1").fetchone()
+    return conn.execute(
+        "SELECT id, taken_at FROM photos WHERE taken_at IS NOT NULL"
+        + (" AND event_id IS NULL" if grouped else "")
+    ).fetchall()
+
+
+def get_event_photos(
+    conn: sqlite3.Connection, event_id: int
+) -> List[Tuple[int, str | None]]:
+    """Return ``(id, taken_at)`` of the photos assigned to *event_id*."""
+    return conn.execute(
+        "SELECT id, taken_at FROM photos WHERE event_id=?", (event_id,)
+    ).fetchall()
+
+
+def set_photo_events(
+    conn: sqlite3.Connection,
+    assignments: Iterable[Tuple[int, int | None]],
+) -> None:
+    """Store ``event_id`` for each ``(photo_id, event_id)`` pair.
+
+    ``None`` removes the photo from its event. Nothing is committed.
+    """
+    # Updating in rowid order touches each table and index page once.
+    conn.executemany(
+        "UPDATE photos SET metadata=CASE WHEN ?1 IS NULL "
+        "THEN json_remove(metadata, '$.event_id') "
+        "ELSE json_set(metadata, '$.event_id', ?1) END "
+        "WHERE id=?2 AND event_id IS NOT ?1",
+        (
+            (event_id, photo_id)
+            for photo_id, event_id in sorted(assignments, key=lambda a: a[0])
+        ),
+    )
+
+
+def move_event_photos(
+    conn: sqlite3.Connection, old_id: int, new_id: int
+) -> None:
+    """Reassign every photo of event *old_id* to *new_id*; no commit."""
+    conn.execute(
+        "UPDATE photos SET metadata=json_set(metadata, '$.event_id', ?) "
+        "WHERE event_id=?",
+        (new_id, old_id),
+    )
+
+
+def save_events(
+    conn: sqlite3.Connection,
+    events: Iterable[Dict[str, Any]],
+    deleted: Iterable[int] = (),
+) -> None:
+    """Write *events*, remove the *deleted* ids and clear stale flags.
+
+    Nothing is committed, so the caller can write events and their
+    photos in one transaction.
+    """
+    conn.executemany(
+        "DELETE FROM events WHERE id=?", [(i,) for i in deleted]
+    )
+    conn.executemany(
+        "INSERT INTO events(id, start, end, name, photos, gap_hours) "
+        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+        "start=excluded.start, end=excluded.end, name=excluded.name, "
+        "photos=excluded.photos, gap_hours=excluded.gap_hours",
+        [tuple(event.get(f) for f in _EVENT_FIELDS) for event in events],
+    )
+    conn.execute("UPDATE events SET stale=0 WHERE stale")
+
+
+def set_event_name(
+    conn: sqlite3.Connection, event_id: int, name: str | None
+) -> bool:
+    """Name event *event_id*; returns whether the event exists."""
+    with conn:
+        cur = conn.execute(
+            "UPDATE events SET name=? WHERE id=?", (name, event_id)
+        )
+    return cur.rowcount > 0
+
 
 def set_face_label(
     conn: sqlite3.Connection,
@@ -51,6 +1146,67 @@ def set_face_label(
             "VALUES (?, ?)",
             (cluster_id, name),
         )
-        
-        
-__all__ = ["init_db", "insert_metadata", "set_face_label"]
+
+
+def get_face_label(
+    conn: sqlite3.Connection, cluster_id: int
+) -> str | None:
+    """Return the name stored for face ``cluster_id`` or ``None``."""
+    row = conn.execute(
+        "SELECT name FROM face_labels WHERE cluster_id=?", (cluster_id,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def next_cluster_id(conn: sqlite3.Connection) -> int:
+    """Return a face cluster id that no face or label uses.
+
+    Ids of clusters whose faces were all deleted stay taken while they
+    have a name, so a new cluster never inherits another one's label.
+    """
+    row = conn.execute(
+        "SELECT max(coalesce((SELECT max(cluster_id) FROM faces), -1), "
+        "coalesce((SELECT max(cluster_id) FROM face_labels), -1))"
+    ).fetchone()
+    return row[0] + 1
+
+
+__all__ = [
+    "PRAGMAS",
+    "SCHEMA_VERSION",
+    "WRITE_BATCH",
+    "connect",
+    "init_db",
+    "insert_metadata",
+    "merge_metadata",
+    "get_signatures",
+    "get_digests",
+    "get_by_digest",
+    "get_hashes",
+    "get_metadata",
+    "iter_metadata",
+    "update_metadata",
+    "query_photos",
+    "list_photos",
+    "count_photos",
+    "QUERY_FIELDS",
+    "search_text",
+    "has_fts",
+    "get_faces",
+    "load_embeddings",
+    "get_face_ids",
+    "get_face_paths",
+    "set_face_clusters",
+    "delete_photos",
+    "get_events",
+    "next_event_id",
+    "get_ungrouped_photos",
+    "get_event_photos",
+    "set_photo_events",
+    "move_event_photos",
+    "save_events",
+    "set_event_name",
+    "set_face_label",
+    "get_face_label",
+    "next_cluster_id",
+]
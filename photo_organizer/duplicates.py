@@ -0,0 +1,299 @@
+"""Exact and perceptual duplicate detection."""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from functools import lru_cache, partial
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .db import connect, get_by_digest, get_hashes
+from .stats import timed
+from .thumbnails import upright
+
+# Bits set in every byte value, for NumPy versions without bitwise_count.
+_BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+# Rows of the 32-point DCT-II used by :func:`phash`.
+_DCT = np.cos(
+    np.pi * np.outer(np.arange(32), 2 * np.arange(32) + 1) / 64
+)
+
+# Items probed per chunk by :meth:`HammingIndex.pairs`.
+_CHUNK = 1 << 16
+
+
+@timed("digest")
+def file_digest(path: str, block: int = 1 << 20) -> str:
+    """Return the SHA-256 of the whole file at *path* as hex."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(partial(fh.read, block), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash(image: Image.Image) -> int:
+    """Return the 64-bit difference hash of *image*.
+
+    Each bit tells whether a pixel of the 9x8 grayscale reduction is
+    brighter than its left neighbour.
+    """
+    gray = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    px = np.asarray(gray, dtype=np.int16)
+    return _pack((px[:, 1:] > px[:, :-1]).ravel())
+
+
+def phash(image: Image.Image) -> int:
+    """Return the 64-bit DCT hash of *image*.
+
+    Each bit tells whether one of the 8x8 lowest frequencies of the
+    32x32 grayscale reduction lies above their median.
+    """
+    gray = image.convert("L").resize((32, 32), Image.Resampling.LANCZOS)
+    px = np.asarray(gray, dtype=np.float64)
+    low = (_DCT @ px @ _DCT.T)[:8, :8].ravel()
+    return _pack(low > np.median(low[1:]))
+
+
+@timed("hash")
+def image_hashes(rgb: Image.Image, orient: int = 1) -> Dict[str, str]:
+    """Return the ``dhash`` and ``phash`` of *rgb* as 16 hex digits.
+
+    The image is reduced first and turned upright by EXIF orientation
+    *orient*, so a copy rotated on disk hashes like the original.
+    """
+    small = upright(rgb.resize((64, 64), Image.Resampling.BOX), orient)
+    return {
+        "dhash": f"{dhash(small):016x}",
+        "phash": f"{phash(small):016x}",
+    }
+
+
+def hamming(a: int, b: int) -> int:
+    """Return the number of bits in which *a* and *b* differ."""
+    return bin(a ^ b).count("1")
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _BYTE_BITS[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+@lru_cache(maxsize=None)
+def _masks(width: int, radius: int) -> Tuple[int, ...]:
+    """Return every *width*-bit value with at most *radius* bits set."""
+    return tuple(
+        sum(1 << bit for bit in bits)
+        for d in range(radius + 1)
+        for bits in combinations(range(width), d)
+    )
+
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit hashes.
+
+    Hashes are split into *bands* substrings, each kept sorted. Two
+    hashes at most *r* bits apart agree within ``r // bands`` bits on at
+    least one band, so only hashes whose band is that close to the query
+    band, found by binary search, are compared in full. Bands default to
+    about ``log2(len(hashes))`` bits, which keeps the expected number of
+    candidates per probe near one for millions of hashes.
+    """
+
+    def __init__(self, hashes: Iterable[int], bands: int | None = None):
+        self.hashes = np.fromiter(hashes, dtype=np.uint64)
+        if bands is None:
+            bits = int(np.ceil(np.log2(max(len(self.hashes), 2))))
+            bands = 64 // min(32, max(16, bits))
+        self.bands = bands
+        self._bands = []
+        shift = 0
+        for band in range(bands):
+            width = 64 // bands + (band < 64 % bands)
+            keys = (self.hashes >> np.uint64(shift)) & np.uint64(
+                (1 << width) - 1
+            )
+            order = np.argsort(keys, kind="stable")
+            self._bands.append((width, shift, order, keys[order]))
+            shift += width
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def query(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """Return ``(distance, i)`` for every hash within *radius* bits.
+
+        ``i`` indexes the hashes given to the constructor; the closest
+        come first.
+        """
+        found: List[np.ndarray] = []
+        for width, shift, order, ordered in self._bands:
+            key = (value >> shift) & ((1 << width) - 1)
+            probes = np.array(
+                [key ^ m for m in _masks(width, radius // self.bands)],
+                dtype=np.uint64,
+            )
+            lo = np.searchsorted(ordered, probes, "left")
+            hi = np.searchsorted(ordered, probes, "right")
+            found.extend(order[a:b] for a, b in zip(lo, hi) if b > a)
+        if not found:
+            return []
+        rows = np.unique(np.concatenate(found))
+        dist = _popcount(self.hashes[rows] ^ np.uint64(value))
+        close = dist <= radius
+        return sorted(zip(dist[close].tolist(), rows[close].tolist()))
+
+    def pairs(self, radius: int) -> np.ndarray:
+        """Return every pair ``(i, j)``, ``i < j``, within *radius* bits.
+
+        The result is an ``(N, 2)`` array sorted by ``i``, then ``j``.
+        """
+        n = len(self.hashes)
+        found = [np.empty(0, dtype=np.int64)]
+        for width, _, order, ordered in self._bands:
+            for mask in _masks(width, radius // self.bands):
+                # Sorted probes make the binary searches walk the band
+                # in order, which is many times faster than random order.
+                probes = ordered ^ np.uint64(mask)
+                perm = np.argsort(probes, kind="stable")
+                probes, owners = probes[perm], order[perm]
+                for start in range(0, n, _CHUNK):
+                    chunk = probes[start:start + _CHUNK]
+                    lo = np.searchsorted(ordered, chunk, "left")
+                    counts = np.searchsorted(ordered, chunk, "right") - lo
+                    total = int(counts.sum())
+                    if not total:
+                        continue
+                    left = np.repeat(owners[start:start + _CHUNK], counts)
+                    within = np.arange(total) - np.repeat(
+                        np.cumsum(counts) - counts, counts
+                    )
+                    right = order[np.repeat(lo, counts) + within]
+                    keep = left < right
+                    left, right = left[keep], right[keep]
+                    dist = _popcount(self.hashes[left] ^ self.hashes[right])
+                    close = dist <= radius
+                    found.append(left[close] * n + right[close])
+        pairs = np.unique(np.concatenate(found))
+        return np.stack([pairs // n, pairs % n], axis=1)
+
+
+def find_duplicates(
+    conn: sqlite3.Connection,
+    distance: int = 4,
+    folder: str | None = None,
+) -> List[Dict[str, Any]]:
+    """Group stored photos that are copies of each other.
+
+    Photos with the same SHA-256 are exact copies. Photos whose pHash
+    differs in at most *distance* of its 64 bits are near duplicates,
+    such as resized or recompressed copies; ``0`` only groups identical
+    hashes. Groups are linked transitively and every group has a sorted
+    list of ``paths`` and ``exact``, true when all of them share their
+    content. Largest groups come first. Only photos below *folder* are
+    considered when it is given. Raises ``ValueError`` for a negative
+    *distance*.
+    """
+    if distance < 0:
+        raise ValueError(f"distance must not be negative: {distance}")
+    rows = get_hashes(conn, folder)
+    parent = list(range(len(rows)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        parent[root(i)] = root(j)
+
+    first: Dict[Any, int] = {}
+    for i, (_, digest, _) in enumerate(rows):
+        if digest is not None:
+            union(i, first.setdefault(digest, i))
+    hashed = [i for i, row in enumerate(rows) if row[2] is not None]
+    values, inverse = np.unique(
+        np.array([int(rows[i][2], 16) for i in hashed], dtype=np.uint64),
+        return_inverse=True,
+    )
+    owner: Dict[int, int] = {}
+    for i, u in zip(hashed, inverse.tolist()):
+        union(i, owner.setdefault(u, i))
+    if distance and len(values) > 1:
+        for a, b in HammingIndex(values.tolist()).pairs(distance).tolist():
+            union(owner[a], owner[b])
+
+    members: Dict[int, List[int]] = {}
+    for i in range(len(rows)):
+        members.setdefault(root(i), []).append(i)
+    groups = [
+        {
+            "paths": [rows[i][0] for i in group],
+            "exact": len({rows[i][1] for i in group}) == 1
+            and rows[group[0]][1] is not None,
+        }
+        for group in members.values()
+        if len(group) > 1
+    ]
+    groups.sort(key=lambda g: (-len(g["paths"]), g["paths"][0]))
+    return groups
+
+
+class StoredResults:
+    """Look up scan results stored in a database by content digest.
+
+    The database at *db_path* is opened read-only on first use, so scan
+    workers can share it with the process writing the scan. Instances
+    can be pickled for worker processes; each opens its own connection.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._conn: sqlite3.Connection | None = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"db_path": self.db_path, "_conn": None}
+
+    def get(
+        self,
+        digest: str,
+        path: str | None = None,
+        version: int | None = None,
+    ) -> Dict[str, Any] | None:
+        """Return the stored entry for *digest*, ``None`` if there is none.
+
+        *path* and *version* narrow the match as in :func:`get_by_digest`.
+        """
+        if self._conn is None:
+            self._conn = connect(self.db_path, readonly=True)
+        return get_by_digest(self._conn, digest, path, version)
+
+    def close(self) -> None:
+        """Close the connection opened by :meth:`get`."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+__all__ = [
+    "HammingIndex",
+    "StoredResults",
+    "dhash",
+    "file_digest",
+    "find_duplicates",
+    "hamming",
+    "image_hashes",
+    "phash",
+]
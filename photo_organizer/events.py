@@ -2,8 +2,34 @@
 
 from __future__ import annotations
 
+import sqlite3
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from typing import Dict, Iterable, List, Any
+from typing import Dict, Iterable, List, Any, Tuple
+
+from .db import (
+    get_event_photos,
+    get_events,
+    get_ungrouped_photos,
+    move_event_photos,
+    next_event_id,
+    save_events,
+    set_photo_events,
+)
+
+
+def _parse_exif_time(value: str) -> datetime | None:
+    """Parse an EXIF ``YYYY:MM:DD HH:MM:SS`` timestamp.
+
+    ``datetime.fromisoformat`` is implemented in C and many times faster
+    than ``strptime``, so the date separators are rewritten for it.
+    """
+    try:
+        return datetime.fromisoformat(
+            value[:10].replace(":", "-") + value[10:]
+        )
+    except (TypeError, ValueError):
+        return None
 
 
 def group_by_event(
@@ -20,11 +46,8 @@ def group_by_event(
     items: List[tuple[datetime, Dict[str, Any]]] = []
     for entry in metadata:
         ts_str = entry.get("exif", {}).get("timestamp")
-        if ts_str is None:
-            continue
-        try:
-            dt = datetime.strptime(ts_str, "%Y:%m:%d %H:%M:%S")
-        except Exception:
+        dt = _parse_exif_time(ts_str) if ts_str is not None else None
+        if dt is None:
             continue
         items.append((dt, entry))
 
@@ -61,4 +84,250 @@ def rename_event(
     name_event(event_map, event_id, new_name)
 
 
-__all__ = ["group_by_event", "name_event", "rename_event"]
+def _parse_iso(value: str | None) -> datetime | None:
+    try:
+        return datetime.fromisoformat(value)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return None
+
+
+# ``(photo_id, taken_at, parsed taken_at)`` of a photo being grouped.
+_Photo = Tuple[int, str, datetime]
+
+
+def _runs(photos: List[_Photo], gap: timedelta) -> List[List[_Photo]]:
+    """Split time-sorted *photos* wherever two are more than *gap* apart."""
+    runs: List[List[_Photo]] = []
+    for photo in photos:
+        if not runs or photo[2] - runs[-1][-1][2] > gap:
+            runs.append([])
+        runs[-1].append(photo)
+    return runs
+
+
+class EventTimeline:
+    """Disjoint events sorted by start, updated one photo at a time.
+
+    Neighbouring events are more than *gap_hours* apart and a photo is
+    placed with :func:`bisect.bisect_right` over the event starts: it
+    joins the event whose range holds it or lies within the gap, merges
+    the two events it bridges, or starts a new event. When events merge
+    the one with more photos, or else the older one, keeps its id and
+    name, so ids only change for photos of the absorbed event.
+    """
+
+    def __init__(
+        self,
+        events: Iterable[Dict[str, Any]],
+        gap_hours: float,
+        next_id: int = 0,
+    ) -> None:
+        self.gap = timedelta(hours=gap_hours)
+        self.gap_hours = gap_hours
+        self.events = sorted(events, key=lambda e: (e["start"], e["id"]))
+        self.starts = [event["start"] for event in self.events]
+        self.next_id = next_id
+        # Ids of absorbed events mapped to the event that absorbed them.
+        self.merged: Dict[int, int] = {}
+        self.changed: set[int] = set()
+
+    def resolve(self, event_id: int) -> int:
+        """Return the id that *event_id* was merged into, if any."""
+        while event_id in self.merged:
+            event_id = self.merged[event_id]
+        return event_id
+
+    def _merge(self, i: int) -> Dict[str, Any]:
+        """Merge the events at positions *i* and ``i + 1``."""
+        a, b = self.events[i], self.events[i + 1]
+        keep, drop = (
+            (a, b)
+            if (a["photos"], -a["id"]) >= (b["photos"], -b["id"])
+            else (b, a)
+        )
+        keep["start"], keep["end"] = a["start"], max(a["end"], b["end"])
+        keep["photos"] += drop["photos"]
+        if keep["name"] is None:
+            keep["name"] = drop["name"]
+        self.merged[drop["id"]] = keep["id"]
+        self.changed.discard(drop["id"])
+        self.changed.add(keep["id"])
+        self.events[i:i + 2] = [keep]
+        self.starts[i:i + 2] = [keep["start"]]
+        return keep
+
+    def _close(self, i: int) -> bool:
+        """Whether the events at *i* and ``i + 1`` are the gap apart."""
+        end = _parse_iso(self.events[i]["end"])
+        start = _parse_iso(self.events[i + 1]["start"])
+        return bool(end and start and start - end <= self.gap)
+
+    def merge_close(self, ids: Iterable[int] | None = None) -> None:
+        """Merge neighbouring events at most the gap apart.
+
+        With *ids*, only the events with those ids are compared with
+        their neighbours; the others must already be far enough apart.
+        """
+        if ids is None:
+            i = 0
+            while i + 1 < len(self.events):
+                if self._close(i):
+                    self._merge(i)
+                else:
+                    i += 1
+            return
+        for event_id in ids:
+            event_id = self.resolve(event_id)
+            i = next(
+                (j for j, e in enumerate(self.events) if e["id"] == event_id),
+                None,
+            )
+            if i is None:
+                continue
+            while i > 0 and self._close(i - 1):
+                self._merge(i - 1)
+                i -= 1
+            while i + 1 < len(self.events) and self._close(i):
+                self._merge(i)
+
+    def resort(self) -> None:
+        """Sort the events by start again after starts were changed."""
+        self.events.sort(key=lambda e: (e["start"], e["id"]))
+        self.starts = [event["start"] for event in self.events]
+
+    def place(self, taken_at: str, when: datetime) -> Dict[str, Any]:
+        """Add a photo taken at *taken_at* and return its event."""
+        i = bisect_right(self.starts, taken_at) - 1
+        prev = self.events[i] if i >= 0 else None
+        if prev is not None and taken_at <= prev["end"]:
+            event = prev
+        else:
+            nxt = self.events[i + 1] if i + 1 < len(self.events) else None
+            join_prev = prev is not None and (
+                when - _parse_iso(prev["end"]) <= self.gap
+            )
+            join_next = nxt is not None and (
+                _parse_iso(nxt["start"]) - when <= self.gap
+            )
+            if join_prev and join_next:
+                prev["end"] = taken_at
+                event = self._merge(i)
+            elif join_prev:
+                prev["end"] = taken_at
+                event = prev
+            elif join_next:
+                nxt["start"] = self.starts[i + 1] = taken_at
+                event = nxt
+            else:
+                event = {
+                    "id": self.next_id,
+                    "start": taken_at,
+                    "end": taken_at,
+                    "name": None,
+                    "photos": 0,
+                }
+                self.next_id += 1
+                self.events.insert(i + 1, event)
+                self.starts.insert(i + 1, taken_at)
+        event["photos"] += 1
+        self.changed.add(event["id"])
+        return event
+
+
+def _dated(rows: Iterable[Tuple[int, str | None]]) -> List[_Photo]:
+    return [
+        (photo_id, taken_at, when)
+        for photo_id, taken_at in rows
+        if (when := _parse_iso(taken_at)) is not None
+    ]
+
+
+def update_events(
+    conn: sqlite3.Connection, gap_hours: float = 6
+) -> List[Dict[str, Any]]:
+    """Bring the stored events in line with the photos and return them.
+
+    Only what changed since the last call is revisited. An event that
+    lost or retimed photos (see :data:`photo_organizer.db.EVENTS_TRIGGERS`)
+    keeps its largest run of photos no more than *gap_hours* apart; its
+    other photos are placed again, together with the photos that are in
+    no event yet, on an :class:`EventTimeline`. Event ids are never
+    reused and, like event names, survive later calls. Changing
+    *gap_hours* merges the events that are now close enough and splits
+    the rest. Everything is read and written in one transaction.
+    """
+    with conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        stored = get_events(conn, stale=True)
+        regap = any(e["gap_hours"] != gap_hours for e in stored)
+        timeline = EventTimeline(stored, gap_hours, next_event_id(conn))
+        if regap:
+            timeline.merge_close()
+        moved_events: set[int] = set()
+
+        def move_merged() -> None:
+            for old in timeline.merged.keys() - moved_events:
+                move_event_photos(conn, old, timeline.resolve(old))
+                moved_events.add(old)
+
+        move_merged()
+        pending = _dated(get_ungrouped_photos(conn))
+        undated: List[int] = []
+        deleted: List[int] = []
+        shrunk: List[int] = []
+        for event in [e for e in timeline.events if regap or e["stale"]]:
+            rows = get_event_photos(conn, event["id"])
+            photos = sorted(_dated(rows), key=lambda p: p[2])
+            undated += [pid for pid, t in rows if _parse_iso(t) is None]
+            runs = _runs(photos, timeline.gap)
+            i = timeline.events.index(event)
+            if not runs:
+                deleted.append(event["id"])
+                del timeline.events[i], timeline.starts[i]
+                continue
+            keep = max(runs, key=len)
+            event["start"] = timeline.starts[i] = keep[0][1]
+            event["end"] = keep[-1][1]
+            event["photos"] = len(keep)
+            timeline.changed.add(event["id"])
+            shrunk.append(event["id"])
+            for run in runs:
+                if run is not keep:
+                    pending += run
+        # A retimed photo can move the kept run before or into another
+        # event, so order the timeline again and merge what is now close.
+        timeline.resort()
+        timeline.merge_close(shrunk)
+        pending.sort(key=lambda p: p[2])
+        placed = [
+            (photo_id, timeline.place(taken_at, when)["id"])
+            for photo_id, taken_at, when in pending
+        ]
+        move_merged()
+        set_photo_events(
+            conn,
+            [(photo_id, None) for photo_id in undated]
+            + [(pid, timeline.resolve(eid)) for pid, eid in placed],
+        )
+        for event in timeline.events:
+            event["gap_hours"] = gap_hours
+        save_events(
+            conn,
+            [
+                event
+                for event in timeline.events
+                if regap or event["id"] in timeline.changed
+            ],
+            deleted + list(timeline.merged),
+        )
+    return get_events(conn)
+
+
+__all__ = [
+    "EventTimeline",
+    "group_by_event",
+    "name_event",
+    "rename_event",
+    "update_events",
+]
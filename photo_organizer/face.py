@@ -3,11 +3,13 @@
 from __future__ import annotations
 
 import os
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 
 import numpy as np
 from PIL import Image
 
+from .stats import timed
+
 try:  # pragma: no cover - optional dependency
     import onnxruntime as ort
 except Exception:  # pragma: no cover - handled gracefully
@@ -15,18 +17,28 @@ except Exception:  # pragma: no cover - handled gracefully
 
 try:  # pragma: no cover - optional dependency
     import mediapipe as mp
-    _mp_face_detection = mp.solutions.face_detection.FaceDetection(
-        model_selection=0, min_detection_confidence=0.5
-    )
 except Exception:  # pragma: no cover - handled gracefully
     mp = None  # type: ignore
-    _mp_face_detection = None
+
+_mp_face_detection = None
 
 
 class FaceEmbedder:
-    """Wrapper around an ONNX FaceNet model."""
+    """Wrapper around an ONNX FaceNet model.
+
+    *intra_op_num_threads* and *inter_op_num_threads* are passed to the
+    ONNX Runtime session options; ``None`` keeps the runtime defaults.
+    """
+
+    input_size = (160, 160)
+    embedding_size = 128
 
-    def __init__(self, model_path: str | None = None) -> None:
+    def __init__(
+        self,
+        model_path: str | None = None,
+        intra_op_num_threads: int | None = None,
+        inter_op_num_threads: int | None = None,
+    ) -> None:
         if model_path is None:
             model_path = os.path.join(
                 os.path.dirname(__file__), "facenet_dummy.onnx"
@@ -36,56 +48,128 @@ class FaceEmbedder:
             self.input_name = None
         else:
             try:  # pragma: no cover - optional dependency
+                options = ort.SessionOptions()
+                if intra_op_num_threads is not None:
+                    options.intra_op_num_threads = intra_op_num_threads
+                if inter_op_num_threads is not None:
+                    options.inter_op_num_threads = inter_op_num_threads
                 self.session = ort.InferenceSession(
-                    model_path, providers=["CPUExecutionProvider"]
+                    model_path,
+                    sess_options=options,
+                    providers=["CPUExecutionProvider"],
                 )
                 self.input_name = self.session.get_inputs()[0].name
             except Exception:
                 self.session = None
                 self.input_name = None
 
+    def _preprocess(self, face: Image.Image, out: np.ndarray) -> None:
+        """Write *face* into *out* as a CHW float32 array in ``[0, 1]``."""
+        if face.mode not in ("RGB", "L"):
+            face = face.convert("RGB")
+        img = face.resize(self.input_size)
+        arr = np.asarray(img, dtype=np.float32)
+        if arr.ndim == 2:
+            arr = arr[..., None]
+        out[...] = arr[..., :3].transpose(2, 0, 1)
+        out /= 255.0
+
+    @timed("embed")
+    def embed_batch(
+        self, faces: Sequence[Image.Image], batch_size: int = 64
+    ) -> np.ndarray:
+        """Return an ``(N, 128)`` array of embeddings for *faces*.
+
+        Crops are packed into one contiguous float32 NCHW array per chunk
+        of *batch_size* faces, so each chunk costs a single
+        ``session.run`` call regardless of which photos the faces came
+        from.
+        """
+        result = np.zeros((len(faces), self.embedding_size), dtype=np.float32)
+        if self.session is None or not faces:
+            return result
+        w, h = self.input_size
+        step = max(1, batch_size)
+        for start in range(0, len(faces), step):
+            chunk = faces[start:start + step]
+            batch = np.empty((len(chunk), 3, h, w), dtype=np.float32)
+            for i, face in enumerate(chunk):
+                self._preprocess(face, batch[i])
+            out = self.session.run(None, {self.input_name: batch})[0]
+            result[start:start + len(chunk)] = np.asarray(out).reshape(
+                len(chunk), -1
+            )
+        return result
+
     def __call__(self, face: Image.Image) -> np.ndarray:
         """Return embedding for a face image."""
-        img = face.resize((160, 160))
-        arr = np.asarray(img).astype("float32") / 255.0
-        if arr.ndim == 2:
-            arr = np.stack([arr] * 3, axis=-1)
-        arr = arr.transpose(2, 0, 1)[None, ...]
-        if self.session is None:
-            return np.zeros(128, dtype=np.float32)
-        result = self.session.run(None, {self.input_name: arr})[0]
-        return result.squeeze()
+        return self.embed_batch([face])[0]
 
 
 _embedder: FaceEmbedder | None = None
 
 
-def load_embedder(model_path: str | None = None) -> FaceEmbedder:
+def load_embedder(
+    model_path: str | None = None,
+    intra_op_num_threads: int | None = None,
+    inter_op_num_threads: int | None = None,
+) -> FaceEmbedder:
     global _embedder
     if _embedder is None:
-        _embedder = FaceEmbedder(model_path)
+        _embedder = FaceEmbedder(
+            model_path, intra_op_num_threads, inter_op_num_threads
+        )
     return _embedder
 
 
-def detect_faces(img: Image.Image) -> List[Tuple[int, int, int, int]]:
-    """Return list of face bounding boxes (x1, y1, x2, y2)."""
+def load_detector():
+    """Create the mediapipe face detector for this process if available.
+
+    The detector is created lazily rather than at import time so that
+    every scan worker process owns its own instance.
+    """
+    global _mp_face_detection
+    if _mp_face_detection is None and mp is not None:
+        try:  # pragma: no cover - optional dependency
+            _mp_face_detection = mp.solutions.face_detection.FaceDetection(
+                model_selection=0, min_detection_confidence=0.5
+            )
+        except Exception:  # pragma: no cover - handled gracefully
+            _mp_face_detection = None
+    return _mp_face_detection
+
+
+@timed("detect_faces")
+def detect_faces(
+    img: Image.Image | np.ndarray,
+) -> List[Tuple[int, int, int, int]]:
+    """Return list of face bounding boxes (x1, y1, x2, y2).
+
+    *img* may also be an ``(H, W, 3)`` RGB ``uint8`` array, which is
+    passed to the detector without another conversion.
+    """
+    if isinstance(img, np.ndarray):
+        h, w = img.shape[:2]
+    else:
+        w, h = img.size
+    if _mp_face_detection is None:
+        load_detector()
+    boxes = []
     if _mp_face_detection is not None:
-        rgb = img.convert("RGB")
-        results = _mp_face_detection.process(np.asarray(rgb))
-        boxes = []
+        if isinstance(img, np.ndarray):
+            rgb = img
+        else:
+            rgb = np.asarray(img.convert("RGB"))
+        results = _mp_face_detection.process(rgb)
         if results.detections:
             for det in results.detections:
                 bbox = det.location_data.relative_bounding_box
-                w, h = img.size
                 x1 = int(bbox.xmin * w)
                 y1 = int(bbox.ymin * h)
                 x2 = int((bbox.xmin + bbox.width) * w)
                 y2 = int((bbox.ymin + bbox.height) * h)
                 boxes.append((x1, y1, x2, y2))
-    else:
-        boxes = []
     if not boxes:
-        w, h = img.size
         boxes.append((0, 0, w, h))
     return boxes
 
@@ -97,4 +181,10 @@ def extract_face(
     return img.crop((x1, y1, x2, y2))
 
 
-__all__ = ["detect_faces", "extract_face", "load_embedder", "FaceEmbedder"]
+__all__ = [
+    "detect_faces",
+    "extract_face",
+    "load_detector",
+    "load_embedder",
+    "FaceEmbedder",
+]
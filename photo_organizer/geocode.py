@@ -0,0 +1,204 @@
+"""Asynchronous reverse-geocoding stage for the scan pipeline."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from .location import GeocodeCache, Geocoding, Lookup, OfflineGeocoder
+from .stats import STATS
+
+
+def gps_coordinates(entry: Dict[str, Any]) -> Tuple[float, float] | None:
+    """Return the ``(lat, lon)`` stored in ``entry["exif"]["gps"]``."""
+    try:
+        lat, lon = entry["exif"]["gps"].split(",")
+        return float(lat), float(lon)
+    except Exception:
+        return None
+
+
+class AsyncGeocoder:
+    """Resolve coordinates on an asyncio event loop in a background thread.
+
+    Coordinates are submitted from the (synchronous) scan loop and
+    resolved while scanning continues. Lookups for the same grid cell of
+    *resolution* degrees (the *cache* resolution when a cache is given)
+    that are in flight at the same time share one request. At most
+    *concurrency* requests run at once and they are started no faster
+    than *rps* per second; ``rps=None`` disables the budget. *network*
+    replaces the default Nominatim lookup, e.g. with a
+    :class:`photo_organizer.location.NominatimClient`; when it fails the
+    *offline_geocoder* answers instead, the installed one by default.
+    Lookups and cache reads and writes run on a thread pool, so the
+    event loop never blocks on the network or on SQLite.
+    """
+
+    def __init__(
+        self,
+        network: Lookup | None = None,
+        cache: GeocodeCache | None = None,
+        rps: float | None = 1.0,
+        concurrency: int = 4,
+        resolution: float = 0.01,
+        offline_geocoder: OfflineGeocoder | None = None,
+    ) -> None:
+        self.network = network
+        self.cache = cache
+        self.geocoding = Geocoding(cache, offline_geocoder, True, network)
+        self.rps = rps
+        self.concurrency = max(1, concurrency)
+        self.resolution = cache.resolution if cache else resolution
+        self.requests = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._inflight: Dict[Tuple[int, int], asyncio.Future] = {}
+        self._next_slot = 0.0
+
+    def __enter__(self) -> "AsyncGeocoder":
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Start the event loop thread; a no-op if already running."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="geocoder", daemon=True
+        )
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def _setup(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def close(self) -> None:
+        """Stop the event loop thread."""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()  # type: ignore[union-attr]
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+    def key(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Return the grid cell used to coalesce lookups."""
+        return (
+            int(round(lat / self.resolution)),
+            int(round(lon / self.resolution)),
+        )
+
+    def submit(self, lat: float, lon: float) -> Future:
+        """Schedule a lookup and return a future for its location dict."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(
+            self._resolve(lat, lon), self._loop  # type: ignore[arg-type]
+        )
+
+    async def _resolve(self, lat: float, lon: float) -> Dict[str, str]:
+        if self.cache is not None:
+            # The source that answers first when it is reachable.
+            source = self.geocoding.chain()[0][0]
+            cached = await asyncio.get_running_loop().run_in_executor(
+                None, self.cache.get, lat, lon, source
+            )
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+        key = self.key(lat, lon)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(lat, lon))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            STATS.count("geocode_coalesced")
+        return dict(await asyncio.shield(task))
+
+    async def _throttle(self) -> None:
+        if not self.rps:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self._next_slot)
+        self._next_slot = start + 1.0 / self.rps
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _fetch(self, lat: float, lon: float) -> Dict[str, str]:
+        async with self._semaphore:
+            await self._throttle()
+            self.requests += 1
+            source, result = await asyncio.get_running_loop().run_in_executor(
+                None, self.geocoding.lookup, lat, lon
+            )
+        if result is None:
+            return {}
+        if self.cache is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.cache.put, lat, lon, result, source
+            )
+        return result
+
+    def pipe(
+        self, entries: Iterable[Dict[str, Any]], window: int = 1024
+    ) -> Iterator[Dict[str, Any]]:
+        """Geocode *entries* in the background and yield them in order.
+
+        Entries with ``exif["gps"]`` are submitted as they arrive and get
+        their location fields written back once the lookup finished; at
+        most *window* entries wait for a result at any time.
+        """
+        started = self._loop is None
+        self.start()
+        pending: deque = deque()
+        try:
+            for entry in entries:
+                coords = gps_coordinates(entry)
+                future = self.submit(*coords) if coords else None
+                pending.append((entry, future))
+                while pending and (
+                    len(pending) > window
+                    or pending[0][1] is None
+                    or pending[0][1].done()
+                ):
+                    yield _complete(*pending.popleft())
+            while pending:
+                yield _complete(*pending.popleft())
+        finally:
+            if started:
+                self.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Return request, coalescing and cache counters."""
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+        }
+
+
+def _complete(
+    entry: Dict[str, Any], future: Future | None
+) -> Dict[str, Any]:
+    """Add the location from *future* to *entry*, recording failures."""
+    if future is not None:
+        try:
+            entry.update(future.result())
+        except Exception as exc:
+            STATS.error("geocode", entry.get("path"), exc)
+    return entry
+
+
+__all__ = ["AsyncGeocoder", "gps_coordinates"]
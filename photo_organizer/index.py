@@ -0,0 +1,211 @@
+"""Approximate nearest-neighbour index over face embeddings."""
+
+from __future__ import annotations
+
+import os
+from typing import Iterable, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+
+def index_path(db_path: str) -> str:
+    """Return the path of the face index stored next to *db_path*."""
+    return f"{db_path}.faces.npz"
+
+
+class FaceIndex:
+    """Inverted-file (IVF) index over face embeddings.
+
+    Embeddings are partitioned into ``n_lists`` cells around k-means
+    centroids. A query only compares against the vectors of the
+    ``nprobe`` closest cells, so search cost grows with the cell size
+    rather than with the whole library. Every vector keeps its
+    ``faces.id`` and ``cluster_id`` so neighbours can be mapped straight
+    back to photos and face clusters.
+    """
+
+    # The centroids are retrained once the index has grown this many
+    # times beyond the size it was trained on.
+    retrain_factor = 4
+
+    def __init__(self, dim: int = 128) -> None:
+        self.dim = dim
+        self.centroids = np.empty((0, dim), dtype=np.float32)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.labels = np.empty(0, dtype=np.int64)
+        self.lists = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _train(self, vectors: np.ndarray) -> None:
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        if n_lists == 1:
+            self.centroids = vectors.mean(axis=0, keepdims=True)
+        else:
+            km = MiniBatchKMeans(
+                n_clusters=n_lists, n_init=3, random_state=0
+            ).fit(vectors)
+            self.centroids = km.cluster_centers_.astype(np.float32)
+        self.trained_size = len(vectors)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return _sq_distances(vectors, self.centroids).argmin(axis=1)
+
+    def _sort(self) -> None:
+        order = np.argsort(self.lists, kind="stable")
+        self.vectors = np.ascontiguousarray(self.vectors[order])
+        self.ids = self.ids[order]
+        self.labels = self.labels[order]
+        self.lists = self.lists[order]
+        self.offsets = np.searchsorted(
+            self.lists, np.arange(len(self.centroids) + 1)
+        ).astype(np.int64)
+
+    def add(
+        self,
+        face_ids: Iterable[int],
+        embeddings: np.ndarray,
+        cluster_ids: Iterable[int],
+    ) -> None:
+        """Add *embeddings* with their face and cluster ids."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) == 0:
+            return
+        self.vectors = np.concatenate([self.vectors, embeddings])
+        self.ids = np.concatenate(
+            [self.ids, np.asarray(list(face_ids), dtype=np.int64)]
+        )
+        self.labels = np.concatenate(
+            [self.labels, np.asarray(list(cluster_ids), dtype=np.int64)]
+        )
+        if len(self) > self.retrain_factor * self.trained_size:
+            self._train(self.vectors)
+            self.lists = self._assign(self.vectors)
+        else:
+            self.lists = np.concatenate(
+                [self.lists, self._assign(embeddings)]
+            )
+        self._sort()
+
+    def remove(self, face_ids: Iterable[int]) -> None:
+        """Drop the vectors belonging to *face_ids*."""
+        keep = ~np.isin(self.ids, np.fromiter(face_ids, dtype=np.int64))
+        self.vectors = self.vectors[keep]
+        self.ids = self.ids[keep]
+        self.labels = self.labels[keep]
+        self.lists = self.lists[keep]
+        self._sort()
+
+    def set_labels(
+        self, face_ids: Iterable[int], cluster_ids: Iterable[int]
+    ) -> None:
+        """Update the stored ``cluster_id`` of *face_ids*."""
+        fids = np.asarray(list(face_ids), dtype=np.int64)
+        labels = np.asarray(list(cluster_ids), dtype=np.int64)
+        if len(fids) == 0 or len(self) == 0:
+            return
+        order = np.argsort(fids)
+        pos = np.searchsorted(fids[order], self.ids)
+        pos = np.minimum(pos, len(fids) - 1)
+        hit = fids[order][pos] == self.ids
+        self.labels[hit] = labels[order][pos[hit]]
+
+    def search(
+        self, queries: np.ndarray, k: int = 10, nprobe: int = 8
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the *k* nearest stored faces for every query row.
+
+        The result is ``(face_ids, cluster_ids, distances)``, each of shape
+        ``(len(queries), k)``. Missing neighbours are padded with face id
+        ``-1`` and an infinite distance. Distances are Euclidean.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        m = len(queries)
+        out_ids = np.full((m, k), -1, dtype=np.int64)
+        out_labels = np.full((m, k), -1, dtype=np.int64)
+        out_dist = np.full((m, k), np.inf, dtype=np.float32)
+        if len(self) == 0 or m == 0:
+            return out_ids, out_labels, out_dist
+        nprobe = min(nprobe, len(self.centroids))
+        cells = np.argsort(
+            _sq_distances(queries, self.centroids), axis=1
+        )[:, :nprobe]
+        for q in range(m):
+            rows = np.concatenate(
+                [
+                    np.arange(self.offsets[c], self.offsets[c + 1])
+                    for c in cells[q]
+                ]
+            )
+            if len(rows) == 0:
+                continue
+            diff = self.vectors[rows] - queries[q]
+            dist = np.einsum("ij,ij->i", diff, diff)
+            n = min(k, len(rows))
+            best = np.argpartition(dist, n - 1)[:n]
+            best = best[np.argsort(dist[best])]
+            out_ids[q, :n] = self.ids[rows[best]]
+            out_labels[q, :n] = self.labels[rows[best]]
+            out_dist[q, :n] = np.sqrt(np.maximum(dist[best], 0))
+        return out_ids, out_labels, out_dist
+
+    @classmethod
+    def build(
+        cls,
+        face_ids: Iterable[int],
+        embeddings: np.ndarray,
+        cluster_ids: Iterable[int],
+    ) -> "FaceIndex":
+        """Train a new index on *embeddings* and add them to it."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        index = cls(embeddings.shape[1] if embeddings.ndim == 2 else 128)
+        if len(embeddings):
+            index._train(embeddings)
+        index.add(face_ids, embeddings, cluster_ids)
+        return index
+
+    def save(self, path: str) -> None:
+        """Write the index to *path* atomically."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(
+                fh,
+                centroids=self.centroids,
+                vectors=self.vectors,
+                ids=self.ids,
+                labels=self.labels,
+                lists=self.lists,
+                trained_size=np.int64(self.trained_size),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FaceIndex":
+        """Read an index previously written with :meth:`save`."""
+        with np.load(path) as data:
+            index = cls(data["vectors"].shape[1])
+            index.centroids = data["centroids"]
+            index.vectors = data["vectors"]
+            index.ids = data["ids"]
+            index.labels = data["labels"]
+            index.lists = data["lists"]
+            index.trained_size = int(data["trained_size"])
+        index._sort()
+        return index
+
+
+def _sq_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Return squared Euclidean distances between rows of *a* and *b*."""
+    return (
+        (a * a).sum(axis=1)[:, None]
+        - 2 * a @ b.T
+        + (b * b).sum(axis=1)[None, :]
+    )
+
+
+__all__ = ["FaceIndex", "index_path"]
@@ -2,7 +2,30 @@
 
 from __future__ import annotations
 
-from typing import Iterable, List, Dict
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from .stats import STATS, timed
 
 try:
     from geopy.geocoders import Nominatim
@@ -24,29 +47,588 @@ OFFLINE_LOCATIONS: Dict[tuple[float, float], Dict[str, str]] = {
 }
 
 
-def _offline_lookup(lat: float, lon: float) -> Dict[str, str]:
-    key = (round(lat, 4), round(lon, 4))
-    return OFFLINE_LOCATIONS.get(key, {})
+_EARTH_RADIUS_KM = 6371.0
 
+# Small gazetteer of major cities shipped with the package.
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(__file__), "gazetteer.tsv")
 
-def resolve_location(lat: float, lon: float) -> Dict[str, str]:
-    """Resolve *lat* and *lon* to a city/state/country dictionary."""
-    if Nominatim is not None:
-        try:
-            geolocator = Nominatim(user_agent="photo_organizer")
-            location = geolocator.reverse((lat, lon), language="en", timeout=5)
-            if location and "address" in location.raw:
-                addr = location.raw["address"]
-                return {
-                    "city": addr.get("city")
-                    or addr.get("town")
-                    or addr.get("village"),
-                    "state": addr.get("state"),
-                    "country": addr.get("country"),
+# Column positions in GeoNames dumps such as ``cities1000.txt``.
+_GEONAMES_COLUMNS = {
+    "city": 1,
+    "latitude": 4,
+    "longitude": 5,
+    "country": 8,
+    "state": 10,
+}
+
+
+def _read_gazetteer(
+    path: str,
+) -> Tuple[List[Tuple[float, float]], List[Dict[str, str]]]:
+    """Read coordinates and places from a gazetteer TSV at *path*.
+
+    Files with a header row must provide ``city``, ``state``, ``country``,
+    ``latitude`` and ``longitude`` columns; ``ValueError`` names the
+    missing ones. Files without one are read as GeoNames dumps, where
+    ``state`` and ``country`` are the admin1 and ISO country codes.
+    """
+    coords: List[Tuple[float, float]] = []
+    places: List[Dict[str, str]] = []
+    with open(path, encoding="utf-8", newline="") as fh:
+        reader = csv.reader(fh, delimiter="\t", quoting=csv.QUOTE_NONE)
+        first = next(reader, None)
+        if first is None:
+            return coords, places
+        if "latitude" in first:
+            missing = [name for name in _GEONAMES_COLUMNS if name not in first]
+            if missing:
+                raise ValueError(
+                    f"gazetteer {path} has no {', '.join(missing)} column"
+                )
+            columns = {name: first.index(name) for name in _GEONAMES_COLUMNS}
+            rows: Iterable[List[str]] = reader
+        else:
+            columns = _GEONAMES_COLUMNS
+            rows = [first, *reader]
+        for row in rows:
+            try:
+                lat = float(row[columns["latitude"]])
+                lon = float(row[columns["longitude"]])
+            except (IndexError, ValueError):
+                continue
+            coords.append((lat, lon))
+            places.append(
+                {
+                    key: row[columns[key]]
+                    for key in ("city", "state", "country")
                 }
+            )
+    return coords, places
+
+
+def _unit_vectors(latlons: np.ndarray) -> np.ndarray:
+    """Map ``(lat, lon)`` rows in degrees to points on the unit sphere."""
+    lat = np.radians(latlons[:, 0])
+    lon = np.radians(latlons[:, 1])
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+class OfflineGeocoder:
+    """Nearest-city reverse geocoder that works without network access.
+
+    Places come from the gazetteer at *path* (the small bundled one by
+    default) plus :data:`OFFLINE_LOCATIONS`, and are indexed in a KD-tree
+    over unit-sphere coordinates, so a lookup is a single nearest
+    neighbour query. Points farther than *max_distance_km* from every
+    place resolve to ``{}``. The geocoder pickles to its settings and
+    rebuilds the index when unpickled.
+    """
+
+    def __init__(
+        self, path: str | None = None, max_distance_km: float = 100.0
+    ) -> None:
+        self.path = path
+        self.max_distance_km = max_distance_km
+        coords, places = _read_gazetteer(path or BUNDLED_GAZETTEER)
+        for (lat, lon), place in OFFLINE_LOCATIONS.items():
+            coords.append((lat, lon))
+            places.append(dict(place))
+        self.places = places
+        self._tree = KDTree(_unit_vectors(np.asarray(coords, dtype=float)))
+        # Chord length on the unit sphere matching the distance limit.
+        self._max_chord = 2 * np.sin(
+            min(max_distance_km / _EARTH_RADIUS_KM, np.pi) / 2
+        )
+
+    @property
+    def source(self) -> str:
+        """Name under which :class:`GeocodeCache` keeps its results."""
+        return "offline" if self.path is None else f"offline:{self.path}"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"path": self.path, "max_distance_km": self.max_distance_km}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)  # type: ignore[misc]
+
+    def resolve_many(
+        self, latlons: Sequence[Tuple[float, float]] | np.ndarray
+    ) -> List[Dict[str, str]]:
+        """Resolve every ``(lat, lon)`` pair with one vectorized query."""
+        points = np.asarray(latlons, dtype=float).reshape(-1, 2)
+        if len(points) == 0:
+            return []
+        dist, idx = self._tree.query(_unit_vectors(points), k=1)
+        return [
+            dict(self.places[i]) if d <= self._max_chord else {}
+            for d, i in zip(dist[:, 0], idx[:, 0])
+        ]
+
+    def resolve(self, lat: float, lon: float) -> Dict[str, str]:
+        """Return the place nearest to *lat*/*lon*."""
+        return self.resolve_many([(lat, lon)])[0]
+
+
+_offline_geocoder: OfflineGeocoder | None = None
+_online = True
+
+
+def set_offline_geocoder(
+    geocoder: OfflineGeocoder | None, online: bool = True
+) -> None:
+    """Install *geocoder* as the offline fallback in this process.
+
+    With ``online=False`` no network lookups are attempted at all, which
+    avoids waiting for timeouts on air-gapped hosts.
+    """
+    global _offline_geocoder, _online
+    _offline_geocoder = geocoder
+    _online = online
+
+
+def load_offline_geocoder() -> OfflineGeocoder:
+    """Return the installed offline geocoder, loading the bundled one."""
+    global _offline_geocoder
+    if _offline_geocoder is None:
+        _offline_geocoder = OfflineGeocoder()
+    return _offline_geocoder
+
+
+@timed("geocode_offline")
+def _offline_lookup(
+    lat: float, lon: float, geocoder: OfflineGeocoder | None = None
+) -> Dict[str, str]:
+    return (geocoder or load_offline_geocoder()).resolve(lat, lon)
+
+
+def _offline_source(geocoder: OfflineGeocoder | None = None) -> str:
+    geocoder = geocoder or _offline_geocoder
+    return geocoder.source if geocoder is not None else "offline"
+
+
+def resolve_locations(
+    latlons: Sequence[Tuple[float, float]] | np.ndarray,
+) -> List[Dict[str, str]]:
+    """Resolve a batch of ``(lat, lon)`` pairs with the offline geocoder."""
+    return load_offline_geocoder().resolve_many(latlons)
+
+
+_geolocator = None
+
+# Source of the results of the built-in Nominatim lookup.
+NOMINATIM_SOURCE = "nominatim"
+
+
+def _parse_address(addr: Dict[str, str]) -> Dict[str, str]:
+    return {
+        "city": addr.get("city") or addr.get("town") or addr.get("village"),
+        "state": addr.get("state"),
+        "country": addr.get("country"),
+    }
+
+
+@timed("geocode_network")
+def _network_lookup(lat: float, lon: float) -> Dict[str, str] | None:
+    """Reverse geocode with Nominatim; ``None`` if that is not possible."""
+    global _geolocator
+    if Nominatim is None:
+        return None
+    try:
+        if _geolocator is None:
+            _geolocator = Nominatim(user_agent="photo_organizer")
+        location = _geolocator.reverse((lat, lon), language="en", timeout=5)
+    except Exception:
+        return None
+    if location and "address" in location.raw:
+        return _parse_address(location.raw["address"])
+    return {}
+
+
+class NominatimClient:
+    """Minimal client for a Nominatim-compatible ``/reverse`` endpoint.
+
+    Useful for self-hosted Nominatim servers. Instances are callables
+    with the same contract as the built-in network lookup: a location
+    dictionary, ``{}`` when the server knows no address, or ``None`` on
+    errors.
+    """
+
+    def __init__(
+        self,
+        url: str = "https://nominatim.openstreetmap.org",
+        user_agent: str = "photo_organizer",
+        timeout: float = 5,
+    ) -> None:
+        self.url = url.rstrip("/")
+        self.user_agent = user_agent
+        self.timeout = timeout
+
+    @property
+    def source(self) -> str:
+        """Name under which :class:`GeocodeCache` keeps its results."""
+        return self.url
+
+    @timed("geocode_network")
+    def __call__(self, lat: float, lon: float) -> Dict[str, str] | None:
+        query = urlencode(
+            {
+                "lat": lat,
+                "lon": lon,
+                "format": "jsonv2",
+                "accept-language": "en",
+            }
+        )
+        request = Request(
+            f"{self.url}/reverse?{query}",
+            headers={"User-Agent": self.user_agent},
+        )
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                data = json.load(response)
         except Exception:
-            pass
-    return _offline_lookup(lat, lon)
+            return None
+        if isinstance(data, dict) and "address" in data:
+            return _parse_address(data["address"])
+        return {}
+
+
+Lookup = Callable[[float, float], Optional[Dict[str, str]]]
+
+
+def lookup_source(lookup: Lookup | None) -> str:
+    """Return the name under which results of *lookup* are cached.
+
+    ``None`` stands for the built-in Nominatim lookup. Other lookups are
+    named by their ``source`` attribute, or else their qualified name.
+    """
+    if lookup is None or lookup is _network_lookup:
+        return NOMINATIM_SOURCE
+    source = getattr(lookup, "source", None)
+    return source or getattr(lookup, "__qualname__", repr(lookup))
+
+
+class Geocoding:
+    """Reverse-geocoding setup of one scan.
+
+    Bundles the :class:`GeocodeCache` *cache*, the :class:`OfflineGeocoder`
+    *offline* (the installed default when ``None``), whether to go
+    *online* at all and the *network* lookup (Nominatim when ``None``).
+    Scans pass an instance around instead of installing process-wide
+    defaults, so scans running side by side keep their own settings. It
+    pickles for scan worker processes when *network* does.
+    """
+
+    def __init__(
+        self,
+        cache: GeocodeCache | None = None,
+        offline: OfflineGeocoder | None = None,
+        online: bool = True,
+        network: Lookup | None = None,
+    ) -> None:
+        self.cache = cache
+        self.offline = offline
+        self.online = online
+        self.network = network
+
+    def chain(self) -> List[Tuple[str, Lookup]]:
+        """Return the ``(source, lookup)`` pairs to try, in order.
+
+        The network lookup comes first unless lookups are offline only;
+        the offline geocoder always follows, its empty results counting
+        as none.
+        """
+        chain: List[Tuple[str, Lookup]] = []
+        if self.online:
+            chain.append(
+                (
+                    lookup_source(self.network),
+                    self.network or _network_lookup,
+                )
+            )
+        offline = self.offline
+        chain.append(
+            (
+                _offline_source(offline),
+                lambda lat, lon: _offline_lookup(lat, lon, offline) or None,
+            )
+        )
+        return chain
+
+    def lookup(
+        self, lat: float, lon: float
+    ) -> Tuple[str, Dict[str, str] | None]:
+        """Return the first uncached result of :meth:`chain` and its source."""
+        for source, lookup in self.chain():
+            result = lookup(lat, lon)
+            if result is not None:
+                return source, result
+        return source, None
+
+    def resolve(self, lat: float, lon: float) -> Dict[str, str]:
+        """Return the location for *lat*/*lon*, going through the cache."""
+        if self.cache is not None:
+            return self.cache._resolve(lat, lon, self.chain())
+        return self.lookup(lat, lon)[1] or {}
+
+
+def _installed(network: Lookup | None = None) -> Geocoding:
+    """Return the setup installed with the ``set_*`` functions."""
+    return Geocoding(_geocode_cache, _offline_geocoder, _online, network)
+
+
+def _lookup(
+    lat: float, lon: float, network: Lookup | None = None
+) -> Tuple[str, Dict[str, str] | None]:
+    return _installed(network).lookup(lat, lon)
+
+
+def geocode_cache_path(db_path: str) -> str:
+    """Return the path of the geocode cache stored next to *db_path*."""
+    return f"{db_path}.geocode.db"
+
+
+# Results are kept per source, so results of different geocoders for the
+# same cell never replace each other. Rows of the earlier ``geocode_cache``
+# table have no source; by default they came from Nominatim, so they are
+# moved over as its results and expire as usual.
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode_results (
+    source TEXT NOT NULL,
+    lat_key INTEGER NOT NULL,
+    lon_key INTEGER NOT NULL,
+    result TEXT,
+    created REAL,
+    PRIMARY KEY (source, lat_key, lon_key)
+);
+"""
+
+_MIGRATE_CACHE = """
+INSERT OR IGNORE INTO geocode_results
+SELECT 'nominatim', lat_key, lon_key, result, created FROM geocode_cache;
+DROP TABLE geocode_cache;
+"""
+
+# Connections of :class:`GeocodeCache` objects inherited through fork.
+_inherited: List[sqlite3.Connection] = []
+
+
+class GeocodeCache:
+    """Persistent reverse-geocoding cache keyed on quantized coordinates.
+
+    Coordinates are snapped to a grid of *resolution* degrees, so every
+    photo taken within the same cell shares one lookup. Results are kept
+    in the SQLite database at *path* for *ttl* seconds (``None`` keeps
+    them forever) behind an in-memory LRU of *max_entries* cells. Each
+    process opens its own connection on first use, so the cache can be
+    handed to scan workers, forked or pickled; a file database uses WAL
+    mode and waits up to *timeout* seconds for other writers. Failed
+    reads and writes count as misses and are recorded in
+    :data:`photo_organizer.stats.STATS`.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        resolution: float = 0.01,
+        ttl: float | None = 30 * 24 * 3600,
+        max_entries: int = 4096,
+        timeout: float = 30.0,
+    ) -> None:
+        self.path = path
+        self.resolution = resolution
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self._reset()
+        self._connect()
+
+    def _reset(self) -> None:
+        if getattr(self, "_conn", None) is not None:
+            # Closing a connection inherited through fork would act on
+            # the parent's database handle, so it is left alone.
+            _inherited.append(self._conn)
+        self._pid = os.getpid()
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this process's connection, opening it if needed.
+
+        Called with the lock held, except from the constructor. A forked
+        child still sees its parent's connection, lock and LRU, so they
+        are replaced rather than shared.
+        """
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, check_same_thread=False
+            )
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_CACHE_SCHEMA)
+            if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name='geocode_cache'"
+            ).fetchone():
+                conn.executescript(_MIGRATE_CACHE)
+            self._conn = conn
+        return self._conn
+
+    def _owned(self) -> threading.Lock:
+        """Return the lock, first dropping state inherited through fork."""
+        if self._pid != os.getpid():
+            self._reset()
+        return self._lock
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "resolution": self.resolution,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+            "timeout": self.timeout,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.hits = self.misses = self.memory_hits = 0
+        self._reset()
+
+    def key(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Return the grid cell containing *lat*/*lon*."""
+        return (
+            int(round(lat / self.resolution)),
+            int(round(lon / self.resolution)),
+        )
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(
+        self, lat: float, lon: float, source: str = NOMINATIM_SOURCE
+    ) -> Dict[str, str] | None:
+        """Return the result of *source* cached for the cell of *lat*/*lon*."""
+        key = (source, *self.key(lat, lon))
+        with self._owned():
+            cached = self._memory.get(key)
+            if cached is not None and not self._expired(cached[1]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                STATS.count("geocode_cache_hits")
+                self.memory_hits += 1
+                return dict(cached[0])
+            try:
+                row = self._connect().execute(
+                    "SELECT result, created FROM geocode_results "
+                    "WHERE source=? AND lat_key=? AND lon_key=?",
+                    key,
+                ).fetchone()
+            except sqlite3.Error as exc:
+                STATS.error("geocode_cache", self.path, exc)
+                row = None
+            if row is None or self._expired(row[1]):
+                self.misses += 1
+                STATS.count("geocode_cache_misses")
+                return None
+            result = json.loads(row[0])
+            self._remember(key, result, row[1])
+            self.hits += 1
+            STATS.count("geocode_cache_hits")
+            return dict(result)
+
+    def put(
+        self,
+        lat: float,
+        lon: float,
+        result: Dict[str, str],
+        source: str = NOMINATIM_SOURCE,
+    ) -> None:
+        """Store *result* of *source* for the cell of *lat*/*lon*."""
+        key = (source, *self.key(lat, lon))
+        created = time.time()
+        with self._owned():
+            self._remember(key, dict(result), created)
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO geocode_results"
+                        "(source, lat_key, lon_key, result, created) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (*key, json.dumps(result), created),
+                    )
+            except sqlite3.Error as exc:
+                STATS.error("geocode_cache", self.path, exc)
+
+    def _remember(
+        self,
+        key: Tuple[str, int, int],
+        result: Dict[str, str],
+        created: float,
+    ) -> None:
+        self._memory[key] = (result, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def resolve(
+        self, lat: float, lon: float, lookup: Lookup | None = None
+    ) -> Dict[str, str]:
+        """Return the location for *lat*/*lon*, calling *lookup* on a miss.
+
+        *lookup* defaults to the Nominatim lookup with offline fallback,
+        where each geocoder is asked only if its own cached result is
+        missing. A lookup returns ``None`` when nothing could be
+        determined (for example on a network error); such results are not
+        cached. Results are cached under :func:`lookup_source`.
+        """
+        if lookup is None:
+            return self._resolve(lat, lon, _installed().chain())
+        return self._resolve(lat, lon, [(lookup_source(lookup), lookup)])
+
+    def _resolve(
+        self, lat: float, lon: float, chain: List[Tuple[str, Lookup]]
+    ) -> Dict[str, str]:
+        for source, fn in chain:
+            cached = self.get(lat, lon, source)
+            if cached is not None:
+                return cached
+            result = fn(lat, lon)
+            if result is not None:
+                self.put(lat, lon, result, source)
+                return result
+        return {}
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit and miss counters."""
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+        }
+
+
+_geocode_cache: GeocodeCache | None = None
+
+
+def set_geocode_cache(cache: GeocodeCache | None) -> None:
+    """Route :func:`resolve_location` through *cache* in this process."""
+    global _geocode_cache
+    _geocode_cache = cache
+
+
+def resolve_location(lat: float, lon: float) -> Dict[str, str]:
+    """Resolve *lat* and *lon* to a city/state/country dictionary.
+
+    Lookups go through the cache installed with
+    :func:`set_geocode_cache`, if any, and use the geocoders installed
+    with :func:`set_offline_geocoder`.
+    """
+    return _installed().resolve(lat, lon)
 
 
 def group_by_location(
@@ -61,4 +643,18 @@ def group_by_location(
     return groups
 
 
-__all__ = ["resolve_location", "group_by_location"]
+__all__ = [
+    "NOMINATIM_SOURCE",
+    "NominatimClient",
+    "OfflineGeocoder",
+    "GeocodeCache",
+    "Geocoding",
+    "geocode_cache_path",
+    "lookup_source",
+    "set_geocode_cache",
+    "set_offline_geocoder",
+    "load_offline_geocoder",
+    "resolve_location",
+    "resolve_locations",
+    "group_by_location",
+]
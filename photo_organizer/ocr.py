@@ -4,12 +4,15 @@ from __future__ import annotations
 
 from PIL import Image
 
+from .stats import timed
+
 try:  # pragma: no cover - optional dependency
     import pytesseract
 except Exception:  # pragma: no cover - handled gracefully
     pytesseract = None  # type: ignore
 
 
+@timed("ocr")
 def extract_text(img: Image.Image) -> str:
     """Return text from *img* using Tesseract if available."""
     if pytesseract is None:
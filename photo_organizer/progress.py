@@ -0,0 +1,95 @@
+"""Progress and ETA tracking for streaming scans."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class Progress:
+    """Count files found by the walk and finished by the scan.
+
+    The walk runs ahead of the scan, so the total is only known once it
+    has finished; until then :meth:`snapshot` reports ``total`` and
+    ``eta`` as ``None``. The rate is averaged over the whole scan, which
+    is steady enough once the models are loaded. Safe to update from
+    several threads. With *report*, :meth:`advance` passes a
+    :meth:`snapshot` to it every *interval* seconds, for skipped files
+    as well as scanned ones.
+    """
+
+    def __init__(
+        self,
+        interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        report: Callable[[Dict[str, Any]], None] | None = None,
+    ) -> None:
+        self.interval = interval
+        self.report = report
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started = clock()
+        self._reported = self.started
+        self.found = 0
+        self.done = 0
+        self.unchanged = 0
+        self.walk_finished = False
+
+    def walk(self, files: Iterable[T]) -> Iterator[T]:
+        """Yield *files*, counting each and noting when the walk ends."""
+        for item in files:
+            with self._lock:
+                self.found += 1
+            yield item
+        with self._lock:
+            self.walk_finished = True
+
+    def advance(self, n: int = 1, unchanged: bool = False) -> None:
+        """Record that *n* files finished, skipped ones with *unchanged*."""
+        with self._lock:
+            self.done += n
+            if unchanged:
+                self.unchanged += n
+        if self.report is not None and self.due():
+            self.report(self.snapshot())
+
+    def due(self) -> bool:
+        """Return whether *interval* passed since the last report.
+
+        Returning ``True`` starts the next interval.
+        """
+        now = self._clock()
+        with self._lock:
+            if now - self._reported < self.interval:
+                return False
+            self._reported = now
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return counts, throughput and the estimated seconds left."""
+        with self._lock:
+            elapsed = self._clock() - self.started
+            total = self.found if self.walk_finished else None
+            rate = self.done / elapsed if elapsed > 0 else None
+            eta = None
+            if total is not None:
+                remaining = max(0, total - self.done)
+                if remaining == 0:
+                    eta = 0.0
+                elif rate:
+                    eta = round(remaining / rate, 1)
+            return {
+                "done": self.done,
+                "unchanged": self.unchanged,
+                "found": self.found,
+                "total": total,
+                "elapsed": round(elapsed, 3),
+                "rate": round(rate, 2) if rate is not None else None,
+                "eta": eta,
+            }
+
+
+__all__ = ["Progress"]
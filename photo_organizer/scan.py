@@ -2,14 +2,42 @@
 
 from __future__ import annotations
 
+import copy
+import hashlib
 import os
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from fractions import Fraction
-from typing import Dict, Iterable, List, Tuple
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+import numpy as np
 from PIL import Image, ExifTags
-from .face import detect_faces, extract_face, load_embedder
-from .classifier import classify_image
+from .face import detect_faces, extract_face, load_detector, load_embedder
+from .classifier import classify_images, load_classifier
+from .duplicates import StoredResults, file_digest, image_hashes
 from .ocr import extract_text
-from .location import resolve_location
+from .progress import Progress
+from .stats import STATS, timed
+from .thumbnails import ThumbnailCache, orientation
+from .walk import walk_images
+from .geocode import AsyncGeocoder
+from .location import GeocodeCache, Geocoding, OfflineGeocoder
 
 
 def _gps_to_decimal(
@@ -26,6 +54,7 @@ def _gps_to_decimal(
         return None
 
 
+@timed("exif")
 def _extract_exif(image: Image.Image) -> Dict[str, str]:
     """Extract timestamp, GPS, and camera metadata from PIL image."""
     exif_data: Dict[str, str] = {}
@@ -46,6 +75,9 @@ def _extract_exif(image: Image.Image) -> Dict[str, str]:
         elif tag == "GPSInfo":
             gps_raw = value
 
+    # Pillow reports the GPS IFD as an offset; its tags live in a sub-IFD.
+    if isinstance(gps_raw, int) and hasattr(info, "get_ifd"):
+        gps_raw = info.get_ifd(0x8825)
     if gps_raw:
         gps_parsed = {
             ExifTags.GPSTAGS.get(k, k): v for k, v in gps_raw.items()
@@ -69,69 +101,831 @@ def _extract_exif(image: Image.Image) -> Dict[str, str]:
 
 
 def find_images(
-    folder: str, extensions: Iterable[str] | None = None
+    folder: str,
+    extensions: Iterable[str] | None = None,
+    ignore: Iterable[str] | None = None,
+    max_depth: int | None = None,
 ) -> List[str]:
-    """Recursively collect image file paths within *folder*."""
-    if extensions is None:
-        extensions = {".jpg", ".jpeg", ".png"}
-    else:
-        extensions = {
-            e.lower() if e.startswith(".") else f".{e.lower()}"
-            for e in extensions
-        }
+    """Recursively collect image file paths within *folder*.
+
+    See :func:`photo_organizer.walk.walk_images` for *ignore* and
+    *max_depth*.
+    """
+    return [
+        path
+        for path, _ in walk_images(folder, extensions, ignore, max_depth)
+    ]
+
+
+@timed("fingerprint")
+def _fingerprint(path: str, size: int, block: int = 1 << 16) -> str:
+    """Return a fast content fingerprint for the file at *path*.
+
+    Only the first and last *block* bytes are hashed together with the
+    file size, so the cost is constant regardless of image resolution.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as fh:
+        digest.update(fh.read(block))
+        if size > 2 * block:
+            fh.seek(-block, os.SEEK_END)
+            digest.update(fh.read(block))
+        elif size > block:
+            digest.update(fh.read())
+    return digest.hexdigest()
+
+
+def file_signature(
+    path: str,
+    previous: Dict[str, Any] | None = None,
+    stat: os.stat_result | None = None,
+) -> Dict[str, Any] | None:
+    """Return the ``size``/``mtime``/``fingerprint`` of *path*.
+
+    If *previous* holds a stored signature with the same size and mtime,
+    ``None`` is returned instead, so unchanged files cost a single
+    ``stat`` call, or none when *stat* already holds the result from the
+    directory walk. Any other file counts as changed: the fingerprint
+    only covers the ends of the file, so a match cannot rule out edits in
+    between, and rescanning stores the new mtime.
+    """
+    st = stat if stat is not None else os.stat(path)
+    if (
+        previous is not None
+        and previous.get("size") == st.st_size
+        and previous.get("mtime") == st.st_mtime
+    ):
+        return None
+    return {
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "fingerprint": _fingerprint(path, st.st_size),
+    }
+
+
+class _ScanContext:
+    """Settings of one scan, handed to every stage that needs them.
+
+    *geocoding* resolves locations during the scan; it is ``None`` when
+    an :class:`AsyncGeocoder` resolves them afterwards. *thumbnails*
+    receives thumbnails of every decoded image and *stored* finds the
+    results of exact copies already in the database. Keeping them here
+    rather than in module globals lets scans run side by side in one
+    process, as under ``cli.py --serve``. Worker processes get a pickled
+    copy.
+    """
+
+    def __init__(
+        self,
+        geocoding: Geocoding | None = None,
+        thumbnails: ThumbnailCache | None = None,
+        stored: StoredResults | None = None,
+    ) -> None:
+        self.geocoding = geocoding
+        self.thumbnails = thumbnails
+        self.stored = stored
+
+
+def _locate(
+    path: str, exif: Dict[str, str], geocoding: Geocoding | None
+) -> Dict[str, str]:
+    """Resolve the ``gps`` field of *exif*, read from *path*."""
+    if "gps" not in exif or geocoding is None:
+        return {}
+    try:
+        lat_str, lon_str = exif["gps"].split(",")
+        return geocoding.resolve(float(lat_str), float(lon_str))
+    except Exception as exc:
+        STATS.error("geocode", path, exc)
+        return {}
+
+
+def _write_thumbnails(
+    path: str,
+    key: str | None,
+    rgb: Image.Image,
+    orient: int,
+    cache: ThumbnailCache | None,
+) -> Dict[str, str] | None:
+    if cache is None or not key:
+        return None
+    try:
+        return cache.write(key, rgb, orient)
+    except Exception as exc:
+        STATS.error("thumbnail", path, exc)
+        return None
+
+
+def _stored_result(
+    path: str, digest: str, stored: StoredResults | None
+) -> Dict[str, Any] | None:
+    """Return the results of another stored copy of *path*, if current."""
+    if stored is None:
+        return None
+    try:
+        return stored.get(digest, path, RESULTS_VERSION)
+    except Exception as exc:
+        STATS.error("reuse", path, exc)
+        return None
+
+
+# Stored with every complete scan result as ``results_version``. Bump it
+# whenever a pipeline change alters the results for a file, so copies
+# are scanned again rather than given results of an older pipeline.
+RESULTS_VERSION = 1
+
+# Keys of an entry that describe the file rather than its content, and
+# ``event_id``, which ``update_events`` assigns to every stored photo.
+_FILE_KEYS = {"path", "size", "mtime", "fingerprint", "thumbnails", "event_id"}
 
-    paths: List[str] = []
-    for root, _, files in os.walk(folder):
-        for name in files:
-            ext = os.path.splitext(name)[1].lower()
-            if ext in extensions:
-                paths.append(os.path.join(root, name))
-    return paths
 
+def _copy_results(
+    entry: Dict[str, Any],
+    source: Dict[str, Any],
+    thumbnails: ThumbnailCache | None = None,
+) -> None:
+    """Give *entry* the content results of its exact copy *source*.
 
-def scan_folder(folder: str) -> List[Dict[str, str]]:
-    """Scan folder for images and return metadata list."""
-    metadata: List[Dict[str, str]] = []
+    Faces keep their boxes and embeddings but not their ids or clusters,
+    so they are clustered and indexed like newly detected faces. Cached
+    *thumbnails* of the content are attached when they still exist.
+    """
+    for key, value in source.items():
+        if key in _FILE_KEYS:
+            continue
+        if key == "faces":
+            value = [
+                {
+                    k: v.astype(float).tolist()
+                    if isinstance(v, np.ndarray)
+                    else v
+                    for k, v in face.items()
+                    if k not in ("id", "cluster_id")
+                }
+                for face in value
+            ]
+        entry[key] = copy.deepcopy(value)
+    key = entry.get("sha256")
+    if thumbnails is not None and key:
+        paths = thumbnails.paths(key)
+        if all(os.path.exists(p) for p in paths.values()):
+            thumbnails.touch(paths.values())
+            entry["thumbnails"] = paths
+
+
+# Shorter side of the reduced copy kept for batched classification. The
+# MobileNet transform resizes to 232 px anyway, so nothing is lost.
+_CLASSIFY_SIDE = 256
+
+
+# Longest side of the shared decode used by face detection, face crops and
+# the classification copy.
+_DECODE_SIDE = 1024
+
+
+@timed("decode")
+def _decode(
+    img: Image.Image, side: int = _DECODE_SIDE
+) -> Tuple[Image.Image, float, float]:
+    """Decode *img* once into an RGB image whose longest side is *side*.
+
+    JPEG files use draft mode, so the decoder's DCT scaling skips most of
+    the work for large photos. Returns the image together with the x and
+    y factors that map its coordinates back to the original image.
+    """
+    width, height = img.size
+    scale = side / max(width, height)
+    if scale < 1:
+        img.draft("RGB", (round(width * scale), round(height * scale)))
+    rgb = img.convert("RGB")
+    if max(rgb.size) > side:
+        rgb.thumbnail((side, side))
+    return rgb, width / rgb.size[0], height / rgb.size[1]
+
+
+def _classification_copy(rgb: Image.Image) -> Image.Image:
+    """Return a small copy of the decoded *rgb* for classification."""
+    w, h = rgb.size
+    scale = _CLASSIFY_SIDE / min(w, h)
+    if scale < 1:
+        rgb = rgb.resize((max(1, round(w * scale)), max(1, round(h * scale))))
+    return rgb
+
+
+def _scan_file(
+    path: str,
+    embedder,
+    key: str | None = None,
+    ctx: _ScanContext | None = None,
+) -> Tuple[
+    Dict[str, Any], Optional[Image.Image], List[Image.Image], bool
+]:
+    """Run the per-image stages of the pipeline on *path*.
+
+    The pixels are decoded once at reduced resolution (see
+    :func:`_decode`) and the same RGB data is shared by every stage. Returns
+    the metadata entry, a reduced copy of the image that is classified
+    later together with the rest of its batch (``None`` when the image
+    could not be decoded) and one face crop, already resized to the
+    embedder input, per entry in ``entry["faces"]``, and whether every
+    stage succeeded. Face boxes are reported in original image
+    coordinates. Classification and embedding
+    are left to :func:`_scan_batch`. With a thumbnail cache in *ctx*
+    the decoded image is also stored as thumbnails under the file's
+    SHA-256 *key*. The entry gets the perceptual ``dhash`` and
+    ``phash`` of the decoded image.
+    """
+    ctx = ctx or _ScanContext()
+    faces_info = []
+    thumbnails = None
+    hashes: Dict[str, str] = {}
+    crops: List[Image.Image] = []
+    small = None
+    complete = False
+    try:
+        with Image.open(path) as img:
+            exif = _extract_exif(img)
+            location_info = _locate(path, exif, ctx.geocoding)
+            rgb, sx, sy = _decode(img)
+            orient = orientation(img)
+            hashes = image_hashes(rgb, orient)
+            thumbnails = _write_thumbnails(
+                path, key, rgb, orient, ctx.thumbnails
+            )
+            small = _classification_copy(rgb)
+            for box in detect_faces(np.asarray(rgb)):
+                face_img = extract_face(rgb, box)
+                crops.append(face_img.resize(embedder.input_size))
+                x1, y1, x2, y2 = box
+                faces_info.append(
+                    {
+                        "box": [
+                            round(x1 * sx),
+                            round(y1 * sy),
+                            round(x2 * sx),
+                            round(y2 * sy),
+                        ]
+                    }
+                )
+        complete = True
+    except Exception as exc:
+        STATS.error("scan", path, exc)
+        exif = {}
+        location_info = {}
+        faces_info, crops = [], []
+    entry = _empty_entry(path)
+    entry["exif"] = exif
+    entry["faces"] = faces_info
+    entry.update(location_info)
+    entry.update(hashes)
+    if thumbnails:
+        entry["thumbnails"] = thumbnails
+    return entry, small, crops, complete
+
+
+def _empty_entry(path: str) -> Dict[str, Any]:
+    return {
+        "path": path,
+        "exif": {},
+        "faces": [],
+        "category": "other",
+        "ocr_text": "",
+    }
+
+
+def _extract_text_from(path: str) -> str:
+    try:
+        with Image.open(path) as img:
+            return extract_text(img)
+    except Exception as exc:
+        STATS.error("ocr", path, exc)
+        return ""
+
+
+# ``(path, previous_signature, stat)`` as produced by :func:`_batches`.
+_Item = Tuple[str, Optional[Dict[str, Any]], Optional[os.stat_result]]
+
+
+def _scan_batch(
+    items: List[_Item],
+    batch_size: int = 32,
+    ctx: _ScanContext | None = None,
+) -> List[Dict[str, Any] | None]:
+    """Scan ``(path, previous_signature, stat)`` items; never raises.
+
+    Files matching their previous signature yield ``None``. The reduced
+    copies of all decoded images are classified with a single
+    :func:`classify_images` call before OCR runs on documents, and the
+    face crops of the whole batch are embedded with one
+    :meth:`FaceEmbedder.embed_batch` call. Every complete entry gets the
+    ``sha256`` of its file and the :data:`RESULTS_VERSION`; exact copies
+    of a file earlier in the batch, or of another photo stored with the
+    current version in the database of ``ctx.stored``, are not decoded
+    and take over its results instead. Entries of files that failed a
+    stage get neither, so their results are never copied.
+    """
+    ctx = ctx or _ScanContext()
     embedder = load_embedder()
-    for path in find_images(folder):
-        faces_info = []
-        category = "other"
-        text = ""
+    entries: List[Dict[str, Any] | None] = []
+    pending: List[Tuple[Dict[str, Any], Image.Image]] = []
+    faces: List[Dict[str, Any]] = []
+    crops: List[Image.Image] = []
+    scanned: Dict[str, Dict[str, Any]] = {}
+    copies: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    for path, previous, st in items:
         try:
-            with Image.open(path) as img:
-                exif = _extract_exif(img)
-                location_info = {}
-                if "gps" in exif:
-                    try:
-                        lat_str, lon_str = exif["gps"].split(",")
-                        location_info = resolve_location(
-                            float(lat_str), float(lon_str)
-                        )
-                    except Exception:
-                        location_info = {}
-                category = classify_image(img)
-                if category in {"document", "id"}:
-                    text = extract_text(img)
-                boxes = detect_faces(img)
-                for box in boxes:
-                    face_img = extract_face(img, box)
-                    embedding = embedder(face_img).astype(float).tolist()
-                    faces_info.append(
-                        {"box": list(box), "embedding": embedding}
-                    )
-        except Exception:
-            exif = {}
-            location_info = {}
-        entry = {
-            "path": path,
-            "exif": exif,
-            "faces": faces_info,
-            "category": category,
-            "ocr_text": text,
-        }
-        entry.update(location_info)
-        metadata.append(entry)
-    return metadata
+            signature = file_signature(path, previous, st)
+        except OSError as exc:
+            STATS.error("signature", path, exc)
+            signature = None
+        if signature is None:
+            STATS.count("files_unchanged")
+            entries.append(None)
+            continue
+        try:
+            digest: str | None = file_digest(path)
+        except OSError as exc:
+            STATS.error("digest", path, exc)
+            digest = None
+        source = scanned.get(digest) if digest else None
+        stored = None
+        if digest and source is None:
+            stored = _stored_result(path, digest, ctx.stored)
+        if source is not None or stored is not None:
+            STATS.count("files_reused")
+            entry = _empty_entry(path)
+            entry.update(signature)
+            entries.append(entry)
+            if stored is not None:
+                _copy_results(entry, stored, ctx.thumbnails)
+            else:
+                copies.append((entry, source))
+            continue
+        try:
+            entry, small, face_crops, complete = _scan_file(
+                path, embedder, digest, ctx
+            )
+        except Exception as exc:
+            STATS.error("scan", path, exc)
+            entry, small, face_crops = _empty_entry(path), None, []
+            complete = False
+        STATS.count("files_scanned")
+        entry.update(signature)
+        if digest and complete:
+            entry["sha256"] = digest
+            entry["results_version"] = RESULTS_VERSION
+            scanned[digest] = entry
+        entries.append(entry)
+        if small is not None:
+            pending.append((entry, small))
+        faces.extend(entry["faces"])
+        crops.extend(face_crops)
+
+    if crops:
+        try:
+            embeddings = embedder.embed_batch(crops)
+            for face, embedding in zip(faces, embeddings):
+                face["embedding"] = embedding.astype(float).tolist()
+        except Exception as exc:
+            for entry in entries:
+                if entry is not None and entry["faces"]:
+                    STATS.error("embed", entry["path"], exc)
+                    _incomplete(entry)
+
+    if pending:
+        try:
+            categories = classify_images(
+                [small for _, small in pending], batch_size=batch_size
+            )
+        except Exception as exc:
+            for entry, _ in pending:
+                STATS.error("classify", entry["path"], exc)
+                _incomplete(entry)
+            categories = ["other"] * len(pending)
+        for (entry, _), category in zip(pending, categories):
+            entry["category"] = category
+            if category in {"document", "id"}:
+                entry["ocr_text"] = _extract_text_from(entry["path"])
+    for entry, source in copies:
+        _copy_results(entry, source, ctx.thumbnails)
+    return entries
+
+
+def _incomplete(entry: Dict[str, Any]) -> None:
+    """Keep the results of *entry*, which failed a stage, from being reused.
+
+    Copies of it in the same batch copy its results later and lose the
+    keys with it.
+    """
+    entry.pop("sha256", None)
+    entry.pop("results_version", None)
+
+
+# The context of the scan this worker process belongs to. Every scan
+# starts its own pool, so a worker only ever serves one scan.
+_worker_context: _ScanContext | None = None
+
+
+def _init_worker(
+    ctx: _ScanContext | None = None,
+    intra_op_num_threads: int | None = None,
+    inter_op_num_threads: int | None = None,
+) -> None:
+    """Load every model once per worker process."""
+    global _worker_context
+    # A forked worker starts with a copy of the parent's statistics,
+    # which would be merged back with its own.
+    STATS.reset()
+    _worker_context = ctx
+    load_classifier()
+    load_detector()
+    load_embedder(None, intra_op_num_threads, inter_op_num_threads)
+
+
+def _batches(
+    files: Iterable[Tuple[str, os.stat_result]],
+    known: Dict[str, Dict[str, Any]] | None,
+    batch_size: int,
+) -> Iterator[List[_Item]]:
+    it = iter(files)
+    while True:
+        chunk = list(islice(it, max(1, batch_size)))
+        if not chunk:
+            return
+        yield [
+            (p, known.get(p) if known is not None else None, st)
+            for p, st in chunk
+        ]
+
+
+def _bounded_map(
+    pool: Executor, fn: Callable, items: Iterable[Any], window: int
+) -> Iterator[Tuple[Any, Future]]:
+    """Yield ``(item, future)`` pairs for ``fn(item)`` in input order.
+
+    At most *window* items are in flight, so results are streamed back
+    as they complete instead of submitting everything up front.
+    """
+    pending: deque = deque()
+    it = iter(items)
+    for item in islice(it, window):
+        pending.append((item, pool.submit(fn, item)))
+    while pending:
+        item, future = pending.popleft()
+        following = next(it, None)
+        if following is not None:
+            pending.append((following, pool.submit(fn, following)))
+        yield item, future
+
+
+def _scan_batch_in_worker(
+    items: List[_Item], batch_size: int = 32
+) -> Tuple[List[Dict[str, Any] | None], Dict[str, Any]]:
+    """Run :func:`_scan_batch` and hand the worker's statistics back."""
+    entries = _scan_batch(items, batch_size, _worker_context)
+    return entries, STATS.drain()
+
+
+class _WorkerPool:
+    """A pool of scan worker processes that is replaced when one dies.
+
+    A worker killed by a native crash, for example in onnxruntime or a
+    codec, breaks a :class:`ProcessPoolExecutor` for good: every batch in
+    flight fails and no more work can be submitted. :meth:`run_alone`
+    then finds the files responsible by running batches, and if need be
+    single files, each in a fresh pool.
+    """
+
+    def __init__(
+        self, workers: int, batch_size: int, initargs: Tuple[Any, ...]
+    ) -> None:
+        self.workers = workers
+        self.initargs = initargs
+        self.scan = partial(_scan_batch_in_worker, batch_size=batch_size)
+        self.pool = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=self.initargs,
+        )
+
+    def restart(self) -> None:
+        """Replace the broken pool with a new one."""
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.pool = self._start()
+        STATS.count("pool_restarts")
+
+    def submit(self, batch: List[_Item]) -> Future:
+        """Start scanning *batch*; a broken pool gives a failed future."""
+        try:
+            return self.pool.submit(self.scan, batch)
+        except BrokenProcessPool as exc:
+            future: Future = Future()
+            future.set_exception(exc)
+            return future
+
+    def result(
+        self, batch: List[_Item], future: Future
+    ) -> List[Dict[str, Any] | None]:
+        """Return the entries of *batch*, empty ones if scanning it failed.
+
+        Raises :class:`BrokenProcessPool` when a worker died meanwhile.
+        """
+        try:
+            entries, stats = future.result()
+        except BrokenProcessPool:
+            raise
+        except Exception as exc:
+            entries = []
+            for path, _, _ in batch:
+                STATS.error("worker", path, exc)
+                entries.append(_empty_entry(path))
+        else:
+            STATS.merge(stats)
+        return entries
+
+    def run_alone(
+        self, batch: List[_Item]
+    ) -> List[Dict[str, Any] | None]:
+        """Scan *batch* with nothing else in flight, isolating crashes.
+
+        If the pool breaks, each file is retried on its own and the files
+        that still kill their worker get empty entries.
+        """
+        try:
+            return self.result(batch, self.submit(batch))
+        except BrokenProcessPool as exc:
+            self.restart()
+            if len(batch) > 1:
+                return [
+                    entry for item in batch for entry in self.run_alone([item])
+                ]
+            STATS.error("worker", batch[0][0], exc)
+            return [_empty_entry(batch[0][0])]
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _scan_parallel(
+    batches: Iterable[List[_Item]],
+    workers: int,
+    batch_size: int,
+    initargs: Tuple[Any, ...] = (),
+) -> Iterator[Dict[str, Any] | None]:
+    """Scan *batches* on a pool of *workers* processes, yielding in order.
+
+    At most ``2 * workers`` batches are in flight. A batch that raises
+    yields empty entries for its files. When a worker process dies the
+    pool is replaced and the batches that were in flight are run again
+    one at a time (see :meth:`_WorkerPool.run_alone`), so only the files
+    that crash a worker are lost and the scan goes on.
+    """
+    pool = _WorkerPool(workers, batch_size, initargs)
+    window = 2 * workers
+    pending: deque = deque()
+    it = iter(batches)
+    try:
+        while True:
+            for batch in islice(it, window - len(pending)):
+                pending.append((batch, pool.submit(batch)))
+            if not pending:
+                return
+            batch, future = pending.popleft()
+            try:
+                yield from pool.result(batch, future)
+            except BrokenProcessPool:
+                suspects = [batch, *(b for b, _ in pending)]
+                pending.clear()
+                pool.restart()
+                for suspect in suspects:
+                    yield from pool.run_alone(suspect)
+    finally:
+        pool.close()
+
+
+def iter_scan(
+    folder: str,
+    known: Dict[str, Dict[str, Any]] | None = None,
+    workers: int = 1,
+    batch_size: int = 32,
+    intra_op_num_threads: int | None = None,
+    inter_op_num_threads: int | None = None,
+    geocode_cache: GeocodeCache | None = None,
+    offline_geocoder: OfflineGeocoder | None = None,
+    online_geocoding: bool = True,
+    ignore: Iterable[str] | None = None,
+    max_depth: int | None = None,
+    walk_threads: int = 8,
+    geocoder: AsyncGeocoder | None = None,
+    thumbnails: ThumbnailCache | None = None,
+    progress: Progress | None = None,
+    reuse: StoredResults | None = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield metadata for the images in *folder* as they are scanned.
+
+    Only one batch per worker is held in memory at a time, so the
+    generator can be fed straight into
+    :func:`photo_organizer.db.insert_metadata` with a ``chunk_size``.
+    When *known* maps paths to previously stored signatures (see
+    :func:`photo_organizer.db.get_signatures`), unchanged files are
+    skipped and only new or modified images are yielded. Images are
+    processed in batches of *batch_size* so classification runs one
+    forward pass per batch. With ``workers > 1`` batches are processed by
+    a process pool; results keep the order in which the directory walk
+    found the files. The ``*_op_num_threads`` arguments tune the ONNX
+    face embedder session. *geocode_cache*, *offline_geocoder* and
+    *online_geocoding* configure reverse geocoding for this scan only
+    (see :class:`photo_organizer.location.Geocoding`). Files are
+    found with :func:`photo_organizer.walk.walk_images` on *walk_threads*
+    threads, honouring *ignore* patterns and *max_depth*; scanning starts
+    while the walk is still running. With a *geocoder*, locations are not
+    resolved inside the scan: coordinates are handed to the
+    :class:`photo_organizer.geocode.AsyncGeocoder` instead, so network
+    lookups overlap with image processing; it uses its own cache and
+    geocoders. With *thumbnails*, every
+    scanned image is stored in that
+    :class:`photo_organizer.thumbnails.ThumbnailCache` from the same
+    decode and its entry gets a ``thumbnails`` dict mapping each size to
+    a path. A :class:`photo_organizer.progress.Progress` given as
+    *progress* counts the files found and every file finished, including
+    unchanged ones, as the scan goes. Exact copies of another file in the
+    same batch are never decoded, and with *reuse*, a
+    :class:`photo_organizer.duplicates.StoredResults`, neither are copies
+    of photos already stored in its database; they get the results of
+    the original instead.
+    """
+    geocoding = _geocoding(
+        geocode_cache, offline_geocoder, online_geocoding, geocoder
+    )
+    ctx = _ScanContext(geocoding, thumbnails, reuse)
+    files = walk_images(
+        folder, ignore=ignore, max_depth=max_depth, threads=walk_threads
+    )
+    if progress is not None:
+        files = progress.walk(files)
+    batches = _batches(files, known, batch_size)
+    if workers > 1:
+        results: Iterable = _scan_parallel(
+            batches,
+            workers,
+            batch_size,
+            (ctx, intra_op_num_threads, inter_op_num_threads),
+        )
+    else:
+        load_embedder(None, intra_op_num_threads, inter_op_num_threads)
+        results = (
+            entry
+            for batch in batches
+            for entry in _scan_batch(batch, batch_size, ctx)
+        )
+    entries = _changed(results, progress)
+    if geocoder is not None:
+        entries = geocoder.pipe(entries)
+    if progress is not None:
+        entries = _advance(entries, progress)
+    yield from entries
+
+
+def _geocoding(
+    cache: GeocodeCache | None,
+    offline: OfflineGeocoder | None,
+    online: bool,
+    geocoder: AsyncGeocoder | None,
+) -> Geocoding | None:
+    """Return how a scan resolves locations, ``None`` if *geocoder* does."""
+    if geocoder is not None:
+        return None
+    return Geocoding(cache, offline, online)
+
+
+def _changed(
+    results: Iterable[Dict[str, Any] | None], progress: Progress | None
+) -> Iterator[Dict[str, Any]]:
+    """Drop the ``None`` results of unchanged files."""
+    for entry in results:
+        if entry is not None:
+            yield entry
+        elif progress is not None:
+            progress.advance(unchanged=True)
+
+
+def _advance(
+    entries: Iterable[Dict[str, Any]], progress: Progress
+) -> Iterator[Dict[str, Any]]:
+    for entry in entries:
+        progress.advance()
+        yield entry
+
+
+def _scan_metadata(
+    path: str, geocoding: Geocoding | None = None
+) -> Dict[str, Any]:
+    """Return EXIF and location fields for *path*; never raises."""
+    try:
+        with Image.open(path) as img:
+            exif = _extract_exif(img)
+    except Exception as exc:
+        STATS.error("exif", path, exc)
+        exif = {}
+    entry: Dict[str, Any] = {"path": path, "exif": exif}
+    entry.update(_locate(path, exif, geocoding))
+    return entry
+
+
+def _read_headers(
+    paths: Iterable[str], threads: int, geocoding: Geocoding | None
+) -> Iterator[Dict[str, Any]]:
+    read = partial(_scan_metadata, geocoding=geocoding)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for _, future in _bounded_map(pool, read, paths, 4 * threads):
+            yield future.result()
+
+
+def iter_scan_metadata(
+    folder: str,
+    threads: int = 16,
+    geocode_cache: GeocodeCache | None = None,
+    offline_geocoder: OfflineGeocoder | None = None,
+    online_geocoding: bool = True,
+    ignore: Iterable[str] | None = None,
+    max_depth: int | None = None,
+    geocoder: AsyncGeocoder | None = None,
+    progress: Progress | None = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield EXIF and location metadata for the images in *folder*.
+
+    No pixels are decoded: ``Image.open`` only parses the file header,
+    which for JPEG includes the EXIF APP1 segment, and none of the ML
+    stages run. The directory walk and the header reads each use a pool
+    of *threads* threads; results keep the walk order. Each entry only
+    holds ``path``, ``exif`` and the resolved location fields, ready for
+    :func:`photo_organizer.db.merge_metadata`. The geocoding, walk and
+    *progress* arguments behave as in :func:`iter_scan`.
+    """
+    geocoding = _geocoding(
+        geocode_cache, offline_geocoder, online_geocoding, geocoder
+    )
+    files = walk_images(
+        folder, ignore=ignore, max_depth=max_depth, threads=threads
+    )
+    if progress is not None:
+        files = progress.walk(files)
+    entries = _read_headers((path for path, _ in files), threads, geocoding)
+    if geocoder is not None:
+        entries = geocoder.pipe(entries)
+    if progress is not None:
+        entries = _advance(entries, progress)
+    yield from entries
+
+
+def scan_folder(
+    folder: str,
+    known: Dict[str, Dict[str, Any]] | None = None,
+    workers: int = 1,
+    batch_size: int = 32,
+    intra_op_num_threads: int | None = None,
+    inter_op_num_threads: int | None = None,
+    geocode_cache: GeocodeCache | None = None,
+    offline_geocoder: OfflineGeocoder | None = None,
+    online_geocoding: bool = True,
+    ignore: Iterable[str] | None = None,
+    max_depth: int | None = None,
+    geocoder: AsyncGeocoder | None = None,
+    thumbnails: ThumbnailCache | None = None,
+    reuse: StoredResults | None = None,
+) -> List[Dict[str, Any]]:
+    """Scan folder for images and return metadata list.
+
+    This collects :func:`iter_scan` into a list; see there for the
+    meaning of the arguments.
+    """
+    return list(
+        iter_scan(
+            folder,
+            known=known,
+            workers=workers,
+            batch_size=batch_size,
+            intra_op_num_threads=intra_op_num_threads,
+            inter_op_num_threads=inter_op_num_threads,
+            geocode_cache=geocode_cache,
+            offline_geocoder=offline_geocoder,
+            online_geocoding=online_geocoding,
+            ignore=ignore,
+            max_depth=max_depth,
+            geocoder=geocoder,
+            thumbnails=thumbnails,
+            reuse=reuse,
+        )
+    )
 
 
-__all__ = ["scan_folder", "find_images"]
+__all__ = [
+    "scan_folder",
+    "iter_scan",
+    "iter_scan_metadata",
+    "find_images",
+    "file_signature",
+]
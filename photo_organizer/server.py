@@ -0,0 +1,188 @@
+"""Line-delimited JSON-RPC 2.0 server used as the desktop UI backend."""
+
+from __future__ import annotations
+
+import inspect
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, redirect_stdout
+from typing import Any, Callable, Dict, IO, Iterable, List
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RpcError(Exception):
+    """An error returned to the client with a JSON-RPC error *code*."""
+
+    def __init__(self, code: int, message: str, data: Any = None) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+def _error(request_id: Any, exc: RpcError) -> Dict[str, Any]:
+    error: Dict[str, Any] = {"code": exc.code, "message": exc.message}
+    if exc.data is not None:
+        error["data"] = exc.data
+    return {"jsonrpc": "2.0", "id": request_id, "error": error}
+
+
+class RpcServer:
+    """Dispatch JSON-RPC requests to Python callables.
+
+    Requests are read one per line and answered one per line, so the
+    process can stay alive for the whole UI session and keep models and
+    database connections warm. Methods named in *background* run on
+    worker threads, one per method, so long scans or thumbnail decodes
+    do not hold up quick calls such as face labels, nor each other;
+    calls of the same method still run one at a time. Their responses
+    may arrive out of order and are matched to requests by ``id``.
+    ``ValueError`` raised by a method is reported as invalid params,
+    anything else as a server error.
+    """
+
+    def __init__(
+        self,
+        methods: Dict[str, Callable[..., Any]],
+        background: Iterable[str] = (),
+    ) -> None:
+        self.methods = dict(methods)
+        self.methods.setdefault("ping", lambda: "pong")
+        self.methods.setdefault("shutdown", self.shutdown)
+        self.background = set(background)
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._out: IO[str] | None = None
+
+    def shutdown(self) -> None:
+        """Stop serving once the current request has been answered."""
+        self._stopping = True
+
+    def notify(self, method: str, params: Any = None) -> None:
+        """Send a notification to the client; a no-op when not serving."""
+        if self._out is not None:
+            message = {"jsonrpc": "2.0", "method": method, "params": params}
+            self._send(self._out, message)
+
+    def _call(self, method: str, params: Any) -> Any:
+        fn = self.methods.get(method)
+        if fn is None:
+            raise RpcError(METHOD_NOT_FOUND, f"method not found: {method}")
+        if params is None:
+            args, kwargs = [], {}
+        elif isinstance(params, list):
+            args, kwargs = params, {}
+        elif isinstance(params, dict):
+            args, kwargs = [], params
+        else:
+            raise RpcError(INVALID_PARAMS, "params must be an array or object")
+        try:
+            inspect.signature(fn).bind(*args, **kwargs)
+        except TypeError as exc:
+            raise RpcError(INVALID_PARAMS, str(exc)) from None
+        try:
+            return fn(*args, **kwargs)
+        except RpcError:
+            raise
+        except ValueError as exc:
+            raise RpcError(INVALID_PARAMS, str(exc)) from None
+        except Exception as exc:
+            raise RpcError(
+                SERVER_ERROR, str(exc), {"type": type(exc).__name__}
+            ) from None
+
+    def handle(self, request: Any) -> Dict[str, Any] | None:
+        """Answer one decoded *request*; ``None`` for notifications."""
+        if not isinstance(request, dict) or not isinstance(
+            request.get("method"), str
+        ):
+            return _error(
+                None, RpcError(INVALID_REQUEST, "invalid request")
+            )
+        request_id = request.get("id")
+        try:
+            result = self._call(request["method"], request.get("params"))
+        except RpcError as exc:
+            response = _error(request_id, exc)
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        return response if "id" in request else None
+
+    def handle_line(self, line: str) -> Any:
+        """Answer one line of input, which may hold a batch of requests."""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return _error(None, RpcError(PARSE_ERROR, "parse error"))
+        if isinstance(request, list):
+            responses: List[Dict[str, Any]] = []
+            for item in request:
+                response = self.handle(item)
+                if response is not None:
+                    responses.append(response)
+            return responses or None
+        return self.handle(request)
+
+    def _send(self, out: IO[str], response: Any) -> None:
+        if response is None:
+            return
+        text = json.dumps(response, default=str)
+        with self._lock:
+            out.write(text + "\n")
+            out.flush()
+
+    def serve(
+        self, stdin: IO[str] | None = None, stdout: IO[str] | None = None
+    ) -> int:
+        """Answer requests from *stdin* until EOF or ``shutdown``.
+
+        While serving, anything the methods print goes to stderr so it
+        cannot corrupt the response stream, and :meth:`notify` writes to
+        *stdout*.
+        """
+        stdin = stdin or sys.stdin
+        out = self._out = stdout or sys.stdout
+        # The pools are shut down first, so background output is diverted
+        # until the last background method has returned.
+        with redirect_stdout(sys.stderr), ExitStack() as stack:
+            pools = {
+                name: stack.enter_context(ThreadPoolExecutor(max_workers=1))
+                for name in self.background
+            }
+            for line in stdin:
+                if not line.strip():
+                    continue
+                try:
+                    method = json.loads(line).get("method")
+                except (ValueError, AttributeError):
+                    method = None
+                if method in pools:
+                    pools[method].submit(
+                        lambda line=line: self._send(
+                            out, self.handle_line(line)
+                        )
+                    )
+                    continue
+                self._send(out, self.handle_line(line))
+                if self._stopping:
+                    break
+        self._out = None
+        return 0
+
+
+__all__ = [
+    "INVALID_PARAMS",
+    "INVALID_REQUEST",
+    "METHOD_NOT_FOUND",
+    "PARSE_ERROR",
+    "SERVER_ERROR",
+    "RpcError",
+    "RpcServer",
+]
@@ -0,0 +1,245 @@
+"""Lightweight per-stage instrumentation for the scan pipeline."""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+
+
+def _new_histogram() -> Dict[str, Any]:
+    return {
+        "count": 0,
+        "sum": 0.0,
+        "max": 0.0,
+        "buckets": [0] * (len(BUCKETS) + 1),
+    }
+
+
+class Stats:
+    """Thread-safe registry of stage latencies, counters and errors.
+
+    Latencies are kept as fixed-bucket histograms, so recording costs a
+    few dictionary updates and snapshots from worker processes can be
+    merged by adding them up. The last *max_errors* per-file errors are
+    kept with their path and message.
+    """
+
+    def __init__(self, max_errors: int = 100) -> None:
+        self.max_errors = max_errors
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.started = time.time()
+            self.timings: Dict[str, Dict[str, Any]] = {}
+            self.counters: Dict[str, int] = {}
+            self.errors: Dict[str, int] = {}
+            self.error_log: deque = deque(maxlen=self.max_errors)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record one call of *stage* that took *seconds*."""
+        bucket = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            hist = self.timings.get(stage)
+            if hist is None:
+                hist = self.timings[stage] = _new_histogram()
+            hist["count"] += 1
+            hist["sum"] += seconds
+            hist["max"] = max(hist["max"], seconds)
+            hist["buckets"][bucket] += 1
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Time the body of a ``with`` block as one call of *stage*."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Add *n* to the counter *name*."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def error(self, stage: str, path: str, exc: BaseException) -> None:
+        """Record that *stage* failed for the file at *path*."""
+        with self._lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+            self.error_log.append(
+                {
+                    "stage": stage,
+                    "path": path,
+                    "error": f"{type(exc).__name__}: {exc}",
+                }
+            )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return everything recorded so far as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                "elapsed": time.time() - self.started,
+                "timings": {
+                    stage: dict(hist, buckets=list(hist["buckets"]))
+                    for stage, hist in self.timings.items()
+                },
+                "counters": dict(self.counters),
+                "errors": dict(self.errors),
+                "error_log": list(self.error_log),
+            }
+
+    def drain(self) -> Dict[str, Any]:
+        """Return a :meth:`snapshot` and reset the registry."""
+        snap = self.snapshot()
+        self.reset()
+        return snap
+
+    def merge(self, snap: Dict[str, Any]) -> None:
+        """Add a :meth:`snapshot` taken elsewhere, e.g. in a worker."""
+        with self._lock:
+            for stage, other in snap.get("timings", {}).items():
+                hist = self.timings.get(stage)
+                if hist is None:
+                    hist = self.timings[stage] = _new_histogram()
+                hist["count"] += other["count"]
+                hist["sum"] += other["sum"]
+                hist["max"] = max(hist["max"], other["max"])
+                for i, n in enumerate(other["buckets"]):
+                    hist["buckets"][i] += n
+            for name, n in snap.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            for stage, n in snap.get("errors", {}).items():
+                self.errors[stage] = self.errors.get(stage, 0) + n
+            self.error_log.extend(snap.get("error_log", []))
+
+    def summary(self) -> str:
+        """Return a human-readable table of the recorded statistics."""
+        snap = self.snapshot()
+        lines = [
+            f"{'stage':<20}{'calls':>8}{'total s':>10}"
+            f"{'mean ms':>10}{'max ms':>10}{'errors':>8}"
+        ]
+        stages = sorted(
+            snap["timings"].items(), key=lambda item: -item[1]["sum"]
+        )
+        for stage, hist in stages:
+            mean = hist["sum"] / hist["count"] if hist["count"] else 0.0
+            lines.append(
+                f"{stage:<20}{hist['count']:>8}{hist['sum']:>10.3f}"
+                f"{mean * 1000:>10.2f}{hist['max'] * 1000:>10.2f}"
+                f"{snap['errors'].get(stage, 0):>8}"
+            )
+        for stage, n in sorted(snap["errors"].items()):
+            if stage not in snap["timings"]:
+                lines.append(f"{stage:<20}{'':>38}{n:>8}")
+        for name, n in sorted(snap["counters"].items()):
+            lines.append(f"{name:<20}{n:>8}")
+        for err in snap["error_log"][-10:]:
+            lines.append(
+                f"error in {err['stage']}: {err['path']}: {err['error']}"
+            )
+        lines.append(f"elapsed {snap['elapsed']:.1f}s")
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix: str = "photo_organizer") -> str:
+        """Return the statistics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines: List[str] = [
+            f"# HELP {prefix}_stage_seconds Time spent per pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for stage, hist in sorted(snap["timings"].items()):
+            label = _label(stage)
+            total = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), hist["buckets"]):
+                total += n
+                lines.append(
+                    f'{prefix}_stage_seconds_bucket{{stage="{label}",'
+                    f'le="{bound}"}} {total}'
+                )
+            lines.append(
+                f'{prefix}_stage_seconds_sum{{stage="{label}"}} '
+                f"{hist['sum']}"
+            )
+            lines.append(
+                f'{prefix}_stage_seconds_count{{stage="{label}"}} '
+                f"{hist['count']}"
+            )
+        lines += [
+            f"# HELP {prefix}_events_total Pipeline event counters.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, n in sorted(snap["counters"].items()):
+            lines.append(f'{prefix}_events_total{{name="{_label(name)}"}} {n}')
+        lines += [
+            f"# HELP {prefix}_errors_total Files that failed per stage.",
+            f"# TYPE {prefix}_errors_total counter",
+        ]
+        for stage, n in sorted(snap["errors"].items()):
+            lines.append(
+                f'{prefix}_errors_total{{stage="{_label(stage)}"}} {n}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, fmt: str | None = None) -> None:
+        """Write the statistics to *path* atomically.
+
+        *fmt* is ``"json"`` or ``"prometheus"``; by default files ending
+        in ``.prom`` get the Prometheus text format and everything else
+        JSON.
+        """
+        if fmt is None:
+            fmt = "prometheus" if path.endswith(".prom") else "json"
+        if fmt == "prometheus":
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2) + "\n"
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        os.replace(tmp, path)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+# Registry used by the instrumented functions of this package. Worker
+# processes have their own copy, which the scan merges back.
+STATS = Stats()
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """Decorate a function so every call is recorded as *stage*."""
+
+    def decorate(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STATS.observe(stage, time.perf_counter() - start)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+__all__ = ["BUCKETS", "STATS", "Stats", "timed"]
@@ -0,0 +1,189 @@
+"""Content-addressed on-disk thumbnail cache."""
+
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterable, List, Tuple
+
+from PIL import Image
+
+from .stats import STATS, timed
+from .walk import IGNORE_FILE
+
+# Longest side, in pixels, of every thumbnail written per photo.
+THUMBNAIL_SIZES = (256, 1024)
+
+# EXIF orientation values and the transpose that displays them upright.
+_ORIENTATION = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def thumbnail_dir(db_path: str) -> str:
+    """Return the thumbnail cache directory stored next to *db_path*."""
+    return f"{db_path}.thumbs"
+
+
+def orientation(img: Image.Image) -> int:
+    """Return the EXIF orientation of *img*, ``1`` when it has none."""
+    try:
+        return int(img.getexif().get(0x0112, 1))
+    except Exception:
+        return 1
+
+
+def upright(img: Image.Image, orient: int) -> Image.Image:
+    """Return *img* turned as EXIF orientation *orient* asks for display."""
+    if orient in _ORIENTATION:
+        return img.transpose(_ORIENTATION[orient])
+    return img
+
+
+class ThumbnailCache:
+    """JPEG thumbnails in *root*, named after the content of the photo.
+
+    A photo's thumbnails are stored as ``<key[:2]>/<key>_<size>.jpg``
+    where *key* is the SHA-256 of the file (see
+    :func:`photo_organizer.duplicates.file_digest`), so identical files
+    share thumbnails, a moved file keeps them and an edited one never
+    shows those of its old content. *root* gets an ignore file
+    so scans never pick the thumbnails up as photos, even when the cache
+    lives inside a scanned folder. A file's mtime records when
+    it was last written or served; :meth:`evict` removes the least
+    recently used files until the cache holds at most *max_bytes*.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 1 << 30,
+        sizes: Iterable[int] = THUMBNAIL_SIZES,
+        quality: int = 85,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.sizes = tuple(sorted(sizes))
+        self.quality = quality
+
+    def path(self, key: str, size: int) -> str:
+        """Return where the *size* thumbnail of *key* is stored."""
+        return os.path.join(self.root, key[:2], f"{key}_{size}.jpg")
+
+    def paths(self, key: str) -> Dict[str, str]:
+        """Return the thumbnail paths of *key* keyed by size."""
+        return {str(size): self.path(key, size) for size in self.sizes}
+
+    @timed("thumbnail")
+    def write(
+        self, key: str, rgb: Image.Image, orient: int = 1
+    ) -> Dict[str, str]:
+        """Store thumbnails of the decoded *rgb* image under *key*.
+
+        *rgb* may already be reduced, e.g. the shared decode of the scan;
+        sizes larger than it are stored at its resolution. *orient* is
+        the EXIF orientation, applied so thumbnails display upright.
+        Existing thumbnails are only marked as used. Returns
+        :meth:`paths`.
+        """
+        paths = self.paths(key)
+        if all(os.path.exists(p) for p in paths.values()):
+            self.touch(paths.values())
+            STATS.count("thumbnails_reused")
+            return paths
+        self._prepare(os.path.dirname(self.path(key, 0)))
+        # Largest first, so every size is reduced from the previous one.
+        image = upright(rgb, orient)
+        for size in reversed(self.sizes):
+            if max(image.size) > size:
+                image = image.copy()
+                image.thumbnail((size, size))
+            target = paths[str(size)]
+            tmp = f"{target}.{os.getpid()}.tmp"
+            image.save(tmp, "JPEG", quality=self.quality)
+            os.replace(tmp, target)
+        STATS.count("thumbnails_written")
+        return paths
+
+    def _prepare(self, folder: str) -> None:
+        os.makedirs(folder, exist_ok=True)
+        ignore = os.path.join(self.root, IGNORE_FILE)
+        if not os.path.exists(ignore):
+            with open(ignore, "w", encoding="utf-8") as fh:
+                fh.write("*\n")
+
+    def create(self, source: str, key: str) -> Dict[str, str]:
+        """Decode the image at *source* and store its thumbnails."""
+        with Image.open(source) as img:
+            orient = orientation(img)
+            side = self.sizes[-1]
+            if max(img.size) > side:
+                # JPEG draft mode decodes directly at a reduced scale.
+                scale = side / max(img.size)
+                img.draft(
+                    "RGB",
+                    (round(img.size[0] * scale), round(img.size[1] * scale)),
+                )
+            rgb = img.convert("RGB")
+        return self.write(key, rgb, orient)
+
+    def touch(self, paths: Iterable[str]) -> None:
+        """Mark the thumbnails at *paths* as recently used."""
+        for path in paths:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def _files(self) -> List[Tuple[float, int, str]]:
+        files = []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name == IGNORE_FILE and folder == self.root:
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def size(self) -> int:
+        """Return the number of bytes stored in the cache."""
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self) -> int:
+        """Delete least recently used files beyond *max_bytes*.
+
+        Returns the number of files removed.
+        """
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            STATS.count("thumbnails_evicted", removed)
+        return removed
+
+
+__all__ = [
+    "THUMBNAIL_SIZES",
+    "ThumbnailCache",
+    "orientation",
+    "thumbnail_dir",
+    "upright",
+]
@@ -0,0 +1,147 @@
+"""Parallel directory traversal with ``.photoignore`` support."""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatchcase
+from typing import Iterable, Iterator, List, Set, Tuple
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+IGNORE_FILE = ".photoignore"
+
+# ``(base_dir, pattern, dir_only, anchored)``; anchored patterns match
+# the path relative to *base_dir*, the others match the entry name.
+_Rule = Tuple[str, str, bool, bool]
+
+
+def normalize_extensions(extensions: Iterable[str] | None) -> Set[str]:
+    """Return *extensions* lower-cased and prefixed with a dot."""
+    if extensions is None:
+        return set(IMAGE_EXTENSIONS)
+    return {
+        e.lower() if e.startswith(".") else f".{e.lower()}"
+        for e in extensions
+    }
+
+
+def parse_ignore(lines: Iterable[str], base: str) -> List[_Rule]:
+    """Parse ``.photoignore`` *lines* into rules relative to *base*.
+
+    Blank lines and lines starting with ``#`` are skipped. A trailing
+    ``/`` restricts a pattern to directories and a leading ``/`` anchors
+    it to *base*. Patterns use :mod:`fnmatch` syntax.
+    """
+    rules: List[_Rule] = []
+    for line in lines:
+        pattern = line.strip()
+        if not pattern or pattern.startswith("#"):
+            continue
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        rules.append((base, pattern.lstrip("/"), dir_only, anchored))
+    return rules
+
+
+def _read_ignore(folder: str) -> List[_Rule]:
+    try:
+        with open(os.path.join(folder, IGNORE_FILE), encoding="utf-8") as fh:
+            return parse_ignore(fh, folder)
+    except OSError:
+        return []
+
+
+def _ignored(path: str, name: str, is_dir: bool, rules: List[_Rule]) -> bool:
+    for base, pattern, dir_only, anchored in rules:
+        if dir_only and not is_dir:
+            continue
+        if anchored:
+            rel = os.path.relpath(path, base).replace(os.sep, "/")
+            if fnmatchcase(rel, pattern):
+                return True
+        elif fnmatchcase(name, pattern):
+            return True
+    return False
+
+
+def _list_dir(
+    folder: str, depth: int, rules: List[_Rule], extensions: Set[str]
+) -> Tuple[List[Tuple[str, os.stat_result]], List[Tuple[str, int, list]]]:
+    """Return the matching files and the subdirectories of *folder*."""
+    rules = rules + _read_ignore(folder)
+    files: List[Tuple[str, os.stat_result]] = []
+    subdirs: List[Tuple[str, int, list]] = []
+    try:
+        with os.scandir(folder) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return files, subdirs
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if not _ignored(entry.path, entry.name, True, rules):
+                    subdirs.append((entry.path, depth + 1, rules))
+                continue
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext not in extensions or not entry.is_file():
+                continue
+            if not _ignored(entry.path, entry.name, False, rules):
+                files.append((entry.path, entry.stat()))
+        except OSError:
+            continue
+    return files, subdirs
+
+
+def walk_images(
+    folder: str,
+    extensions: Iterable[str] | None = None,
+    ignore: Iterable[str] | None = None,
+    max_depth: int | None = None,
+    threads: int = 8,
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield ``(path, stat)`` for every image below *folder*.
+
+    Directories are listed with :func:`os.scandir` on a pool of
+    *threads* threads and paths are yielded as soon as their directory
+    has been read, so scanning can start before the walk finishes.
+    Files within a directory are yielded in name order; directories
+    complete in no particular order. The ``stat`` result comes from the
+    directory entry and can be passed to
+    :func:`photo_organizer.scan.file_signature`.
+
+    *ignore* holds extra ``.photoignore`` patterns applied at *folder*;
+    a ``.photoignore`` file in any directory adds patterns for that
+    directory and everything below it. With *max_depth* set, only
+    directories at most that many levels below *folder* are read
+    (``0`` lists *folder* alone).
+    """
+    exts = normalize_extensions(extensions)
+    rules = parse_ignore(ignore or (), folder)
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        pending = {pool.submit(_list_dir, folder, 0, rules, exts)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    for path, depth, sub_rules in subdirs:
+                        if max_depth is None or depth <= max_depth:
+                            pending.add(
+                                pool.submit(
+                                    _list_dir, path, depth, sub_rules, exts
+                                )
+                            )
+                    yield from files
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+__all__ = [
+    "IGNORE_FILE",
+    "IMAGE_EXTENSIONS",
+    "normalize_extensions",
+    "parse_ignore",
+    "walk_images",
+]
@@ -0,0 +1,45 @@
+import json
+
+from benchmarks import bench_db, bench_duplicates
+from benchmarks.bench_scan import STAGES, main
+from benchmarks.corpus import make_corpus
+from photo_organizer.scan import iter_scan_metadata
+
+
+def test_corpus_has_exif_and_gps(tmp_path):
+    paths = make_corpus(str(tmp_path), 3, size=(64, 48), seed=1)
+    assert len(paths) == 3
+    meta = list(
+        iter_scan_metadata(str(tmp_path), threads=1, online_geocoding=False)
+    )
+    assert all(e["exif"]["timestamp"] for e in meta)
+    assert all("gps" in e["exif"] for e in meta)
+    assert make_corpus(str(tmp_path), 3, size=(64, 48), seed=1) == paths
+
+
+def test_bench_scan_writes_json_report(tmp_path, capsys):
+    out = tmp_path / "bench.json"
+    args = ["--images", "3", "--size", "96x64", "--output", str(out)]
+    assert main(args) == 0
+    report = json.loads(out.read_text())
+    assert list(report["stages"]) == STAGES
+    assert report["stages"]["decode"]["items"] == 3
+    assert report["end_to_end"]["items"] == 3
+    assert "process_peak_rss_mb" in report
+    assert "peak_rss_mb" not in report["stages"]["decode"]
+
+
+def test_bench_db_keeps_ids_on_rescan(tmp_path, capsys):
+    out = tmp_path / "bench_db.json"
+    assert bench_db.main(["--rows", "50", "--output", str(out)]) == 0
+    report = json.loads(out.read_text())
+    assert report["insert"]["rows"] == report["read"]["rows"] == 50
+    assert report["max_photo_id"] == 50
+
+
+def test_bench_duplicates_finds_planted_copies(tmp_path, capsys):
+    out = tmp_path / "dup.json"
+    args = ["--hashes", "2000", "--copies", "50", "--output", str(out)]
+    assert bench_duplicates.main(args) == 0
+    report = json.loads(out.read_text())
+    assert report["planted_found"] == 50
@@ -1,4 +1,5 @@
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageDraw
 from photo_organizer import classifier
 
 ALLOWED = {"selfie", "document", "screenshot", "nature", "other"}
@@ -66,3 +67,125 @@ def test_classify_image_stubbed_selfie(monkeypatch):
     cat = classifier.classify_image(img)
     assert cat == "selfie"
     assert cat in ALLOWED
+
+
+def test_classify_images_batches(monkeypatch):
+    calls = []
+
+    class DummyBatch:
+
+        def __init__(self, items):
+            self.items = items
+
+    class DummyLogits:
+
+        def __init__(self, n):
+            self.n = n
+
+        def argmax(self, dim):
+            class Res:
+
+                def __init__(self, n):
+                    self.n = n
+
+                def tolist(self):
+                    return [0] * self.n
+
+            return Res(self.n)
+
+    class DummyCtx:
+
+        def __enter__(self):
+            pass
+
+        def __exit__(self, exc_type, exc, tb):
+            pass
+
+    class DummyTorch:
+
+        def no_grad(self):
+            return DummyCtx()
+
+        def stack(self, items):
+            return DummyBatch(items)
+
+    def forward(batch):
+        calls.append(len(batch.items))
+        return DummyLogits(len(batch.items))
+
+    class DummyWeights:
+
+        DEFAULT = type("DW", (), {"meta": {"categories": ["binder"]}})
+
+    monkeypatch.setattr(classifier, "_classifier", forward)
+    monkeypatch.setattr(classifier, "_transform", lambda img: img)
+    monkeypatch.setattr(classifier, "transforms", object(), raising=False)
+    monkeypatch.setattr(classifier, "torch", DummyTorch(), raising=False)
+    monkeypatch.setattr(
+        classifier, "MobileNet_V2_Weights", DummyWeights, raising=False
+    )
+    imgs = [Image.new("RGB", (5, 5)) for _ in range(5)]
+    cats = classifier.classify_images(imgs, batch_size=2)
+    assert cats == ["document"] * 5
+    assert calls == [2, 2, 1]
+
+
+def test_classify_images_fallback(monkeypatch):
+    monkeypatch.setattr(classifier, "_classifier", None)
+    monkeypatch.setattr(classifier, "load_classifier", lambda: None)
+    imgs = [
+        Image.new("RGB", (10, 10), (0, 255, 0)),
+        Image.new("RGB", (10, 10), (255, 0, 0)),
+    ]
+    assert classifier.classify_images(imgs) == ["nature", "other"]
+
+
+def _document():
+    img = Image.new("RGB", (200, 260), (250, 250, 250))
+    draw = ImageDraw.Draw(img)
+    for y in range(20, 240, 12):
+        draw.rectangle([20, y, 180, y + 3], fill=(20, 20, 20))
+    return img
+
+
+def _screenshot():
+    img = Image.new("RGB", (320, 200), (40, 44, 52))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, 320, 24], fill=(0, 120, 215))
+    draw.rectangle([0, 24, 80, 200], fill=(230, 230, 230))
+    for y in range(40, 190, 20):
+        draw.rectangle([100, y, 300, y + 6], fill=(200, 80, 80))
+    return img
+
+
+def _forest():
+    rng = np.random.default_rng(0)
+    arr = rng.normal((60, 140, 50), 25, size=(64, 64, 3))
+    return Image.fromarray(np.clip(arr, 0, 255).astype("uint8"))
+
+
+def test_fallback_heuristic_batch(monkeypatch):
+    monkeypatch.setattr(classifier, "_classifier", None)
+    monkeypatch.setattr(classifier, "load_classifier", lambda: None)
+    imgs = [
+        _document(),
+        _screenshot(),
+        _forest(),
+        Image.new("RGB", (10, 10), (255, 0, 0)),
+    ]
+    assert classifier.classify_images(imgs) == [
+        "document",
+        "screenshot",
+        "nature",
+        "other",
+    ]
+
+
+def test_register_rule(monkeypatch):
+    monkeypatch.setattr(classifier, "_RULES", list(classifier._RULES))
+    monkeypatch.setattr(classifier, "_FEATURES", dict(classifier._FEATURES))
+    classifier.register_feature("dark", lambda t: t.mean(axis=(1, 2, 3)))
+    classifier.register_rule("selfie", lambda f: f["dark"] < 0.05)
+    thumbs = np.zeros((2, 8, 8, 3), dtype=np.float32)
+    thumbs[1] = 1.0
+    assert classifier.classify_thumbnails(thumbs) == ["selfie", "other"]
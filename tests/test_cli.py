@@ -1,7 +1,10 @@
+import os
+import io
 from PIL import Image
 import json
 from cli import main
-from photo_organizer.db import init_db
+from photo_organizer import scan
+from photo_organizer.db import init_db, get_metadata, insert_metadata
 
 ALLOWED = {"selfie", "document", "screenshot", "nature", "other"}
 
@@ -14,9 +17,7 @@ def test_cli_main(tmp_path):
     ret = main([str(tmp_path), "--db", str(db_path)])
     assert ret == 0
     conn = init_db(str(db_path))
-    row = conn.execute("SELECT metadata FROM photos").fetchone()
-    assert row is not None
-    meta = json.loads(row[0])
+    meta = get_metadata(conn, [str(img_path)])[0]
     assert meta["faces"]
     assert "cluster_id" in meta["faces"][0]
     assert "category" in meta
@@ -53,7 +54,7 @@ def test_cli_group_by(monkeypatch, tmp_path, capsys):
         "photo_organizer.scan._extract_exif", lambda img: {"gps": "0,0"}
     )
     monkeypatch.setattr(
-        "photo_organizer.scan.resolve_location",
+        "photo_organizer.location._network_lookup",
         lambda lat, lon: {
             "city": "TestCity",
             "state": "TestState",
@@ -79,7 +80,7 @@ def test_cli_group_events(monkeypatch, tmp_path, capsys):
     img1 = tmp_path / "a.jpg"
     img2 = tmp_path / "b.jpg"
     Image.new("RGB", (5, 5)).save(img1)
-    Image.new("RGB", (5, 5)).save(img2)
+    Image.new("RGB", (5, 5), (255, 255, 255)).save(img2)
     db_path = tmp_path / "photo.db"
 
     timestamps = ["2023:01:01 10:00:00", "2023:01:02 00:00:00"]
@@ -106,6 +107,12 @@ def test_cli_group_events(monkeypatch, tmp_path, capsys):
     event_ids = {json.loads(r[0])["event_id"] for r in rows}
     assert event_ids == {0, 1}
 
+    assert main(["--db", str(db_path), "--set-event-name", "1", "Trip"]) == 0
+    capsys.readouterr()
+    assert main(["--db", str(db_path), "--list-events"]) == 0
+    events = json.loads(capsys.readouterr().out)
+    assert [(e["id"], e["name"]) for e in events] == [(0, None), (1, "Trip")]
+
 
 def test_cli_face_label(tmp_path, capsys):
     db_path = tmp_path / "photo.db"
@@ -120,3 +127,264 @@ def test_cli_face_label(tmp_path, capsys):
     out = capsys.readouterr().out
     info = json.loads([l for l in out.splitlines() if l.startswith("{")][0])
     assert info == {"cluster_id": 3, "name": "Alice"}
+
+
+def test_cli_incremental_rescan(monkeypatch, tmp_path):
+    a = tmp_path / "a.jpg"
+    b = tmp_path / "b.jpg"
+    Image.new("RGB", (5, 5)).save(a)
+    Image.new("RGB", (5, 5)).save(b)
+    db_path = tmp_path / "photo.db"
+    assert main([str(tmp_path), "--db", str(db_path), "--incremental"]) == 0
+
+    scanned = []
+    real_scan_file = scan._scan_file
+
+    def spy(path, embedder, key=None, ctx=None):
+        scanned.append(path)
+        return real_scan_file(path, embedder, key, ctx)
+
+    monkeypatch.setattr(scan, "_scan_file", spy)
+    b.unlink()
+    assert main([str(tmp_path), "--db", str(db_path), "--incremental"]) == 0
+    assert scanned == []
+
+    conn = init_db(str(db_path))
+    rows = conn.execute("SELECT path FROM photos").fetchall()
+    assert [r[0] for r in rows] == [str(a)]
+    assert "cluster_id" in get_metadata(conn, [str(a)])[0]["faces"][0]
+
+
+def test_cli_workers(tmp_path, capsys):
+    for name in ["a.jpg", "b.jpg", "c.jpg"]:
+        Image.new("RGB", (5, 5)).save(tmp_path / name)
+    db_path = tmp_path / "photo.db"
+    ret = main([str(tmp_path), "--db", str(db_path), "--workers", "2"])
+    assert ret == 0
+    out = capsys.readouterr().out
+    data = json.loads(
+        [line for line in out.splitlines() if line.startswith("[")][0]
+    )
+    assert len(data) == 3
+
+
+def test_cli_metadata_only_keeps_faces(monkeypatch, tmp_path):
+    img = tmp_path / "a.jpg"
+    Image.new("RGB", (5, 5)).save(img)
+    db_path = tmp_path / "photo.db"
+    assert main([str(tmp_path), "--db", str(db_path)]) == 0
+
+    def fail(*args, **kwargs):
+        raise AssertionError("full scan ran")
+
+    monkeypatch.setattr(scan, "_scan_file", fail)
+    ret = main([str(tmp_path), "--db", str(db_path), "--metadata-only"])
+    assert ret == 0
+    conn = init_db(str(db_path))
+    entry = get_metadata(conn, [str(img)])[0]
+    assert len(entry["faces"]) == 1
+    assert "category" in entry
+
+
+def test_cli_query(tmp_path, capsys):
+    db_path = str(tmp_path / "photo.db")
+    conn = init_db(db_path)
+    insert_metadata(
+        conn,
+        [
+            {"path": "/x/a.jpg", "exif": {}, "category": "document"},
+            {"path": "/x/b.jpg", "exif": {}, "category": "nature"},
+            {"path": "/x/c.jpg", "exif": {}, "category": "selfie"},
+        ],
+    )
+    args = ["--db", db_path, "--query", "--order-by", "path"]
+    ret = main(
+        args + ["--filter", "category=document", "--filter", "category=selfie"]
+    )
+    assert ret == 0
+    data = json.loads(capsys.readouterr().out)
+    assert [e["path"] for e in data] == ["/x/a.jpg", "/x/c.jpg"]
+
+
+def test_cli_search(tmp_path, capsys):
+    db_path = str(tmp_path / "photo.db")
+    conn = init_db(db_path)
+    insert_metadata(
+        conn,
+        [
+            {"path": "/x/a.jpg", "ocr_text": "electricity invoice"},
+            {"path": "/x/b.jpg", "ocr_text": "holiday postcard"},
+        ],
+    )
+    assert main(["--db", db_path, "--search", "invoice"]) == 0
+    data = json.loads(capsys.readouterr().out)
+    assert [e["path"] for e in data] == ["/x/a.jpg"]
+    assert data[0]["snippet"] == "electricity [invoice]"
+
+
+def test_cli_find_duplicates_and_reuse(monkeypatch, tmp_path, capsys):
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    img = Image.effect_mandelbrot((256, 256), (-2, -1.5, 1, 1.5), 100)
+    img = img.convert("RGB")
+    img.save(photos / "a.jpg")
+    (photos / "b.jpg").write_bytes((photos / "a.jpg").read_bytes())
+    img.resize((128, 128)).save(photos / "c.jpg")
+    img.transpose(Image.Transpose.ROTATE_90).save(photos / "d.jpg")
+    db_path = str(tmp_path / "photo.db")
+    assert main([str(photos), "--db", db_path]) == 0
+
+    decoded = []
+    real_scan_file = scan._scan_file
+
+    def spy(path, embedder, key=None, ctx=None):
+        decoded.append(path)
+        return real_scan_file(path, embedder, key, ctx)
+
+    monkeypatch.setattr(scan, "_scan_file", spy)
+    assert main([str(photos), "--db", db_path]) == 0
+    # A file never reuses its own row; a.jpg and b.jpg reuse each other.
+    assert sorted(os.path.basename(p) for p in decoded) == ["c.jpg", "d.jpg"]
+    decoded.clear()
+    assert main([str(photos), "--db", db_path, "--no-reuse"]) == 0
+    # Only stored results are ignored; b.jpg still copies a.jpg.
+    assert sorted(os.path.basename(p) for p in decoded) == [
+        "a.jpg",
+        "c.jpg",
+        "d.jpg",
+    ]
+    capsys.readouterr()
+
+    assert main(["--db", db_path, "--find-duplicates"]) == 0
+    groups = json.loads(capsys.readouterr().out)
+    names = [[os.path.basename(p) for p in g["paths"]] for g in groups]
+    assert names == [["a.jpg", "b.jpg", "c.jpg"]]
+    assert groups[0]["exact"] is False
+
+
+def test_cli_serve_answers_json_rpc(monkeypatch, tmp_path, capsys):
+    Image.new("RGB", (5, 5)).save(tmp_path / "img.jpg")
+    db_path = str(tmp_path / "photo.db")
+    requests = [
+        {"id": 1, "method": "set_face_label", "params": [3, "Ann"]},
+        {"id": 2, "method": "get_face_label", "params": {"cluster_id": 3}},
+        {"id": 3, "method": "scan", "params": {"folder": str(tmp_path)}},
+        {"id": 4, "method": "scan", "params": [str(tmp_path), None, 1, 2, 3]},
+        {"id": 5, "method": "scan", "params": {"folder": "x", "bogus": 1}},
+    ]
+    stdin = "\n".join(json.dumps(dict(r, jsonrpc="2.0")) for r in requests)
+    monkeypatch.setattr("sys.stdin", io.StringIO(stdin + "\n"))
+    assert main(["--serve", "--db", db_path, "--offline"]) == 0
+    out = capsys.readouterr().out
+    replies = {r["id"]: r for r in map(json.loads, out.splitlines())}
+    assert replies[1]["result"] == {"cluster_id": 3, "name": "Ann"}
+    assert replies[2]["result"] == {"cluster_id": 3, "name": "Ann"}
+    assert replies[3]["result"][0]["path"].endswith("img.jpg")
+    assert replies[4]["error"]["code"] == -32602
+    assert "unknown scan option: bogus" in replies[5]["error"]["message"]
+
+
+def test_cli_serve_recreates_evicted_thumbnails(monkeypatch, tmp_path, capsys):
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    Image.new("RGB", (40, 20)).save(photos / "img.jpg")
+    db_path = str(tmp_path / "photo.db")
+    assert main([str(photos), "--db", db_path, "--offline"]) == 0
+    entry = get_metadata(init_db(db_path), [str(photos / "img.jpg")])[0]
+    thumb = entry["thumbnails"]["256"]
+    assert thumb.startswith(db_path + ".thumbs")
+    os.remove(thumb)
+
+    request = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "thumbnails",
+        "params": {"paths": [str(photos / "img.jpg"), "missing.jpg"]},
+    }
+    monkeypatch.setattr("sys.stdin", io.StringIO(json.dumps(request) + "\n"))
+    capsys.readouterr()
+    assert main(["--serve", "--db", db_path]) == 0
+    reply = json.loads(capsys.readouterr().out)
+    assert reply["result"] == {
+        str(photos / "img.jpg"): thumb,
+        "missing.jpg": None,
+    }
+    assert os.path.exists(thumb)
+
+
+def _serve(monkeypatch, capsys, args, method, params):
+    request = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+    monkeypatch.setattr("sys.stdin", io.StringIO(json.dumps(request) + "\n"))
+    assert main(["--serve", *args]) == 0
+    return json.loads(capsys.readouterr().out)["result"]
+
+
+def test_cli_serve_lists_photos_by_page(monkeypatch, tmp_path, capsys):
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        Image.new("RGB", (5, 5)).save(tmp_path / name)
+    args = ["--db", str(tmp_path / "photo.db"), "--offline"]
+    params = {"folder": str(tmp_path), "results": False}
+    summary = _serve(monkeypatch, capsys, args, "scan", params)
+    assert summary == {"folder": str(tmp_path), "count": 3, "total": 3}
+
+    params = {"limit": 2, "order_by": "path"}
+    first = _serve(monkeypatch, capsys, args, "list_photos", params)
+    assert first["total"] == 3
+    assert [p["path"][-5:] for p in first["photos"]] == ["a.jpg", "b.jpg"]
+    params["cursor"] = first["cursor"]
+    second = _serve(monkeypatch, capsys, args, "list_photos", params)
+    assert [p["path"][-5:] for p in second["photos"]] == ["c.jpg"]
+    assert second["cursor"] is None
+    assert "total" not in second
+
+
+def test_cli_ndjson_streams_photos_and_progress(tmp_path, capsys):
+    for name in ("a.jpg", "b.jpg"):
+        Image.new("RGB", (5, 5)).save(tmp_path / name)
+    db_path = str(tmp_path / "photo.db")
+    args = [str(tmp_path), "--db", db_path, "--offline", "--format", "ndjson"]
+    assert main(args + ["--progress-interval", "0"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    records = [json.loads(line) for line in lines]
+    kinds = [r["type"] for r in records]
+    assert kinds[0] == "start" and kinds[-1] == "done"
+    assert kinds.count("photo") == 2
+    assert records[-1]["count"] == 2
+    photo = next(r["photo"] for r in records if r["type"] == "photo")
+    assert photo["faces"] and "embedding" not in photo["faces"][0]
+    final = [r for r in records if r["type"] == "progress"][-1]
+    assert final["done"] == final["total"] == 2
+    assert final["eta"] == 0.0
+
+    # Unchanged files report progress too, though they yield no photo.
+    assert main(args + ["--incremental", "--progress-interval", "0"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    records = [json.loads(line) for line in lines]
+    progress = [r for r in records if r["type"] == "progress"]
+    assert [r["unchanged"] for r in progress] == [1, 2, 2]
+    assert "photo" not in [r["type"] for r in records]
+
+    assert main(["--db", db_path, "--query", "--format", "ndjson"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["path"][-5:] for line in lines] == [
+        "a.jpg",
+        "b.jpg",
+    ]
+
+
+def test_cli_serve_streams_scan_events(monkeypatch, tmp_path, capsys):
+    Image.new("RGB", (5, 5)).save(tmp_path / "a.jpg")
+    request = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "scan",
+        "params": {"folder": str(tmp_path), "results": False, "stream": True},
+    }
+    monkeypatch.setattr("sys.stdin", io.StringIO(json.dumps(request) + "\n"))
+    args = ["--serve", "--db", str(tmp_path / "photo.db"), "--offline"]
+    assert main(args) == 0
+    messages = [json.loads(x) for x in capsys.readouterr().out.splitlines()]
+    events = [m["params"] for m in messages if m.get("method") == "scan_event"]
+    assert [e["type"] for e in events] == ["photo", "progress"]
+    assert events[0]["folder"] == str(tmp_path)
+    assert messages[-1]["result"]["count"] == 1
@@ -1,4 +1,18 @@
-from photo_organizer.cluster import cluster_faces, group_by_face
+from photo_organizer.cluster import (
+    cluster_faces,
+    cluster_stored_faces,
+    find_face_photos,
+    group_by_face,
+    update_face_index,
+)
+from photo_organizer.db import (
+    delete_photos,
+    get_face_label,
+    init_db,
+    insert_metadata,
+    iter_metadata,
+    set_face_label,
+)
 
 
 def test_cluster_faces_assigns_ids():
@@ -50,3 +64,110 @@ def test_group_by_face_groups_entries():
 
 def test_group_by_face_empty():
     assert group_by_face([]) == {}
+
+
+def test_cluster_stored_faces(tmp_path):
+    conn = init_db(str(tmp_path / "photo.db"))
+    insert_metadata(
+        conn,
+        [
+            {"path": "/lib/a.jpg", "faces": [{"embedding": [0.0] * 128}]},
+            {
+                "path": "/lib/b.jpg",
+                "faces": [{"box": [0, 0, 1, 1]}, {"embedding": [0.0] * 128}],
+            },
+            {"path": "/other/c.jpg", "faces": [{"embedding": [0.0] * 128}]},
+        ],
+    )
+    assert cluster_stored_faces(conn, "/lib", eps=1.0, min_samples=1) == 2
+    stored = {e["path"]: e for e in iter_metadata(conn)}
+    assert stored["/lib/a.jpg"]["faces"][0]["cluster_id"] == 0
+    assert "cluster_id" not in stored["/lib/b.jpg"]["faces"][0]
+    assert stored["/lib/b.jpg"]["faces"][1]["cluster_id"] == 0
+    assert "cluster_id" not in stored["/other/c.jpg"]["faces"][0]
+
+
+def test_update_face_index_assigns_only_new_faces(tmp_path):
+    conn = init_db(str(tmp_path / "photo.db"))
+    path = str(tmp_path / "photo.db.faces.npz")
+    insert_metadata(
+        conn,
+        [
+            {"path": "a.jpg", "faces": [{"embedding": [0.0] * 128}]},
+            {"path": "b.jpg", "faces": [{"embedding": [0.01] * 128}]},
+            {"path": "c.jpg", "faces": [{"embedding": [5.0] * 128}]},
+        ],
+    )
+    index = update_face_index(conn, path, eps=1.0, min_samples=1)
+    before = {e["path"]: e["faces"][0] for e in iter_metadata(conn)}
+    assert before["a.jpg"]["cluster_id"] == before["b.jpg"]["cluster_id"]
+
+    insert_metadata(
+        conn,
+        [
+            {"path": "d.jpg", "faces": [{"embedding": [0.02] * 128}]},
+            {"path": "e.jpg", "faces": [{"embedding": [-9.0] * 128}]},
+        ],
+    )
+    index = update_face_index(conn, path, eps=1.0, min_samples=1)
+    after = {e["path"]: e["faces"][0] for e in iter_metadata(conn)}
+    assert after["a.jpg"] == before["a.jpg"]
+    assert after["d.jpg"]["cluster_id"] == before["a.jpg"]["cluster_id"]
+    assert after["e.jpg"]["cluster_id"] not in {
+        before[p]["cluster_id"] for p in before
+    }
+    assert len(index) == 5
+
+    results = find_face_photos(conn, index, before["a.jpg"]["id"])
+    assert [r["path"] for r in results][:1] == ["a.jpg"]
+    assert {r["path"] for r in results} == {"a.jpg", "b.jpg", "d.jpg"}
+
+
+def test_assign_new_faces_clusters_with_stored_noise(tmp_path):
+    conn = init_db(str(tmp_path / "photo.db"))
+    path = str(tmp_path / "photo.db.faces.npz")
+    insert_metadata(
+        conn,
+        [
+            {"path": "a.jpg", "faces": [{"embedding": [0.0] * 128}]},
+            {"path": "c.jpg", "faces": [{"embedding": [5.0] * 128}]},
+        ],
+    )
+    update_face_index(conn, path, eps=1.0, min_samples=2)
+    insert_metadata(
+        conn, [{"path": "b.jpg", "faces": [{"embedding": [0.01] * 128}]}]
+    )
+    index = update_face_index(conn, path, eps=1.0, min_samples=2)
+    faces = {e["path"]: e["faces"][0] for e in iter_metadata(conn)}
+    # Alone in its scan b.jpg would be noise; with a.jpg it is a cluster.
+    assert faces["a.jpg"]["cluster_id"] == faces["b.jpg"]["cluster_id"] >= 0
+    assert faces["c.jpg"]["cluster_id"] == -1
+    assert sorted(index.labels.tolist()) == sorted(
+        f["cluster_id"] for f in faces.values()
+    )
+
+
+def test_new_clusters_do_not_reuse_labelled_ids(tmp_path):
+    conn = init_db(str(tmp_path / "photo.db"))
+    path = str(tmp_path / "photo.db.faces.npz")
+    insert_metadata(
+        conn,
+        [
+            {"path": "a.jpg", "faces": [{"embedding": [0.0] * 128}]},
+            {"path": "c.jpg", "faces": [{"embedding": [5.0] * 128}]},
+        ],
+    )
+    update_face_index(conn, path, eps=1.0, min_samples=1)
+    faces = {e["path"]: e["faces"][0] for e in iter_metadata(conn)}
+    named = faces["c.jpg"]["cluster_id"]
+    assert named == max(f["cluster_id"] for f in faces.values())
+    set_face_label(conn, named, "Ann")
+    delete_photos(conn, ["c.jpg"])
+
+    insert_metadata(
+        conn, [{"path": "e.jpg", "faces": [{"embedding": [-9.0] * 128}]}]
+    )
+    update_face_index(conn, path, eps=1.0, min_samples=1)
+    faces = {e["path"]: e["faces"][0] for e in iter_metadata(conn)}
+    assert faces["e.jpg"]["cluster_id"] > named
+    assert get_face_label(conn, faces["e.jpg"]["cluster_id"]) is None
@@ -1,8 +1,26 @@
 import json
+import sqlite3
+
+import numpy as np
+import pytest
 from PIL import Image
 from photo_organizer.db import (
+    SCHEMA_VERSION,
+    connect,
     init_db,
     insert_metadata,
+    merge_metadata,
+    query_photos,
+    list_photos,
+    count_photos,
+    update_metadata,
+    search_text,
+    get_signatures,
+    get_metadata,
+    iter_metadata,
+    delete_photos,
+    load_embeddings,
+    set_face_clusters,
     set_face_label,
     get_face_label,
 )
@@ -19,12 +37,8 @@ def test_insert_and_retrieve_metadata(tmp_path):
     }
     conn = init_db(str(tmp_path / "photo.db"))
     insert_metadata(conn, [entry])
-    row = conn.execute(
-        "SELECT metadata FROM photos WHERE path=?", (str(img_path),)
-    ).fetchone()
-    assert row is not None
-    meta = json.loads(row[0])
-    assert meta == entry
+    meta = get_metadata(conn, [str(img_path)])
+    assert meta == [entry]
 
 
 def test_init_db_creates_table(tmp_path):
@@ -71,3 +85,355 @@ def test_face_label_set_get(tmp_path):
     set_face_label(conn, 1, "Bob")
     assert get_face_label(conn, 1) == "Bob"
     assert get_face_label(conn, 2) is None
+
+
+def test_signatures_and_delete(tmp_path):
+    conn = init_db(str(tmp_path / "db.sqlite"))
+    folder = str(tmp_path / "photos")
+    entries = [
+        {
+            "path": f"{folder}/a.jpg",
+            "faces": [],
+            "size": 10,
+            "mtime": 1.5,
+            "fingerprint": "abc",
+        },
+        {"path": f"{tmp_path}/other/b.jpg", "size": 5},
+    ]
+    insert_metadata(conn, entries)
+    sigs = get_signatures(conn, folder)
+    assert sigs == {
+        f"{folder}/a.jpg": {"size": 10, "mtime": 1.5, "fingerprint": "abc"}
+    }
+    assert get_metadata(conn, [f"{folder}/a.jpg"]) == [entries[0]]
+    assert delete_photos(conn, [f"{folder}/a.jpg"]) == 1
+    assert get_signatures(conn, folder) == {}
+
+
+def test_insert_metadata_reports_entries_once_committed(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = init_db(db_file)
+    other = init_db(db_file)
+    committed = []
+
+    def on_commit(entries):
+        stored = other.execute("SELECT path FROM photos ORDER BY path")
+        assert [e["path"] for e in entries] == [
+            r[0] for r in stored.fetchall()
+        ][len(committed):]
+        committed.extend(e["path"] for e in entries)
+
+    entries = [{"path": f"{i}.jpg"} for i in range(5)]
+    assert insert_metadata(conn, entries, 2, on_commit) == 5
+    assert committed == [e["path"] for e in entries]
+
+
+def test_insert_metadata_chunked_keeps_committed_rows(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = init_db(db_file)
+
+    def entries():
+        for i in range(3):
+            yield {"path": f"{i}.jpg", "faces": []}
+        raise RuntimeError("crash")
+
+    try:
+        insert_metadata(conn, entries(), chunk_size=2)
+    except RuntimeError:
+        pass
+    other = init_db(db_file)
+    rows = other.execute("SELECT path FROM photos ORDER BY path").fetchall()
+    assert [r[0] for r in rows] == ["0.jpg", "1.jpg", "2.jpg"]
+    assert insert_metadata(conn, [{"path": "3.jpg"}], chunk_size=2) == 1
+    assert [e["path"] for e in iter_metadata(conn)] == [
+        "0.jpg",
+        "1.jpg",
+        "2.jpg",
+        "3.jpg",
+    ]
+
+
+def test_rescan_upserts_rows_and_replaces_faces(tmp_path):
+    conn = init_db(str(tmp_path / "db.sqlite"))
+    face = {"box": [0, 0, 1, 1], "embedding": [0.5] * 128}
+    entries = [{"path": f"{i}.jpg", "faces": [face]} for i in range(3)]
+    insert_metadata(conn, entries)
+    ids = dict(conn.execute("SELECT path, id FROM photos"))
+
+    rescanned = [
+        {"path": "1.jpg", "faces": [face, face], "category": "old"},
+        {"path": "1.jpg", "faces": [face, face], "category": "new"},
+        {"path": "3.jpg", "faces": []},
+    ]
+    assert insert_metadata(conn, rescanned) == 3
+    after = dict(conn.execute("SELECT path, id FROM photos"))
+    assert {p: after[p] for p in ids} == ids
+    meta = get_metadata(conn, ["1.jpg"])[0]
+    assert meta["category"] == "new"
+    assert len(meta["faces"]) == 2
+    assert conn.execute("SELECT COUNT(*) FROM faces").fetchone()[0] == 4
+
+
+def test_connect_allows_readers_during_a_write(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = init_db(db_file)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == (
+        SCHEMA_VERSION
+    )
+    insert_metadata(conn, [{"path": "a.jpg"}])
+
+    reader = connect(db_file, readonly=True)
+    conn.execute("INSERT INTO photos(path, metadata) VALUES ('b.jpg', '{}')")
+    assert [e["path"] for e in iter_metadata(reader)] == ["a.jpg"]
+    conn.commit()
+    assert count_photos(reader) == 2
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("DELETE FROM photos")
+
+
+def test_faces_stored_as_float32_blobs(tmp_path):
+    conn = init_db(str(tmp_path / "db.sqlite"))
+    entry = {
+        "path": "a.jpg",
+        "faces": [
+            {"box": [1, 2, 3, 4], "embedding": [0.5] * 128},
+            {"box": [5, 6, 7, 8], "embedding": [1.0] * 128},
+        ],
+    }
+    other = {"path": "b.jpg", "faces": [entry["faces"][0]]}
+    insert_metadata(conn, [entry, other])
+    blob = conn.execute("SELECT embedding FROM faces").fetchone()[0]
+    assert len(blob) == 128 * 4
+    assert "embedding" not in conn.execute(
+        "SELECT metadata FROM photos"
+    ).fetchone()[0]
+
+    ids, embs = load_embeddings(conn)
+    assert embs.shape == (3, 128)
+    assert embs.dtype == np.float32
+    set_face_clusters(conn, ids, [0, 1, 0])
+    meta = get_metadata(conn, ["a.jpg"])[0]
+    assert meta["faces"] == [
+        {"id": int(ids[0]), "box": [1, 2, 3, 4], "cluster_id": 0},
+        {"id": int(ids[1]), "box": [5, 6, 7, 8], "cluster_id": 1},
+    ]
+
+    insert_metadata(conn, [{"path": "a.jpg", "faces": []}])
+    delete_photos(conn, ["b.jpg"])
+    assert conn.execute("SELECT COUNT(*) FROM faces").fetchone()[0] == 0
+
+
+def test_init_db_migrates_json_faces(tmp_path):
+    db_file = str(tmp_path / "old.db")
+    old = sqlite3.connect(db_file)
+    old.execute(
+        "CREATE TABLE photos (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "path TEXT UNIQUE, metadata TEXT)"
+    )
+    face = {"box": [0, 0, 1, 1], "embedding": [0.25] * 128}
+    meta = {"path": "a.jpg", "faces": [face]}
+    old.execute(
+        "INSERT INTO photos(path, metadata) VALUES (?, ?)",
+        ("a.jpg", json.dumps(meta)),
+    )
+    old.commit()
+    old.close()
+
+    conn = init_db(db_file)
+    ids, embs = load_embeddings(conn)
+    assert embs.shape == (1, 128)
+    assert float(embs[0, 0]) == 0.25
+    faces = get_metadata(conn, ["a.jpg"])[0]["faces"]
+    assert faces == [{"id": int(ids[0]), "box": [0, 0, 1, 1]}]
+    assert count_photos(conn, path="a.jpg") == 1
+
+
+def test_merge_metadata_keeps_scan_results(tmp_path):
+    conn = init_db(str(tmp_path / "photo.db"))
+    entry = {
+        "path": "/p/a.jpg",
+        "exif": {},
+        "faces": [],
+        "category": "nature",
+        "city": "Old",
+        "size": 1,
+        "mtime": 1.0,
+        "fingerprint": "x",
+    }
+    insert_metadata(conn, [entry])
+    count = merge_metadata(
+        conn,
+        [
+            {"path": "/p/a.jpg", "exif": {"camera": "C"}},
+            {"path": "/p/b.jpg", "exif": {}, "city": "New"},
+        ],
+    )
+    assert count == 2
+    a, b = get_metadata(conn, ["/p/a.jpg", "/p/b.jpg"])
+    assert a["category"] == "nature"
+    assert a["exif"] == {"camera": "C"}
+    assert "city" not in a
+    assert b["city"] == "New"
+    assert b["faces"] == []
+    signatures = get_signatures(conn)
+    assert signatures["/p/a.jpg"]["fingerprint"] == "x"
+    assert signatures["/p/b.jpg"]["fingerprint"] is None
+
+
+def test_query_photos_filters_order_and_pages(tmp_path):
+    conn = init_db(str(tmp_path / "photo.db"))
+
+    def entry(name, ts, category, city, camera=None):
+        exif = {"timestamp": ts} if ts else {}
+        if camera:
+            exif["camera"] = camera
+        return {
+            "path": f"/lib/{name}",
+            "exif": exif,
+            "faces": [],
+            "category": category,
+            "city": city,
+        }
+
+    insert_metadata(
+        conn,
+        [
+            entry("a.jpg", "2019:03:01 10:00:00", "document", "SF", "X1"),
+            entry("b.jpg", "2019:12:31 23:59:59", "document", "SF"),
+            entry("c.jpg", "2020:01:01 00:00:00", "document", "SF"),
+            entry("d.jpg", "2019:06:01 12:00:00", "nature", "NYC"),
+            entry("e.jpg", None, "document", "SF"),
+        ],
+    )
+
+    def paths(**kwargs):
+        return [e["path"][5:] for e in query_photos(conn, **kwargs)]
+
+    docs_2019 = dict(
+        category="document", city="SF", since="2019-01-01", until="2020-01-01"
+    )
+    assert paths(**docs_2019) == ["a.jpg", "b.jpg"]
+    assert count_photos(conn, **docs_2019) == 2
+    assert paths(camera="X1") == ["a.jpg"]
+    assert paths(city=["NYC", "SF"], descending=True, limit=2) == [
+        "c.jpg",
+        "b.jpg",
+    ]
+    assert paths(limit=2, offset=3) == ["b.jpg", "c.jpg"]
+    assert paths(order_by="path", offset=4) == ["e.jpg"]
+    assert paths(folder="/other") == []
+
+    grouped = dict(entry("d.jpg", None, "nature", "NYC"), event_id=7)
+    update_metadata(conn, [grouped])
+    assert paths(event_id=7) == ["d.jpg"]
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM photos WHERE city = ?", ("SF",)
+    ).fetchall()
+    assert "photos_city" in plan[0][-1]
+    with pytest.raises(ValueError):
+        query_photos(conn, colour="red")
+    with pytest.raises(ValueError):
+        query_photos(conn, order_by="metadata")
+
+
+def test_list_photos_pages_by_cursor(tmp_path):
+    conn = init_db(str(tmp_path / "photo.db"))
+    stamps = [None, "2019:01:01 00:00:00", None, "2018:05:05 05:05:05"]
+    stamps += ["2019:01:01 00:00:00", "2020:02:02 02:02:02"]
+    insert_metadata(
+        conn,
+        [
+            {"path": f"/lib/{i}.jpg", "exif": {"timestamp": ts} if ts else {}}
+            for i, ts in enumerate(stamps)
+        ],
+    )
+
+    def walk(limit, **kwargs):
+        seen, cursor = [], None
+        while True:
+            page, cursor = list_photos(
+                conn, cursor=cursor, limit=limit, **kwargs
+            )
+            assert len(page) <= limit
+            seen += [e["path"] for e in page]
+            if cursor is None:
+                return seen
+
+    for descending in (False, True):
+        for order_by in ("taken_at", "path", "size"):
+            expected = [
+                e["path"]
+                for e in query_photos(
+                    conn, order_by=order_by, descending=descending
+                )
+            ]
+            for limit in (1, 2, 4, 6):
+                pages = walk(limit, order_by=order_by, descending=descending)
+                assert pages == expected
+
+    page, cursor = list_photos(conn, limit=3)
+    assert [e["path"][5:] for e in page] == ["0.jpg", "2.jpg", "3.jpg"]
+    # A photo sorting before the cursor does not shift the next page.
+    insert_metadata(conn, [{"path": "/lib/1a.jpg", "exif": {}}])
+    rest, cursor = list_photos(conn, cursor=cursor, limit=10)
+    assert [e["path"][5:] for e in rest] == ["1.jpg", "4.jpg", "5.jpg"]
+    assert cursor is None
+    with pytest.raises(ValueError):
+        list_photos(conn, cursor="not a cursor")
+
+
+def _fts_ok(conn):
+    conn.execute(
+        "INSERT INTO photos_fts(photos_fts) VALUES ('integrity-check')"
+    )
+
+
+def test_search_text_ranks_and_stays_in_sync(tmp_path):
+    conn = init_db(str(tmp_path / "photo.db"))
+    insert_metadata(
+        conn,
+        [
+            {"path": "/d/a.jpg", "ocr_text": "Grocery receipts total 12.50"},
+            {"path": "/d/b.jpg", "ocr_text": "Receipt receipt-2019 (copy)"},
+            {"path": "/d/c.jpg", "ocr_text": ""},
+        ],
+    )
+    hits = search_text(conn, "receipt")
+    assert [h["path"] for h in hits] == ["/d/b.jpg", "/d/a.jpg"]
+    assert "[receipts]" in hits[1]["snippet"]
+    assert hits[0]["score"] <= hits[1]["score"]
+    assert [h["path"] for h in search_text(conn, "receipt-2019 (")] == [
+        "/d/b.jpg"
+    ]
+    assert [h["path"] for h in search_text(conn, "groc*")] == ["/d/a.jpg"]
+    assert search_text(conn, "receipt", folder="/e") == []
+    assert len(search_text(conn, "receipt", folder="/d")) == 2
+
+    insert_metadata(conn, [{"path": "/d/a.jpg", "ocr_text": "Parking"}])
+    update_metadata(conn, [{"path": "/d/c.jpg", "ocr_text": "Bus pass"}])
+    delete_photos(conn, ["/d/b.jpg"])
+    _fts_ok(conn)
+    assert search_text(conn, "receipt") == []
+    assert [h["path"] for h in search_text(conn, "parking")] == ["/d/a.jpg"]
+    assert [h["path"] for h in search_text(conn, "bus")] == ["/d/c.jpg"]
+
+
+def test_init_db_indexes_existing_ocr_text(tmp_path):
+    db_file = str(tmp_path / "old.db")
+    old = sqlite3.connect(db_file)
+    old.execute(
+        "CREATE TABLE photos (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "path TEXT UNIQUE, metadata TEXT)"
+    )
+    old.execute(
+        "INSERT INTO photos(path, metadata) VALUES (?, ?)",
+        ("a.jpg", json.dumps({"path": "a.jpg", "ocr_text": "tax form"})),
+    )
+    old.commit()
+    old.close()
+
+    conn = init_db(db_file)
+    _fts_ok(conn)
+    assert [h["path"] for h in search_text(conn, "tax")] == ["a.jpg"]
@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from photo_organizer.db import init_db, insert_metadata
+from photo_organizer.duplicates import (
+    HammingIndex,
+    find_duplicates,
+    hamming,
+    image_hashes,
+)
+
+
+def _photo(seed):
+    rng = np.random.default_rng(seed)
+    tiles = rng.integers(0, 255, (8, 12, 3)).astype(np.uint8)
+    return Image.fromarray(tiles).resize((600, 400), Image.BICUBIC)
+
+
+def test_hashes_match_resized_and_rotated_copies():
+    img = _photo(1)
+    hashes = image_hashes(img)
+    assert len(hashes["dhash"]) == len(hashes["phash"]) == 16
+    rotated = img.transpose(Image.Transpose.ROTATE_90)
+    assert image_hashes(rotated, orient=6) == hashes
+    small = image_hashes(img.resize((300, 200)))
+    for name in ("dhash", "phash"):
+        assert hamming(int(small[name], 16), int(hashes[name], 16)) <= 2
+    other = image_hashes(_photo(2))
+    assert hamming(int(other["phash"], 16), int(hashes["phash"], 16)) > 10
+
+
+def test_hamming_index_matches_brute_force():
+    rng = random.Random(0)
+    values = [rng.getrandbits(64) for _ in range(400)]
+    for value in values[:80]:
+        for bit in rng.sample(range(64), rng.randrange(7)):
+            value ^= 1 << bit
+        values.append(value)
+    index = HammingIndex(values)
+    for radius in (0, 3, 6):
+        expected = [
+            (i, j)
+            for i in range(len(values))
+            for j in range(i + 1, len(values))
+            if hamming(values[i], values[j]) <= radius
+        ]
+        assert index.pairs(radius).tolist() == [list(p) for p in expected]
+        hits = index.query(values[3], radius)
+        assert hits == sorted(
+            (hamming(values[3], v), i)
+            for i, v in enumerate(values)
+            if hamming(values[3], v) <= radius
+        )
+
+
+def test_find_duplicates_groups_exact_and_near_copies(tmp_path):
+    def entry(path, sha256, phash):
+        return {"path": path, "sha256": sha256, "phash": phash}
+
+    conn = init_db(str(tmp_path / "photo.db"))
+    insert_metadata(
+        conn,
+        [
+            entry("/p/a.jpg", "aa", "ffff000000000000"),
+            entry("/p/a copy.jpg", "aa", "ffff000000000000"),
+            entry("/p/a small.jpg", "ab", "ffff000000000007"),
+            entry("/p/b.jpg", "bb", "00000000ffffffff"),
+            entry("/q/b.jpg", "bb", None),
+            entry("/p/c.jpg", "cc", "0f0f0f0f0f0f0f0f"),
+            {"path": "/p/metadata only.jpg"},
+        ],
+    )
+    assert find_duplicates(conn) == [
+        {
+            "paths": ["/p/a copy.jpg", "/p/a small.jpg", "/p/a.jpg"],
+            "exact": False,
+        },
+        {"paths": ["/p/b.jpg", "/q/b.jpg"], "exact": True},
+    ]
+    assert find_duplicates(conn, 0, folder="/p")[0] == {
+        "paths": ["/p/a copy.jpg", "/p/a.jpg"],
+        "exact": True,
+    }
+    with pytest.raises(ValueError):
+        find_duplicates(conn, -1)
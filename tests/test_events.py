@@ -1,4 +1,20 @@
-from photo_organizer.events import group_by_event, name_event, rename_event
+import random
+from datetime import datetime, timedelta
+
+from photo_organizer.db import (
+    delete_photos,
+    get_metadata,
+    init_db,
+    insert_metadata,
+    set_event_name,
+    update_metadata,
+)
+from photo_organizer.events import (
+    group_by_event,
+    name_event,
+    rename_event,
+    update_events,
+)
 
 
 def _make_metadata(ts_list):
@@ -58,3 +74,161 @@ def test_group_by_event_gap_threshold():
     events = group_by_event(metadata, gap_hours=8)
     assert list(events.keys()) == [0]
     assert [e["event_id"] for e in events[0]] == [0] * 5
+
+
+def _stored_events(tmp_path, ts_list):
+    conn = init_db(str(tmp_path / "photo.db"))
+    insert_metadata(conn, _make_metadata(ts_list))
+    return conn
+
+
+def _photo_events(conn):
+    rows = conn.execute("SELECT path, event_id FROM photos ORDER BY path")
+    return dict(rows.fetchall())
+
+
+def test_update_events_keeps_ids_and_names(tmp_path):
+    conn = _stored_events(
+        tmp_path, ["2023:01:01 10:00:00", "2023:01:02 10:00:00"]
+    )
+    events = update_events(conn)
+    assert [(e["id"], e["photos"]) for e in events] == [(0, 1), (1, 1)]
+    assert set_event_name(conn, 1, "Hike")
+    insert_metadata(
+        conn,
+        [
+            {"path": "new0.jpg", "exif": {"timestamp": "2023:01:02 13:00:00"}},
+            {"path": "new1.jpg", "exif": {"timestamp": "2023:01:05 09:00:00"}},
+        ],
+    )
+    events = update_events(conn)
+    assert [(e["id"], e["name"], e["photos"]) for e in events] == [
+        (0, None, 1),
+        (1, "Hike", 2),
+        (2, None, 1),
+    ]
+    assert events[1]["end"] == "2023-01-02 13:00:00"
+    assert _photo_events(conn) == {
+        "img0.jpg": 0,
+        "img1.jpg": 1,
+        "new0.jpg": 1,
+        "new1.jpg": 2,
+    }
+
+
+def test_update_events_merges_bridged_events(tmp_path):
+    conn = _stored_events(
+        tmp_path,
+        ["2023:01:01 10:00:00", "2023:01:01 18:00:00", "2023:01:01 19:00:00"],
+    )
+    update_events(conn)
+    set_event_name(conn, 0, "Morning")
+    insert_metadata(
+        conn,
+        [{"path": "z.jpg", "exif": {"timestamp": "2023:01:01 14:00:00"}}],
+    )
+    events = update_events(conn)
+    # The larger event absorbs the smaller one and inherits its name.
+    assert [(e["id"], e["name"], e["photos"]) for e in events] == [
+        (1, "Morning", 4)
+    ]
+    assert set(_photo_events(conn).values()) == {1}
+
+
+def test_update_events_splits_after_delete_and_regroups_on_gap(tmp_path):
+    conn = _stored_events(
+        tmp_path,
+        [
+            "2023:01:01 08:00:00",
+            "2023:01:01 12:00:00",
+            "2023:01:01 16:00:00",
+            "2023:01:01 17:00:00",
+        ],
+    )
+    assert [e["photos"] for e in update_events(conn)] == [4]
+    delete_photos(conn, ["img1.jpg"])
+    events = update_events(conn)
+    assert [(e["id"], e["photos"]) for e in events] == [(1, 1), (0, 2)]
+    assert _photo_events(conn) == {"img0.jpg": 1, "img2.jpg": 0, "img3.jpg": 0}
+
+    events = update_events(conn, gap_hours=9)
+    assert [(e["id"], e["photos"], e["gap_hours"]) for e in events] == [
+        (0, 3, 9)
+    ]
+    events = update_events(conn, gap_hours=0.5)
+    assert [(e["id"], e["photos"]) for e in events] == [(0, 1), (2, 1), (3, 1)]
+
+
+def _partition(groups):
+    return sorted(sorted(paths) for paths in groups)
+
+
+def test_update_events_regroups_photo_retimed_across_events(tmp_path):
+    timestamps = [
+        "2023:01:02 02:00:00",
+        "2023:01:02 14:00:00",
+        "2023:01:03 18:00:00",
+        "2023:01:04 17:00:00",
+    ]
+    conn = _stored_events(tmp_path, timestamps)
+    update_events(conn)
+    timestamps[1] = "2023:01:01 23:00:00"
+    entry = get_metadata(conn, ["img1.jpg"])[0]
+    entry["exif"]["timestamp"] = timestamps[1]
+    update_metadata(conn, [entry])
+    events = update_events(conn)
+
+    assert [e["start"] for e in events] == sorted(e["start"] for e in events)
+    stored = {}
+    for path, event_id in _photo_events(conn).items():
+        stored.setdefault(event_id, []).append(path)
+    expected = group_by_event(_make_metadata(timestamps))
+    assert _partition(stored.values()) == _partition(
+        [e["path"] for e in group] for group in expected.values()
+    )
+    assert _partition(stored.values()) == [
+        ["img0.jpg", "img1.jpg"],
+        ["img2.jpg"],
+        ["img3.jpg"],
+    ]
+
+
+def test_update_events_matches_full_grouping_after_random_changes(tmp_path):
+    rng = random.Random(0)
+    base = datetime(2023, 1, 1)
+
+    def stamp():
+        when = base + timedelta(minutes=rng.randrange(0, 6 * 24 * 60, 30))
+        return when.strftime("%Y:%m:%d %H:%M:%S")
+
+    conn = init_db(str(tmp_path / "photo.db"))
+    taken = {}
+    for step in range(60):
+        op = rng.choice(["add", "add", "delete", "retime"])
+        if op == "add" or not taken:
+            path = f"p{step}.jpg"
+            taken[path] = stamp()
+            insert_metadata(
+                conn, [{"path": path, "exif": {"timestamp": taken[path]}}]
+            )
+        elif op == "delete":
+            path = rng.choice(sorted(taken))
+            del taken[path]
+            delete_photos(conn, [path])
+        else:
+            path = rng.choice(sorted(taken))
+            taken[path] = stamp()
+            entry = get_metadata(conn, [path])[0]
+            entry["exif"]["timestamp"] = taken[path]
+            update_metadata(conn, [entry])
+        update_events(conn)
+
+        stored = {}
+        for path, event_id in _photo_events(conn).items():
+            stored.setdefault(event_id, []).append(path)
+        expected = group_by_event(
+            [{"path": p, "exif": {"timestamp": t}} for p, t in taken.items()]
+        )
+        assert _partition(stored.values()) == _partition(
+            [e["path"] for e in group] for group in expected.values()
+        ), step
@@ -5,6 +5,7 @@ from photo_organizer.face import (
     load_embedder,
     FaceEmbedder,
 )
+import numpy as np
 import onnxruntime as ort
 
 
@@ -30,3 +31,36 @@ def test_face_embedder_failure(monkeypatch):
     emb = embedder(img)
     assert emb.shape == (128,)
     assert emb.sum() == 0
+
+
+def test_embed_batch_single_call(monkeypatch):
+    calls = []
+
+    class Session:
+
+        def get_inputs(self):
+            return [type("I", (), {"name": "input"})()]
+
+        def run(self, outputs, feeds):
+            batch = feeds["input"]
+            calls.append(batch.shape)
+            assert batch.dtype == np.float32
+            assert batch.flags["C_CONTIGUOUS"]
+            return [np.ones((len(batch), 128), dtype=np.float32)]
+
+    monkeypatch.setattr(ort, "InferenceSession", lambda *a, **k: Session())
+    embedder = FaceEmbedder(intra_op_num_threads=2, inter_op_num_threads=1)
+    faces = [
+        Image.new("RGB", (30, 40)),
+        Image.new("L", (10, 10)),
+        Image.new("RGBA", (20, 20)),
+    ]
+    embs = embedder.embed_batch(faces)
+    assert embs.shape == (3, 128)
+    assert calls == [(3, 3, 160, 160)]
+    assert embedder.embed_batch([]).shape == (0, 128)
+
+
+def test_detect_faces_accepts_array():
+    arr = np.zeros((12, 20, 3), dtype=np.uint8)
+    assert detect_faces(arr) == [(0, 0, 20, 12)]
@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from photo_organizer.geocode import AsyncGeocoder
+from photo_organizer.location import GeocodeCache, NominatimClient
+from photo_organizer.stats import STATS
+
+
+@pytest.fixture
+def stub_geocoder():
+    """Serve a Nominatim-like ``/reverse`` endpoint on localhost."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            requests.append((time.monotonic(), query))
+            time.sleep(0.05)
+            lat = float(query["lat"][0])
+            if lat < 0:
+                self.send_response(500)
+                self.end_headers()
+                return
+            body = json.dumps(
+                {"address": {"town": f"Town {lat:.2f}", "country": "Stub"}}
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+def _entry(path, gps=None):
+    return {"path": path, "exif": {"gps": gps} if gps else {}}
+
+
+def test_nominatim_client(stub_geocoder):
+    url, requests = stub_geocoder
+    client = NominatimClient(url)
+    assert client(1.0, 2.0) == {
+        "city": "Town 1.00",
+        "state": None,
+        "country": "Stub",
+    }
+    assert requests[0][1]["format"] == ["jsonv2"]
+    assert client(-1.0, 2.0) is None
+
+
+def test_async_geocoder_coalesces_and_keeps_order(stub_geocoder):
+    url, requests = stub_geocoder
+    entries = [_entry(f"{i}.jpg", "1.0,2.0") for i in range(5)]
+    entries.insert(2, _entry("no-gps.jpg"))
+    geocoder = AsyncGeocoder(NominatimClient(url), rps=None)
+    out = list(geocoder.pipe(entries))
+    assert [e["path"] for e in out] == [e["path"] for e in entries]
+    assert len(requests) == 1
+    assert geocoder.stats()["coalesced"] == 4
+    assert "city" not in out[2]
+    assert all(e["city"] == "Town 1.00" for e in out if e["exif"])
+
+
+def test_async_geocoder_respects_rate_budget(stub_geocoder):
+    url, requests = stub_geocoder
+    entries = [_entry(f"{i}.jpg", f"{i}.0,0.0") for i in range(4)]
+    geocoder = AsyncGeocoder(NominatimClient(url), rps=10, concurrency=4)
+    out = list(geocoder.pipe(entries))
+    assert [e["city"] for e in out] == [f"Town {i}.00" for i in range(4)]
+    starts = sorted(t for t, _ in requests)
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    assert min(gaps) > 0.08
+
+
+def test_async_geocoder_uses_cache(stub_geocoder):
+    url, requests = stub_geocoder
+    cache = GeocodeCache()
+    with AsyncGeocoder(NominatimClient(url), cache=cache, rps=None) as g:
+        list(g.pipe([_entry("a.jpg", "5.0,5.0")]))
+        out = list(g.pipe([_entry("b.jpg", "5.001,5.001")]))
+        assert g.stats() == {"requests": 1, "coalesced": 0, "cache_hits": 1}
+    assert out[0]["city"] == "Town 5.00"
+    assert len(requests) == 1
+
+
+def test_async_geocoder_records_failed_lookups():
+    def broken(lat, lon):
+        raise RuntimeError("lookup crashed")
+
+    STATS.reset()
+    geocoder = AsyncGeocoder(broken, rps=None)
+    out = list(geocoder.pipe([_entry("a.jpg", "1.0,2.0")]))
+    assert "city" not in out[0]
+    assert list(STATS.error_log) == [
+        {
+            "stage": "geocode",
+            "path": "a.jpg",
+            "error": "RuntimeError: lookup crashed",
+        }
+    ]
+    STATS.reset()
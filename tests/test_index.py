@@ -0,0 +1,43 @@
+import numpy as np
+
+from photo_organizer.index import FaceIndex
+
+
+def _blobs(rng, centers, per_center):
+    return np.concatenate(
+        [c + 0.01 * rng.standard_normal((per_center, 128)) for c in centers]
+    ).astype(np.float32)
+
+
+def test_face_index_search_and_persist(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((5, 128))
+    vectors = _blobs(rng, centers, 20)
+    ids = np.arange(100, 200)
+    labels = np.repeat(np.arange(5), 20)
+    index = FaceIndex.build(ids, vectors, labels)
+
+    found, found_labels, dist = index.search(vectors[:3], k=5)
+    assert found.shape == (3, 5)
+    assert list(found[:, 0]) == [100, 101, 102]
+    assert (found_labels == 0).all()
+    assert dist[0, 0] < 1e-3
+
+    path = str(tmp_path / "faces.npz")
+    index.save(path)
+    loaded = FaceIndex.load(path)
+    assert len(loaded) == 100
+    again, _, _ = loaded.search(vectors[:3], k=5)
+    assert (again == found).all()
+
+    loaded.remove([100])
+    assert 100 not in loaded.search(vectors[:1], k=5)[0][0]
+
+
+def test_face_index_empty():
+    index = FaceIndex()
+    ids, labels, dist = index.search(np.zeros((1, 128)), k=2)
+    assert (ids == -1).all()
+    assert np.isinf(dist).all()
+    index.add([1], np.zeros((1, 128)), [0])
+    assert index.search(np.zeros((1, 128)), k=1)[0][0, 0] == 1
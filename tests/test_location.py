@@ -1,4 +1,22 @@
-from photo_organizer.location import resolve_location, group_by_location
+import json
+import multiprocessing
+import pickle
+import sqlite3
+import time
+
+import pytest
+
+from photo_organizer.location import (
+    GeocodeCache,
+    NominatimClient,
+    OfflineGeocoder,
+    _offline_lookup,
+    group_by_location,
+    lookup_source,
+    resolve_location,
+    resolve_locations,
+    set_geocode_cache,
+)
 
 
 def test_resolve_location_offline():
@@ -37,3 +55,138 @@ def test_group_by_location():
     by_state = group_by_location(metadata, level="state")
     assert set(by_state.keys()) == {"New York", "California"}
     assert len(by_state["California"]) == 1
+
+
+def test_geocode_cache_quantizes_and_persists(tmp_path):
+    calls = []
+
+    def lookup(lat, lon):
+        calls.append((lat, lon))
+        return _offline_lookup(lat, lon)
+
+    path = str(tmp_path / "geo.db")
+    cache = GeocodeCache(path, resolution=0.01)
+    ny = cache.resolve(40.7128, -74.0060, lookup)
+    assert ny["city"] == "New York"
+    assert cache.resolve(40.7131, -74.0058, lookup) == ny
+    assert cache.resolve(0.0, 0.0, lookup) == {}
+    assert cache.resolve(0.001, 0.001, lookup) == {}
+    assert len(calls) == 2
+    assert cache.stats() == {"hits": 2, "memory_hits": 2, "misses": 2}
+
+    reopened = pickle.loads(pickle.dumps(cache))
+    assert reopened.resolve(40.7128, -74.0060, lookup) == ny
+    assert len(calls) == 2
+    assert reopened.stats()["hits"] == 1
+    assert reopened.stats()["memory_hits"] == 0
+
+
+def _put_in_child(cache, queue):
+    inherited = cache._conn
+    cache.put(1.0, 2.0, {"city": "Child"})
+    queue.put(cache._conn is not inherited)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="needs the fork start method",
+)
+def test_geocode_cache_reconnects_after_fork(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geo.db"))
+    cache.put(3.0, 4.0, {"city": "Parent"})
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    child = context.Process(target=_put_in_child, args=(cache, queue))
+    child.start()
+    assert queue.get(timeout=30) is True
+    child.join()
+    assert child.exitcode == 0
+    assert cache.get(1.0, 2.0) == {"city": "Child"}
+    assert cache.get(3.0, 4.0) == {"city": "Parent"}
+
+
+def test_geocode_cache_ttl_and_lru(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geo.db"), ttl=0, max_entries=1)
+    cache.put(40.7128, -74.0060, {"city": "New York"})
+    assert cache.get(40.7128, -74.0060) is None
+
+    cache = GeocodeCache(max_entries=1)
+    cache.put(1.0, 1.0, {"city": "A"})
+    cache.put(2.0, 2.0, {"city": "B"})
+    assert len(cache._memory) == 1
+    assert cache.get(1.0, 1.0) == {"city": "A"}
+    assert cache.stats()["memory_hits"] == 0
+
+
+def test_resolve_location_uses_installed_cache(monkeypatch):
+    cache = GeocodeCache()
+    cache.put(10.0, 10.0, {"city": "Cached"})
+    set_geocode_cache(cache)
+    try:
+        assert resolve_location(10.001, 10.001) == {"city": "Cached"}
+    finally:
+        set_geocode_cache(None)
+
+
+def test_offline_geocoder_nearest_city():
+    geocoder = OfflineGeocoder()
+    assert geocoder.resolve(48.85, 2.35)["city"] == "Paris"
+    assert geocoder.resolve(40.72, -74.0)["city"] == "New York"
+    assert geocoder.resolve(0.0, -150.0) == {}
+
+
+def test_offline_geocoder_geonames_file(tmp_path):
+    path = tmp_path / "cities.txt"
+    rows = [
+        ["1", "Springfield", "Springfield", "", "39.80", "-89.64", "P",
+         "PPL", "US", "", "IL"],
+        ["2", "Shelbyville", "Shelbyville", "", "39.40", "-88.79", "P",
+         "PPL", "US", "", "IL"],
+    ]
+    path.write_text("\n".join("\t".join(r) for r in rows) + "\n")
+    geocoder = OfflineGeocoder(str(path), max_distance_km=50)
+    restored = pickle.loads(pickle.dumps(geocoder))
+    results = restored.resolve_many([(39.79, -89.6), (39.41, -88.8), (0, 0)])
+    assert results == [
+        {"city": "Springfield", "state": "IL", "country": "US"},
+        {"city": "Shelbyville", "state": "IL", "country": "US"},
+        {},
+    ]
+
+
+def test_gazetteer_header_names_missing_columns(tmp_path):
+    path = tmp_path / "places.tsv"
+    path.write_text("city\tcountry\tlatitude\tlongitude\nA\tB\t1\t2\n")
+    with pytest.raises(ValueError, match=r"places\.tsv has no state column"):
+        OfflineGeocoder(str(path))
+
+
+def test_geocode_cache_keeps_sources_apart(tmp_path):
+    path = str(tmp_path / "geo.db")
+    old = sqlite3.connect(path)
+    old.execute(
+        "CREATE TABLE geocode_cache (lat_key INTEGER, lon_key INTEGER, "
+        "result TEXT, created REAL, PRIMARY KEY (lat_key, lon_key))"
+    )
+    old.execute(
+        "INSERT INTO geocode_cache VALUES (100, 200, ?, ?)",
+        (json.dumps({"city": "Stored"}), time.time()),
+    )
+    old.commit()
+    old.close()
+
+    cache = GeocodeCache(path)
+    assert cache.get(1.0, 2.0) == {"city": "Stored"}
+    assert cache.get(1.0, 2.0, "offline") is None
+    cache.put(1.0, 2.0, {"city": "Nearest"}, "offline")
+
+    assert cache.resolve(1.0, 2.0) == {"city": "Stored"}
+    assert GeocodeCache(path).get(1.0, 2.0, "offline") == {"city": "Nearest"}
+    assert lookup_source(None) == "nominatim"
+    assert lookup_source(NominatimClient("http://geo/")) == "http://geo"
+
+
+def test_resolve_locations_batch():
+    results = resolve_locations([(40.7128, -74.0060), (37.77, -122.42)])
+    assert [r["city"] for r in results] == ["New York", "San Francisco"]
+    assert resolve_locations([]) == []
@@ -7,7 +7,8 @@ def test_ocr_text_extraction(monkeypatch, tmp_path):
     Image.new("RGB", (10, 10)).save(img_path)
 
     monkeypatch.setattr(
-        "photo_organizer.scan.classify_image", lambda img: "document"
+        "photo_organizer.scan.classify_images",
+        lambda imgs, batch_size=32: ["document"] * len(imgs),
     )
     monkeypatch.setattr(
         "photo_organizer.scan.extract_text", lambda img: "hello"
@@ -0,0 +1,39 @@
+from photo_organizer.progress import Progress
+
+
+def test_progress_counts_rate_and_eta():
+    now = [100.0]
+    progress = Progress(interval=5, clock=lambda: now[0])
+    files = progress.walk(["a", "b", "c", "d"])
+    assert next(files) == "a"
+    now[0] += 2
+    progress.advance()
+    snap = progress.snapshot()
+    assert snap["found"] == 1 and snap["done"] == 1
+    assert snap["total"] is None and snap["eta"] is None
+    assert snap["rate"] == 0.5
+    assert not progress.due()
+
+    assert list(files) == ["b", "c", "d"]
+    progress.advance(unchanged=True)
+    now[0] += 4
+    assert progress.due()
+    assert not progress.due()
+    snap = progress.snapshot()
+    assert snap["total"] == 4
+    assert snap["unchanged"] == 1
+    assert snap["rate"] == round(2 / 6, 2)
+    assert snap["eta"] == 6.0
+    progress.advance(2)
+    assert progress.snapshot()["eta"] == 0.0
+
+
+def test_progress_reports_when_due_for_skipped_files():
+    now = [0.0]
+    reports = []
+    progress = Progress(1, clock=lambda: now[0], report=reports.append)
+    progress.advance(unchanged=True)
+    assert reports == []
+    now[0] += 1
+    progress.advance(unchanged=True)
+    assert [r["unchanged"] for r in reports] == [2]
@@ -1,5 +1,13 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pytest
 from PIL import Image
+from photo_organizer import scan
 from photo_organizer.scan import scan_folder, find_images, _extract_exif
+from photo_organizer.stats import STATS
 
 ALLOWED = {"selfie", "document", "screenshot", "nature", "other"}
 
@@ -36,6 +44,22 @@ def test_extract_exif_invalid_gps():
     assert "gps" not in exif
 
 
+def test_extract_exif_reads_gps_sub_ifd(tmp_path):
+    exif = Image.Exif()
+    exif[0x8825] = {  # GPSInfo
+        1: "N",
+        2: (52.0, 30.0, 0.0),
+        3: "W",
+        4: (1.0, 15.0, 0.0),
+    }
+    path = tmp_path / "gps.jpg"
+    Image.new("RGB", (8, 8)).save(path, exif=exif)
+
+    with Image.open(path) as img:
+        assert isinstance(img.getexif()[0x8825], int)
+        assert _extract_exif(img)["gps"] == "52.5,-1.25"
+
+
 def test_find_images_custom_extensions(tmp_path):
     (tmp_path / "a.TIFF").write_text("x")
     (tmp_path / "b.jpeg").write_text("x")
@@ -47,3 +71,318 @@ def test_find_images_custom_extensions(tmp_path):
 
     none_found = find_images(str(tmp_path), extensions=[".gif"])
     assert none_found == []
+
+
+def test_scan_folder_incremental_skips_unchanged(tmp_path):
+    a = tmp_path / "a.jpg"
+    b = tmp_path / "b.jpg"
+    Image.new("RGB", (10, 10)).save(a)
+    Image.new("RGB", (10, 10)).save(b)
+
+    first = scan_folder(str(tmp_path))
+    known = {e["path"]: e for e in first}
+    assert all("fingerprint" in e for e in first)
+
+    assert scan_folder(str(tmp_path), known=known) == []
+
+    Image.new("RGB", (20, 20), (255, 0, 0)).save(b)
+    changed = scan_folder(str(tmp_path), known=known)
+    assert [e["path"] for e in changed] == [str(b)]
+
+    # Same ends, new mtime: rescanned so edits in between are not missed.
+    st = os.stat(a)
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    touched = scan_folder(str(tmp_path), known=known)
+    assert [e["path"] for e in touched] == [str(a), str(b)]
+    assert touched[0]["mtime"] == os.stat(a).st_mtime
+    assert touched[0]["fingerprint"] == known[str(a)]["fingerprint"]
+
+
+START_METHODS = [
+    method
+    for method in ("fork", "spawn")
+    if method in multiprocessing.get_all_start_methods()
+]
+
+
+def _use_start_method(monkeypatch, method):
+    context = multiprocessing.get_context(method)
+    monkeypatch.setattr(
+        scan,
+        "ProcessPoolExecutor",
+        partial(ProcessPoolExecutor, mp_context=context),
+    )
+
+
+# Module level, so spawned workers find them by importing this module.
+_scan_batch_in_worker = scan._scan_batch_in_worker
+
+
+def _crash_on_b(items, batch_size=32):
+    if any(os.path.basename(path) == "b.jpg" for path, _, _ in items):
+        os._exit(1)
+    return _scan_batch_in_worker(items, batch_size)
+
+
+@pytest.mark.parametrize("method", START_METHODS)
+def test_scan_folder_workers_keep_order_and_survive_failures(
+    monkeypatch, tmp_path, method
+):
+    for i, name in enumerate(["a.jpg", "b.jpg", "c.jpg", "d.jpg"]):
+        Image.new("RGB", (10, 10), (60 * i, 0, 0)).save(tmp_path / name)
+    bad = str(tmp_path / "b.jpg")
+    with open(bad, "wb") as fh:
+        fh.write(b"not an image")
+    _use_start_method(monkeypatch, method)
+    serial = scan_folder(str(tmp_path))
+    parallel = scan_folder(str(tmp_path), workers=2, batch_size=1)
+    assert [e["path"] for e in parallel] == [e["path"] for e in serial]
+    assert len(parallel) == 4
+    failed = [e for e in parallel if e["path"] == bad][0]
+    assert failed["faces"] == []
+
+
+@pytest.mark.parametrize("method", START_METHODS)
+def test_scan_folder_workers_survive_a_dying_worker(
+    monkeypatch, tmp_path, method
+):
+    for i, name in enumerate(["a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg"]):
+        Image.new("RGB", (10, 10), (50 * i, 0, 0)).save(tmp_path / name)
+    _use_start_method(monkeypatch, method)
+    monkeypatch.setattr(scan, "_scan_batch_in_worker", _crash_on_b)
+    STATS.reset()
+    entries = scan_folder(str(tmp_path), workers=2, batch_size=2)
+    assert [os.path.basename(e["path"]) for e in entries] == [
+        "a.jpg",
+        "b.jpg",
+        "c.jpg",
+        "d.jpg",
+        "e.jpg",
+    ]
+    # Only the file that kills its worker is lost.
+    assert [e["faces"] == [] for e in entries] == [
+        False,
+        True,
+        False,
+        False,
+        False,
+    ]
+    assert STATS.snapshot()["errors"]["worker"] == 1
+
+
+def test_iter_scan_is_lazy(tmp_path):
+    for name in ["a.jpg", "b.jpg"]:
+        Image.new("RGB", (10, 10)).save(tmp_path / name)
+    gen = scan.iter_scan(str(tmp_path), batch_size=1)
+    first = next(gen)
+    rest = [e["path"] for e in gen]
+    assert len(rest) == 1
+    assert {first["path"], *rest} == {
+        str(tmp_path / "a.jpg"),
+        str(tmp_path / "b.jpg"),
+    }
+
+
+def test_decode_uses_reduced_resolution(tmp_path):
+    path = tmp_path / "big.jpg"
+    Image.new("RGB", (3000, 2000), (10, 200, 10)).save(path)
+    with Image.open(path) as img:
+        rgb, sx, sy = scan._decode(img)
+    assert max(rgb.size) == 1024
+    assert rgb.mode == "RGB"
+    assert abs(sx * rgb.size[0] - 3000) < 1e-6
+    assert abs(sy * rgb.size[1] - 2000) < 1e-6
+
+    meta = scan_folder(str(tmp_path))
+    assert meta[0]["faces"][0]["box"] == [0, 0, 3000, 2000]
+
+
+def test_iter_scan_metadata_reads_headers_only(monkeypatch, tmp_path):
+    for name in ["a.jpg", "b.jpg"]:
+        Image.new("RGB", (5, 5)).save(tmp_path / name)
+    monkeypatch.setattr(
+        scan, "_extract_exif", lambda img: {"timestamp": "2023:01:01"}
+    )
+
+    def no_decode(img):
+        raise AssertionError("pixels decoded")
+
+    monkeypatch.setattr(scan, "_decode", no_decode)
+    meta = sorted(
+        scan.iter_scan_metadata(str(tmp_path), threads=2),
+        key=lambda e: e["path"],
+    )
+    assert [e["path"] for e in meta] == [
+        str(tmp_path / "a.jpg"),
+        str(tmp_path / "b.jpg"),
+    ]
+    for entry in meta:
+        assert entry["exif"] == {"timestamp": "2023:01:01"}
+        assert "faces" not in entry
+        assert "category" not in entry
+
+
+def test_iter_scan_hands_coordinates_to_geocoder(monkeypatch, tmp_path):
+    from photo_organizer.geocode import AsyncGeocoder
+
+    Image.new("RGB", (5, 5)).save(tmp_path / "a.jpg")
+    monkeypatch.setattr(scan, "_extract_exif", lambda img: {"gps": "1,2"})
+
+    def inline(self, lat, lon):
+        raise AssertionError("geocoded inline")
+
+    monkeypatch.setattr(scan.Geocoding, "resolve", inline)
+    geocoder = AsyncGeocoder(lambda lat, lon: {"city": "Async"}, rps=None)
+    meta = scan_folder(str(tmp_path), geocoder=geocoder)
+    assert meta[0]["city"] == "Async"
+
+
+def test_interleaved_scans_keep_their_own_geocoders(monkeypatch, tmp_path):
+    from photo_organizer.location import OfflineGeocoder
+
+    monkeypatch.setattr(scan, "_extract_exif", lambda img: {"gps": "1,2"})
+    scans = []
+    for city in ("Alpha", "Beta"):
+        gazetteer = tmp_path / f"{city}.txt"
+        row = ["1", city, city, "", "1", "2", "P", "PPL", "US", "", "XX"]
+        gazetteer.write_text("\t".join(row) + "\n")
+        folder = tmp_path / city
+        folder.mkdir()
+        for name in ("a.jpg", "b.jpg"):
+            Image.new("RGB", (5, 5)).save(folder / name)
+        scans.append(
+            scan.iter_scan(
+                str(folder),
+                batch_size=1,
+                offline_geocoder=OfflineGeocoder(str(gazetteer)),
+                online_geocoding=False,
+            )
+        )
+    alpha, beta = scans
+    first = next(alpha)
+    assert [e["city"] for e in beta] == ["Beta", "Beta"]
+    assert [e["city"] for e in [first, *alpha]] == ["Alpha", "Alpha"]
+
+
+def test_edited_photo_gets_new_thumbnails(monkeypatch, tmp_path):
+    from photo_organizer.thumbnails import ThumbnailCache
+
+    # An edit the head/tail fingerprint cannot see.
+    monkeypatch.setattr(scan, "_fingerprint", lambda path, size: "same")
+    path = tmp_path / "photos" / "a.jpg"
+    path.parent.mkdir()
+    Image.new("RGB", (40, 30), (250, 0, 0)).save(path)
+    cache = ThumbnailCache(str(tmp_path / "thumbs"))
+    first = scan_folder(str(path.parent), thumbnails=cache)[0]
+
+    Image.new("RGB", (40, 30), (0, 0, 250)).save(path)
+    os.utime(path, (0, first["mtime"] + 10))
+    known = {first["path"]: first}
+    second = scan_folder(str(path.parent), known, thumbnails=cache)[0]
+    thumb = second["thumbnails"]["256"]
+    assert thumb != first["thumbnails"]["256"]
+    with Image.open(thumb) as img:
+        assert img.getpixel((0, 0))[2] > 200
+
+
+def test_scan_folder_writes_thumbnails_from_shared_decode(tmp_path):
+    from photo_organizer.thumbnails import ThumbnailCache
+
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    Image.new("RGB", (2048, 1024)).save(photos / "a.jpg")
+    Image.new("RGB", (2048, 1024)).save(photos / "copy.jpg")
+    cache = ThumbnailCache(str(tmp_path / "thumbs"))
+    meta = scan_folder(str(photos), thumbnails=cache)
+    assert meta[0]["thumbnails"] == meta[1]["thumbnails"]
+    with Image.open(meta[0]["thumbnails"]["1024"]) as img:
+        assert img.size == (1024, 512)
+    with Image.open(meta[0]["thumbnails"]["256"]) as img:
+        assert img.size == (256, 128)
+    assert "thumbnails" not in scan_folder(str(photos))[0]
+
+
+def test_exact_copies_reuse_results_without_decoding(monkeypatch, tmp_path):
+    from photo_organizer.db import init_db, insert_metadata
+    from photo_organizer.duplicates import StoredResults
+
+    first = tmp_path / "first"
+    backup = tmp_path / "backup"
+    first.mkdir()
+    backup.mkdir()
+    Image.new("RGB", (40, 30), (200, 10, 10)).save(first / "a.jpg")
+    (first / "a copy.jpg").write_bytes((first / "a.jpg").read_bytes())
+    (backup / "a.jpg").write_bytes((first / "a.jpg").read_bytes())
+    Image.new("RGB", (40, 30), (10, 10, 200)).save(backup / "b.jpg")
+
+    decoded = []
+    real_scan_file = scan._scan_file
+
+    def spy(path, embedder, key=None, ctx=None):
+        decoded.append(path)
+        return real_scan_file(path, embedder, key, ctx)
+
+    monkeypatch.setattr(scan, "_scan_file", spy)
+    meta = scan_folder(str(first))
+    assert len(decoded) == 1
+    original = [e for e in meta if e["path"] == decoded[0]][0]
+    copy = [e for e in meta if e["path"] != decoded[0]][0]
+    assert copy["sha256"] == original["sha256"]
+    assert copy["phash"] == original["phash"]
+    assert copy["faces"] == original["faces"]
+    assert copy["faces"][0]["embedding"]
+
+    db_path = str(tmp_path / "photo.db")
+    insert_metadata(init_db(db_path), meta)
+    decoded.clear()
+    stored = StoredResults(db_path)
+    meta = scan_folder(str(backup), reuse=stored)
+    stored.close()
+    assert decoded == [str(backup / "b.jpg")]
+    reused = [e for e in meta if e["path"] == str(backup / "a.jpg")][0]
+    assert reused["category"] == original["category"]
+    assert reused["faces"][0]["box"] == original["faces"][0]["box"]
+    assert "cluster_id" not in reused["faces"][0]
+    assert len(reused["faces"][0]["embedding"]) == 128
+
+
+def test_failed_and_outdated_results_are_not_reused(monkeypatch, tmp_path):
+    from photo_organizer.db import init_db, insert_metadata
+    from photo_organizer.duplicates import StoredResults
+
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    Image.new("RGB", (40, 30), (200, 10, 10)).save(photos / "a.jpg")
+    (photos / "b.jpg").write_bytes((photos / "a.jpg").read_bytes())
+
+    def broken(img):
+        raise RuntimeError("detector crashed")
+
+    monkeypatch.setattr(scan, "detect_faces", broken)
+    meta = scan_folder(str(photos), batch_size=1)
+    assert not any("sha256" in e or "results_version" in e for e in meta)
+    monkeypatch.undo()
+
+    db_path = str(tmp_path / "photo.db")
+    conn = init_db(db_path)
+    insert_metadata(conn, meta)
+    stored = StoredResults(db_path)
+    digest = scan.file_digest(str(photos / "a.jpg"))
+    assert stored.get(digest) is None
+
+    insert_metadata(conn, scan_folder(str(photos), batch_size=1))
+    assert stored.get(digest, str(photos / "a.jpg"))["path"].endswith("b.jpg")
+    version = scan.RESULTS_VERSION + 1
+    assert stored.get(digest, version=version) is None
+    monkeypatch.setattr(scan, "RESULTS_VERSION", version)
+    decoded = []
+    real_scan_file = scan._scan_file
+
+    def spy(path, embedder, key=None, ctx=None):
+        decoded.append(path)
+        return real_scan_file(path, embedder, key, ctx)
+
+    monkeypatch.setattr(scan, "_scan_file", spy)
+    scan_folder(str(photos), batch_size=1, reuse=stored)
+    stored.close()
+    assert len(decoded) == 2
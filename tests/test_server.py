@@ -0,0 +1,102 @@
+import io
+import json
+import threading
+import time
+
+from photo_organizer.server import (
+    INVALID_PARAMS,
+    INVALID_REQUEST,
+    METHOD_NOT_FOUND,
+    PARSE_ERROR,
+    SERVER_ERROR,
+    RpcServer,
+)
+
+
+def _serve(server, *requests):
+    lines = [r if isinstance(r, str) else json.dumps(r) for r in requests]
+    out = io.StringIO()
+    assert server.serve(io.StringIO("\n".join(lines) + "\n"), out) == 0
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_dispatch_and_errors():
+    def add(a, b=0):
+        return a + b
+
+    def fail():
+        raise KeyError("boom")
+
+    def check(value):
+        raise ValueError(f"bad value {value}")
+
+    server = RpcServer({"add": add, "fail": fail, "check": check})
+    replies = _serve(
+        server,
+        {"jsonrpc": "2.0", "id": 1, "method": "add", "params": [1, 2]},
+        {"jsonrpc": "2.0", "id": 2, "method": "add", "params": {"a": 5}},
+        {"jsonrpc": "2.0", "method": "add", "params": [1]},
+        {"jsonrpc": "2.0", "id": 3, "method": "nope"},
+        {"jsonrpc": "2.0", "id": 4, "method": "add", "params": {"c": 1}},
+        {"jsonrpc": "2.0", "id": 5, "method": "fail"},
+        {"jsonrpc": "2.0", "id": 6, "method": "check", "params": [7]},
+        "{not json",
+        {"jsonrpc": "2.0", "id": 7},
+        [
+            {"jsonrpc": "2.0", "id": 8, "method": "ping"},
+            {"jsonrpc": "2.0", "id": 9, "method": "add", "params": [2, 2]},
+        ],
+    )
+    assert replies[0] == {"jsonrpc": "2.0", "id": 1, "result": 3}
+    assert replies[1]["result"] == 5
+    assert replies[2]["error"]["code"] == METHOD_NOT_FOUND
+    assert replies[3]["error"]["code"] == INVALID_PARAMS
+    assert replies[4]["error"]["code"] == SERVER_ERROR
+    assert replies[4]["error"]["data"] == {"type": "KeyError"}
+    assert replies[5]["error"] == {
+        "code": INVALID_PARAMS,
+        "message": "bad value 7",
+    }
+    assert replies[6]["error"]["code"] == PARSE_ERROR
+    assert replies[7]["error"]["code"] == INVALID_REQUEST
+    assert [r["result"] for r in replies[8]] == ["pong", 4]
+    assert len(replies) == 9
+
+
+def test_background_methods_do_not_block_and_prints_are_diverted(capsys):
+    def slow():
+        time.sleep(0.2)
+        print("progress")
+        return "done"
+
+    server = RpcServer({"slow": slow}, background=["slow"])
+    replies = _serve(
+        server,
+        {"jsonrpc": "2.0", "id": 1, "method": "slow"},
+        {"jsonrpc": "2.0", "id": 2, "method": "ping"},
+        {"jsonrpc": "2.0", "id": 3, "method": "shutdown"},
+        {"jsonrpc": "2.0", "id": 4, "method": "ping"},
+    )
+    assert [r["id"] for r in replies] == [2, 3, 1]
+    assert replies[-1]["result"] == "done"
+    assert "progress" in capsys.readouterr().err
+
+
+def test_each_background_method_has_its_own_thread():
+    release = threading.Event()
+
+    def scan():
+        assert release.wait(5)
+        return "scanned"
+
+    server = RpcServer(
+        {"scan": scan, "thumbnails": release.set},
+        background=["scan", "thumbnails"],
+    )
+    replies = _serve(
+        server,
+        {"jsonrpc": "2.0", "id": 1, "method": "scan"},
+        {"jsonrpc": "2.0", "id": 2, "method": "thumbnails"},
+    )
+    assert [r["id"] for r in replies] == [2, 1]
+    assert replies[1]["result"] == "scanned"
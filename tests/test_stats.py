@@ -0,0 +1,83 @@
+import json
+
+from PIL import Image
+from photo_organizer.stats import STATS, Stats, timed
+from cli import main
+
+
+def test_stats_histogram_and_merge():
+    stats = Stats()
+    stats.observe("decode", 0.002)
+    stats.observe("decode", 20.0)
+    stats.count("files_scanned", 2)
+    stats.error("scan", "/a.jpg", ValueError("bad"))
+
+    other = Stats()
+    other.merge(stats.snapshot())
+    other.merge(stats.drain())
+    snap = other.snapshot()
+    hist = snap["timings"]["decode"]
+    assert hist["count"] == 4
+    assert hist["max"] == 20.0
+    assert hist["buckets"][1] == 2
+    assert hist["buckets"][-1] == 2
+    assert snap["counters"] == {"files_scanned": 4}
+    assert snap["errors"] == {"scan": 2}
+    assert snap["error_log"][0]["error"] == "ValueError: bad"
+    assert stats.snapshot()["timings"] == {}
+
+
+def test_stats_prometheus_text():
+    stats = Stats()
+    stats.observe("ocr", 0.3)
+    stats.count("geocode_cache_hits")
+    text = stats.to_prometheus()
+    assert "# TYPE photo_organizer_stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="ocr",le="0.25"} 0' in text
+    assert 'stage_seconds_bucket{stage="ocr",le="0.5"} 1' in text
+    assert 'stage_seconds_bucket{stage="ocr",le="+Inf"} 1' in text
+    assert 'stage_seconds_count{stage="ocr"} 1' in text
+    assert 'events_total{name="geocode_cache_hits"} 1' in text
+
+
+def test_timed_records_calls_that_raise():
+    STATS.reset()
+
+    @timed("unit")
+    def boom():
+        raise RuntimeError
+
+    try:
+        boom()
+    except RuntimeError:
+        pass
+    assert STATS.snapshot()["timings"]["unit"]["count"] == 1
+
+
+def test_cli_stats_file_with_workers(monkeypatch, tmp_path, capsys):
+    for name in ["a.jpg", "b.jpg"]:
+        Image.new("RGB", (5, 5)).save(tmp_path / name)
+    (tmp_path / "broken.jpg").write_bytes(b"not an image")
+    stats_path = tmp_path / "stats.json"
+    ret = main(
+        [
+            str(tmp_path),
+            "--db",
+            str(tmp_path / "photo.db"),
+            "--workers",
+            "2",
+            "--batch-size",
+            "1",
+            "--stats",
+            "--stats-file",
+            str(stats_path),
+        ]
+    )
+    assert ret == 0
+    assert "decode" in capsys.readouterr().err
+    snap = json.loads(stats_path.read_text())
+    assert snap["counters"]["files_scanned"] == 3
+    assert snap["timings"]["decode"]["count"] == 2
+    assert snap["errors"]["scan"] == 1
+    assert snap["error_log"][0]["path"].endswith("broken.jpg")
+    assert "db_write" in snap["timings"]
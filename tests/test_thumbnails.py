@@ -0,0 +1,55 @@
+import os
+import time
+
+from PIL import Image
+
+from photo_organizer.thumbnails import ThumbnailCache, orientation
+from photo_organizer.walk import walk_images
+
+
+def test_write_sizes_orientation_and_reuse(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / "thumbs"))
+    rgb = Image.new("RGB", (1024, 512), "red")
+    paths = cache.write("abcdef", rgb, orient=6)
+    assert paths == {
+        "256": str(tmp_path / "thumbs" / "ab" / "abcdef_256.jpg"),
+        "1024": str(tmp_path / "thumbs" / "ab" / "abcdef_1024.jpg"),
+    }
+    with Image.open(paths["256"]) as img:
+        assert img.size == (128, 256)
+    with Image.open(paths["1024"]) as img:
+        assert img.size == (512, 1024)
+
+    mtime = os.path.getmtime(paths["256"])
+    os.utime(paths["256"], (mtime - 100, mtime - 100))
+    assert cache.write("abcdef", rgb) == paths
+    assert os.path.getmtime(paths["256"]) > mtime - 100
+
+
+def test_create_from_source_and_orientation(tmp_path):
+    src = tmp_path / "photo.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 8
+    Image.new("RGB", (2000, 1000)).save(src, exif=exif)
+    with Image.open(src) as img:
+        assert orientation(img) == 8
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), sizes=[100])
+    paths = cache.create(str(src), "ff00")
+    with Image.open(paths["100"]) as img:
+        assert img.size == (50, 100)
+
+
+def test_evict_least_recently_used_and_hidden_from_scans(tmp_path):
+    root = tmp_path / "thumbs"
+    cache = ThumbnailCache(str(root), sizes=[64])
+    now = time.time()
+    for i, key in enumerate(["aa01", "bb02", "cc03"]):
+        path = cache.write(key, Image.effect_noise((64, 64), 50))["64"]
+        os.utime(path, (now - 100 + i, now - 100 + i))
+    cache.touch([cache.path("aa01", 64)])
+    cache.max_bytes = cache.size() - 1
+    assert cache.evict() == 1
+    assert not os.path.exists(cache.path("bb02", 64))
+    assert os.path.exists(cache.path("aa01", 64))
+    assert os.path.exists(root / ".photoignore")
+    assert list(walk_images(str(tmp_path))) == []
@@ -0,0 +1,71 @@
+import os
+
+from photo_organizer.walk import parse_ignore, walk_images
+from photo_organizer.scan import file_signature
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x")
+
+
+def _paths(root, **kwargs):
+    return {
+        os.path.relpath(p, root).replace(os.sep, "/")
+        for p, _ in walk_images(str(root), **kwargs)
+    }
+
+
+def test_walk_images_recurses_and_filters_extensions(tmp_path):
+    for rel in ["a.jpg", "b.PNG", "c.txt", "x/d.jpeg", "x/y/e.jpg"]:
+        _touch(tmp_path / rel)
+    assert _paths(tmp_path, threads=3) == {
+        "a.jpg",
+        "b.PNG",
+        "x/d.jpeg",
+        "x/y/e.jpg",
+    }
+
+
+def test_walk_images_max_depth(tmp_path):
+    for rel in ["a.jpg", "x/b.jpg", "x/y/c.jpg"]:
+        _touch(tmp_path / rel)
+    assert _paths(tmp_path, max_depth=0) == {"a.jpg"}
+    assert _paths(tmp_path, max_depth=1) == {"a.jpg", "x/b.jpg"}
+
+
+def test_walk_images_photoignore(tmp_path):
+    for rel in [
+        "a.jpg",
+        "skip.jpg",
+        "cache/b.jpg",
+        "x/c.jpg",
+        "x/tmp/d.jpg",
+        "x/y/tmp.jpg",
+    ]:
+        _touch(tmp_path / rel)
+    (tmp_path / ".photoignore").write_text("# comment\nskip*\ncache/\n")
+    (tmp_path / "x" / ".photoignore").write_text("/tmp/\n")
+    assert _paths(tmp_path) == {"a.jpg", "x/c.jpg", "x/y/tmp.jpg"}
+    assert _paths(tmp_path, ignore=["x"]) == {"a.jpg"}
+
+
+def test_parse_ignore_rules():
+    rules = parse_ignore(["", "# c", "*.png", "raw/", "/a/b"], "/r")
+    assert rules == [
+        ("/r", "*.png", False, False),
+        ("/r", "raw", True, False),
+        ("/r", "a/b", False, True),
+    ]
+
+
+def test_walk_stat_reused_for_signature(tmp_path, monkeypatch):
+    _touch(tmp_path / "a.jpg")
+    [(path, st)] = list(walk_images(str(tmp_path)))
+    first = file_signature(path, None, st)
+
+    def no_stat(*args, **kwargs):
+        raise AssertionError("stat called")
+
+    monkeypatch.setattr(os, "stat", no_stat)
+    assert file_signature(path, first, st) is None
@@ -20,7 +20,10 @@ function createWindow() {
   }
 }
 
-app.whenReady().then(createWindow);
+app.whenReady().then(() => {
+  backend = startBackend();
+  createWindow();
+});
 
 ipcMain.handle('select-folder', async () => {
   const { canceled, filePaths } = await dialog.showOpenDialog({
@@ -30,52 +33,99 @@ ipcMain.handle('select-folder', async () => {
   return filePaths[0];
 });
 
-ipcMain.handle('scan-folder', async (_evt, folder) => {
-  return new Promise((resolve) => {
-    const script = path.join(__dirname, '..', 'cli.py');
-    const child = spawn('python', [script, folder]);
-    let output = '';
-    child.stdout.on('data', (d) => (output += d));
-    child.stderr.on('data', (d) => console.error(d.toString()));
-    child.on('close', () => resolve(output));
+// One long-lived `python cli.py --serve` process answers every request
+// over line-delimited JSON-RPC, so models and the database stay loaded.
+let backend = null;
+let nextId = 1;
+const pending = new Map();
+
+function startBackend() {
+  const script = path.join(__dirname, '..', 'cli.py');
+  const child = spawn('python', [script, '--serve']);
+  let buffer = '';
+  child.stdout.setEncoding('utf8');
+  child.stdout.on('data', (chunk) => {
+    buffer += chunk;
+    let newline;
+    while ((newline = buffer.indexOf('\n')) >= 0) {
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      if (line.trim()) handleResponse(line);
+    }
   });
+  child.stderr.on('data', (d) => console.error(d.toString()));
+  child.on('exit', (code) => {
+    backend = null;
+    for (const { reject } of pending.values()) {
+      reject(new Error(`backend exited with code ${code}`));
+    }
+    pending.clear();
+  });
+  return child;
+}
+
+function handleResponse(line) {
+  let message;
+  try {
+    message = JSON.parse(line);
+  } catch (err) {
+    console.error('Invalid backend response', line);
+    return;
+  }
+  if (message.id === undefined && message.method === 'scan_event') {
+    // Streamed scan records go straight to the renderer.
+    for (const win of BrowserWindow.getAllWindows()) {
+      win.webContents.send('scan-event', message.params);
+    }
+    return;
+  }
+  const call = pending.get(message.id);
+  if (!call) return;
+  pending.delete(message.id);
+  if (message.error) {
+    call.reject(new Error(message.error.message));
+  } else {
+    call.resolve(message.result);
+  }
+}
+
+function callBackend(method, params) {
+  if (!backend) backend = startBackend();
+  const id = nextId++;
+  return new Promise((resolve, reject) => {
+    pending.set(id, { resolve, reject });
+    backend.stdin.write(
+      JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n'
+    );
+  });
+}
+
+ipcMain.handle('scan-folder', async (_evt, folder) => {
+  return callBackend('scan', { folder, results: false, stream: true });
 });
 
 ipcMain.handle('set-face-label', async (_evt, dbPath, clusterId, name) => {
-  return new Promise((resolve) => {
-    const script = path.join(__dirname, '..', 'cli.py');
-    const args = [
-      script,
-      '--db',
-      dbPath,
-      '--set-face-label',
-      String(clusterId),
-      name,
-    ];
-    const child = spawn('python', args);
-    let output = '';
-    child.stdout.on('data', (d) => (output += d));
-    child.stderr.on('data', (d) => console.error(d.toString()));
-    child.on('close', () => resolve(output));
+  return callBackend('set_face_label', {
+    db: dbPath,
+    cluster_id: clusterId,
+    name,
   });
 });
 
 ipcMain.handle('get-face-label', async (_evt, dbPath, clusterId) => {
-  return new Promise((resolve) => {
-    const script = path.join(__dirname, '..', 'cli.py');
-    const args = [
-      script,
-      '--db',
-      dbPath,
-      '--get-face-label',
-      String(clusterId),
-    ];
-    const child = spawn('python', args);
-    let output = '';
-    child.stdout.on('data', (d) => (output += d));
-    child.stderr.on('data', (d) => console.error(d.toString()));
-    child.on('close', () => resolve(output));
-  });
+  return callBackend('get_face_label', { db: dbPath, cluster_id: clusterId });
+});
+
+ipcMain.handle('list-photos', async (_evt, params) => {
+  return callBackend('list_photos', params);
+});
+
+ipcMain.handle('get-thumbnails', async (_evt, paths, size = 256) => {
+  return callBackend('thumbnails', { paths, size });
+});
+
+app.on('will-quit', () => {
+  if (backend) backend.stdin.end();
 });
 
 app.on('window-all-closed', () => {
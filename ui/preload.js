@@ -3,8 +3,16 @@ const { contextBridge, ipcRenderer } = require('electron');
 contextBridge.exposeInMainWorld('electronAPI', {
   selectFolder: () => ipcRenderer.invoke('select-folder'),
   scanFolder: (folder) => ipcRenderer.invoke('scan-folder', folder),
+  onScanEvent: (callback) => {
+    const listener = (_evt, record) => callback(record);
+    ipcRenderer.on('scan-event', listener);
+    return () => ipcRenderer.removeListener('scan-event', listener);
+  },
+  listPhotos: (params) => ipcRenderer.invoke('list-photos', params),
   setFaceLabel: (db, cid, name) =>
     ipcRenderer.invoke('set-face-label', db, cid, name),
   getFaceLabel: (db, cid) =>
     ipcRenderer.invoke('get-face-label', db, cid),
+  getThumbnails: (paths, size) =>
+    ipcRenderer.invoke('get-thumbnails', paths, size),
 });
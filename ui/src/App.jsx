@@ -1,28 +1,102 @@
-import { useState } from 'react';
+import { useCallback, useRef, useState } from 'react';
 import Sidebar from './components/Sidebar';
 import ImageGrid from './components/ImageGrid';
 
+const PAGE_SIZE = 200;
+// Streamed photos are added to the grid in batches at most this often.
+const FLUSH_MS = 250;
+
+function toImage(entry) {
+  return {
+    path: entry.path,
+    thumbnail: entry.thumbnails?.['256'] ?? null,
+  };
+}
+
 function App() {
   const [folder, setFolder] = useState(null);
   const [images, setImages] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [progress, setProgress] = useState(null);
+  // Paging state that must not trigger renders: the cursor of the next
+  // page, whether a request is in flight and which folder it belongs to.
+  const paging = useRef({ folder: null, cursor: null, loading: false });
+
+  const loadPage = useCallback(async () => {
+    const state = paging.current;
+    if (state.loading || !state.folder) return;
+    if (state.cursor === undefined) return; // every page loaded
+    state.loading = true;
+    const requested = state.folder;
+    try {
+      const page = await window.electronAPI.listPhotos({
+        folder: requested,
+        cursor: state.cursor,
+        limit: PAGE_SIZE,
+      });
+      if (paging.current.folder !== requested) return;
+      if (page.total !== undefined) setTotal(page.total);
+      setImages((prev) => prev.concat(page.photos.map(toImage)));
+      state.cursor = page.cursor ?? undefined;
+    } catch (err) {
+      console.error('Listing photos failed', err);
+    } finally {
+      state.loading = false;
+    }
+  }, []);
 
   const handleSelectFolder = async () => {
     const selected = await window.electronAPI.selectFolder();
     if (!selected) return;
     setFolder(selected);
-    const output = await window.electronAPI.scanFolder(selected);
+    setImages([]);
+    setTotal(0);
+    setProgress(null);
+    paging.current = { folder: null, cursor: null, loading: false };
+
+    // Show photos while the scan runs instead of after it finished.
+    let buffered = [];
+    let timer = null;
+    const flush = () => {
+      timer = null;
+      const batch = buffered;
+      buffered = [];
+      if (batch.length) setImages((prev) => prev.concat(batch));
+    };
+    const stop = window.electronAPI.onScanEvent((record) => {
+      if (record.folder !== selected) return;
+      if (record.type === 'photo') {
+        buffered.push(toImage(record.photo));
+        if (!timer) timer = setTimeout(flush, FLUSH_MS);
+      } else if (record.type === 'progress') {
+        setProgress(record);
+      }
+    });
     try {
-      const data = JSON.parse(output);
-      setImages(data.map((entry) => entry.path));
+      await window.electronAPI.scanFolder(selected);
     } catch (err) {
-      console.error('Failed to parse CLI output', err, output);
+      console.error('Scan failed', err);
+    } finally {
+      stop();
+      if (timer) clearTimeout(timer);
     }
+
+    // The database now holds every photo, including unchanged ones that
+    // were not streamed; page through it from the start.
+    setProgress(null);
+    setImages([]);
+    paging.current = { folder: selected, cursor: null, loading: false };
+    loadPage();
   };
 
   return (
     <div className="app">
-      <Sidebar onSelectFolder={handleSelectFolder} folder={folder} />
-      <ImageGrid images={images} />
+      <Sidebar
+        onSelectFolder={handleSelectFolder}
+        folder={folder}
+        progress={progress}
+      />
+      <ImageGrid images={images} total={total} onNeedMore={loadPage} />
     </div>
   );
 }
@@ -1,9 +1,105 @@
-function ImageGrid({ images }) {
+import { useEffect, useRef, useState } from 'react';
+
+// Every cell is 150 px plus a 4 px margin on each side, see index.css.
+const CELL = 158;
+// Rows rendered above and below the viewport to hide scroll gaps.
+const OVERSCAN = 2;
+// Ask for the next page while this many rows are still unloaded.
+const PREFETCH_ROWS = 10;
+
+// Shows the cached 256 px thumbnail of a photo. Thumbnails evicted from
+// the cache are recreated by the backend; the full-size file is only a
+// last resort.
+function Thumbnail({ image }) {
+  const [src, setSrc] = useState(image.thumbnail || null);
+  const [retried, setRetried] = useState(false);
+
+  const refresh = async () => {
+    if (retried) {
+      setSrc(image.path);
+      return;
+    }
+    setRetried(true);
+    const found = await window.electronAPI.getThumbnails([image.path], 256);
+    setSrc(found[image.path] || image.path);
+  };
+
+  useEffect(() => {
+    if (!src) refresh();
+  }, [src]);
+
+  if (!src) return <div className="thumbnail-placeholder" />;
+  return (
+    <img
+      src={`file://${src}`}
+      alt=""
+      decoding="async"
+      onError={refresh}
+    />
+  );
+}
+
+// Renders only the rows of the grid that are on screen. *total* sizes
+// the scroll area up front; *images* holds the pages loaded so far and
+// *onNeedMore* is called when scrolling gets close to their end.
+function ImageGrid({ images, total = images.length, onNeedMore }) {
+  const container = useRef(null);
+  const [view, setView] = useState({ top: 0, width: 0, height: 0 });
+
+  useEffect(() => {
+    const el = container.current;
+    const measure = () =>
+      setView({
+        top: el.scrollTop,
+        width: el.clientWidth,
+        height: el.clientHeight,
+      });
+    measure();
+    const observer = new ResizeObserver(measure);
+    observer.observe(el);
+    el.addEventListener('scroll', measure, { passive: true });
+    return () => {
+      observer.disconnect();
+      el.removeEventListener('scroll', measure);
+    };
+  }, []);
+
+  const count = Math.max(total, images.length);
+  const columns = Math.max(1, Math.floor(view.width / CELL));
+  const rows = Math.ceil(count / columns);
+  const firstRow = Math.max(0, Math.floor(view.top / CELL) - OVERSCAN);
+  const lastRow = Math.min(
+    rows,
+    Math.ceil((view.top + view.height) / CELL) + OVERSCAN
+  );
+
+  useEffect(() => {
+    const loadedRows = Math.ceil(images.length / columns);
+    if (onNeedMore && lastRow + PREFETCH_ROWS >= loadedRows) onNeedMore();
+  }, [lastRow, columns, images.length, onNeedMore]);
+
+  const cells = [];
+  for (let i = firstRow * columns; i < Math.min(count, lastRow * columns); i++) {
+    const style = {
+      position: 'absolute',
+      top: Math.floor(i / columns) * CELL,
+      left: (i % columns) * CELL,
+    };
+    const image = images[i];
+    cells.push(
+      <div key={image ? image.path : `pending-${i}`} style={style}>
+        {image ? (
+          <Thumbnail image={image} />
+        ) : (
+          <div className="thumbnail-placeholder" />
+        )}
+      </div>
+    );
+  }
+
   return (
-    <div className="grid">
-      {images.map((img, i) => (
-        <img key={i} src={`file://${img}`} alt="" />
-      ))}
+    <div className="grid" ref={container}>
+      <div style={{ position: 'relative', height: rows * CELL }}>{cells}</div>
     </div>
   );
 }
@@ -1,8 +1,21 @@
-function Sidebar({ onSelectFolder, folder }) {
+function formatEta(seconds) {
+  if (seconds === null || seconds === undefined) return 'estimating…';
+  if (seconds < 60) return `${Math.ceil(seconds)} s left`;
+  return `${Math.ceil(seconds / 60)} min left`;
+}
+
+function Sidebar({ onSelectFolder, folder, progress }) {
   return (
     <div className="sidebar">
       <button onClick={onSelectFolder}>Choose Folder</button>
       {folder && <p>{folder}</p>}
+      {progress && (
+        <p className="progress">
+          Scanned {progress.done} of {progress.total ?? `${progress.found}+`}
+          <br />
+          {formatEta(progress.eta)}
+        </p>
+      )}
     </div>
   );
 }